@@ -5,17 +5,27 @@ Demonstrates understanding of LangGraph framework for AI Tinkerers Club.
 
 import json
 import uuid
+import asyncio
+import time
 import os
-import base64
 import logging
-from typing import Dict, List, Any, TypedDict, Annotated
+from typing import Dict, List, Any, Optional, TypedDict, Annotated
 from dataclasses import dataclass
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
+from pydantic import ValidationError
+
+from .config import settings
+from .schemas import SceneComponents, PanelSpec, PanelPlan, ComicPlan
 from .utils.llm import get_llm_client
-from .utils.image_gen import get_image_generator
+from .utils.prompts import build_prompt
+from .utils.image_gen import get_image_generator, image_tier_options
+from .utils.layout import create_comic_layout, render_panel_placeholder, render_fallback_layout
+from .utils.render_pool import get_render_pool
+from .utils.encoders import media_type_for, sniff_media_type, transcode
+from .utils.scratch import BlobHandle, get_scratch_store
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -27,12 +37,76 @@ class ComicState(TypedDict):
     style: str
     panels: int
     job_id: str
+    deadline: float  # time.monotonic() by which the whole job must finish
+    output_format: str  # Encoder for the comic, placeholders and re-encoded panels
+    image_tier: str  # Model/size/quality tier panels are generated at (see IMAGE_TIERS)
     scene: Dict[str, Any]
     panel_descriptions: List[str]
-    image_data: List[bytes]  # Changed from image_paths to image_data
-    comic_data: bytes  # Changed from comic_path to comic_data
+    image_data: List[BlobHandle]  # Panels in the scratch store; bytes are materialized where used
+    comic_data: Optional[BlobHandle]
+    failed_panels: List[int]  # Panel numbers left as placeholders, for background repair
+    image_slots: Optional[asyncio.Semaphore]  # Image calls shared with sibling jobs (multi-style fan-out)
     messages: List[str]
 
+# Live per-job progress written by the nodes as they run. Callers read it to
+# salvage artifacts from jobs that were cancelled part-way through.
+job_progress: Dict[str, Dict[str, Any]] = {}
+
+def _record_progress(state: ComicState, **updates) -> None:
+    """Record progress for the job the given state belongs to"""
+    job_progress.setdefault(state["job_id"], {}).update(updates)
+
+def _remaining(state: ComicState) -> float:
+    """Seconds left before the job's deadline"""
+    return state.get("deadline", float("inf")) - time.monotonic()
+
+def _budget(state: ComicState, reserve: float) -> float:
+    """Seconds a stage may spend while leaving `reserve` for the stages after it"""
+    return max(0.0, _remaining(state) - reserve)
+
+def get_job_progress(job_id: str) -> Dict[str, Any]:
+    """Summarise a running job's progress for status polling"""
+    progress = job_progress.get(job_id, {})
+    summary = {"stage": progress.get("stage", "queued")}
+    if "image_data" in progress:
+        images = progress["image_data"]
+        summary["panels_done"] = sum(1 for image in images if image is not None)
+        summary["panels_total"] = len(images)
+    if "record" in progress:
+        # Long-form jobs: panel counts above are for the page being rendered
+        summary["pages_done"] = sum(1 for page in progress["record"]["pages"] if page["state"] == "done")
+        summary["pages_total"] = len(progress["record"]["pages"])
+    return summary
+
+def get_live_record(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job record of a running long-form job, as far as it has got"""
+    return job_progress.get(job_id, {}).get("record")
+
+def pop_partial_result(job_id: str) -> Dict[str, Any]:
+    """Return whatever artifacts a cancelled job produced before it stopped, as scratch handles"""
+    progress = job_progress.pop(job_id, {})
+    logger.debug(f"🔍 pop_partial_result: Job {job_id} stopped at stage '{progress.get('stage', 'none')}'")
+    
+    images = list(progress.get("image_data", []))
+    partial = {
+        "job_id": job_id,
+        # Panels still in flight when the job stopped stay None, so the rest keep their numbers
+        "image_data": images,
+        # Placeholders and panels never produced alike, for repair to pick up
+        "failed_panels": sorted({*progress.get("failed_panels", []), *(i + 1 for i, image in enumerate(images) if image is None)}),
+        "message": f"Cancelled during {progress.get('stage', 'startup')}"
+    }
+    if "scene" in progress:
+        partial["scene"] = progress["scene"]
+    if "panel_descriptions" in progress:
+        partial["panel_descriptions"] = progress["panel_descriptions"]
+    if "record" in progress:
+        # Long-form jobs have already stored every finished page
+        partial["record"] = progress["record"]
+        partial["image_data"] = []
+        partial["failed_panels"] = progress["record"].get("failed_panels", [])
+    return partial
+
 # Simple data models
 @dataclass
 class SceneData:
@@ -55,10 +129,126 @@ class ComicData:
     panels: List[PanelData]
     comic_data: bytes = b""
 
+def _fallback_scene(prompt: str, style: str) -> Dict[str, Any]:
+    """Keyword-based scene used when the LLM is unavailable or out of time"""
+    words = prompt.lower().split()
+    characters = [word for word in words if word in ["kids", "children", "boy", "girl", "robot", "alien", "pirate", "ninja"]]
+    setting = "unknown location"
+    if "spaceship" in prompt.lower():
+        setting = "spaceship"
+    elif "pizza" in prompt.lower():
+        setting = "pizza place"
+    
+    return {
+        "characters": characters,
+        "setting": setting,
+        "actions": [],
+        "mood": "neutral",
+        "style_notes": f"Draw in {style} style"
+    }
+
+def _fallback_panels(scene: Dict[str, Any], panel_count: int) -> List[str]:
+    """Templated panel descriptions used when the LLM is unavailable or out of time"""
+    return [
+        f"Panel {i + 1}: {scene.get('characters', [])} in {scene.get('setting', 'unknown')} doing {scene.get('actions', [])}"
+        for i in range(panel_count)
+    ]
+
+def _scene_from(scene_data: Any, prompt: str, style: str) -> Dict[str, Any]:
+    """Validate an LLM scene against SceneComponents, filling only invalid or missing fields from the fallback"""
+    try:
+        return SceneComponents.model_validate(scene_data).model_dump()
+    except ValidationError as e:
+        if not isinstance(scene_data, dict):
+            return _fallback_scene(prompt, style)
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        logger.warning(f"⚠️ _scene_from: Replacing invalid scene fields {sorted(invalid)} with fallbacks")
+        valid = {key: value for key, value in scene_data.items() if key in SceneComponents.model_fields and key not in invalid}
+        return {**_fallback_scene(prompt, style), **valid}
+
+def _valid_panels(panel_data: Any, panel_count: int) -> Dict[int, str]:
+    """Descriptions by panel number from a PanelPlan-shaped response; invalid, duplicate or extra panels are left out"""
+    panels: Dict[int, str] = {}
+    items = panel_data.get("panels") if isinstance(panel_data, dict) else None
+    for item in items if isinstance(items, list) else []:
+        try:
+            spec = PanelSpec.model_validate(item)
+        except ValidationError:
+            continue
+        if 1 <= spec.panel_number <= panel_count and spec.panel_number not in panels and spec.description.strip():
+            panels[spec.panel_number] = f"{spec.description.strip()} ({spec.camera_angle}, {spec.mood})"
+    return panels
+
+async def _complete_panels(llm_client, panels: Dict[int, str], panel_count: int, scene: Dict[str, Any],
+                           brief: str, timeout: float) -> List[str]:
+    """Exactly panel_count descriptions: ask again for just the missing panels, template whatever still is"""
+    missing = [number for number in range(1, panel_count + 1) if number not in panels]
+    if missing and timeout > 0:
+        logger.info(f"🔧 _complete_panels: Asking again for panels {missing} of {panel_count} only")
+        try:
+            repair_prompt = build_prompt("repair", """
+            {brief}
+            Scene: {scene}
+            Panels already planned: {planned}
+            
+            Write only panels {missing}, consistent with the ones above: exactly {count} panels, using those panel numbers.
+            """, trim=("planned", "scene"), brief=brief, scene=scene, planned={str(number): text for number, text in sorted(panels.items())} or "none",
+                missing=missing, count=len(missing))
+            repair_data = await asyncio.wait_for(llm_client.generate_structured(repair_prompt, PanelPlan), timeout=timeout)
+            panels.update({number: description for number, description in _valid_panels(repair_data, panel_count).items() if number in missing})
+        except Exception as e:
+            logger.warning(f"⚠️ _complete_panels: Follow-up for panels {missing} failed: {e!r}")
+    
+    fallback = _fallback_panels(scene, panel_count)
+    still_missing = [number for number in range(1, panel_count + 1) if number not in panels]
+    if still_missing:
+        logger.warning(f"🔄 _complete_panels: Using templated descriptions for panels {still_missing}")
+    return [panels.get(number, fallback[number - 1]) for number in range(1, panel_count + 1)]
+
+async def _fused_planner(state: ComicState, llm_client) -> ComicState:
+    """Parse the scene and plan the panels in a single LLM call"""
+    prompt = state["prompt"]
+    style = state["style"]
+    panel_count = state["panels"]
+    logger.info(f"⏱️ _fused_planner: {_remaining(state):.1f}s left, fusing scene parsing and panel planning")
+    
+    try:
+        fused_prompt = build_prompt("fused", """
+        Plan a {panel_count}-panel comic for this prompt:
+        Prompt: "{prompt}"
+        Style: {style}
+        
+        Return the scene (characters, setting, actions, mood, style notes) and
+        exactly {panel_count} panels numbered 1 to {panel_count}.
+        """, trim=("prompt",), prompt=prompt, style=style, panel_count=panel_count)
+        timeout = _budget(state, settings.planning_reserve_seconds)
+        data = await asyncio.wait_for(llm_client.generate_structured(fused_prompt, ComicPlan), timeout=timeout)
+        logger.debug(f"✅ _fused_planner: LLM response received: {data}")
+        scene_data = _scene_from(data.get("scene"), prompt, style)
+        panel_descriptions = await _complete_panels(
+            llm_client, _valid_panels(data, panel_count), panel_count, scene_data,
+            f'Plan a {panel_count}-panel comic in {style} style for: "{prompt}"', _budget(state, settings.planning_reserve_seconds)
+        )
+        message = f"Planned scene and {panel_count} panels in one call (deadline)"
+    except Exception as e:
+        logger.warning(f"⚠️ _fused_planner: LLM failed, using fallback: {e!r}")
+        scene_data = _fallback_scene(prompt, style)
+        panel_descriptions = _fallback_panels(scene_data, panel_count)
+        message = f"Planned {panel_count} panels (fallback, deadline)"
+    
+    _record_progress(state, scene=scene_data, panel_descriptions=panel_descriptions)
+    return {
+        **state,
+        "scene": scene_data,
+        "panel_descriptions": panel_descriptions,
+        "messages": state.get("messages", []) + [message]
+    }
+
 # LangGraph Node Functions
 async def scene_parser(state: ComicState) -> ComicState:
     """Extract scene components from user prompt using LLM"""
     logger.debug(f"🔍 scene_parser: Starting with prompt='{state['prompt']}', style='{state['style']}'")
+    _record_progress(state, stage="scene_parser")
     
     prompt = state["prompt"]
     style = state["style"]
@@ -72,25 +262,31 @@ async def scene_parser(state: ComicState) -> ComicState:
     logger.debug("🧠 scene_parser: Getting LLM client")
     llm_client = get_llm_client(api_key)
     
-    # Create structured prompt for scene parsing
-    scene_prompt = f"""
-    Analyze this comic prompt and extract the key elements:
-    Prompt: "{prompt}"
-    Style: {style}
-    
-    Return a JSON object with:
-    - characters: list of character names/descriptions
-    - setting: the location/environment
-    - actions: list of actions/events happening
-    - mood: the overall mood/tone
-    - style_notes: specific style requirements for {style}
-    """
-    
-    logger.debug(f"📝 scene_parser: Sending prompt to LLM: {scene_prompt}...")
+    # Out of time for two planning round-trips: plan scene and panels in one call
+    if _remaining(state) < settings.fused_planning_threshold:
+        return await _fused_planner(state, llm_client)
     
+    # Create structured prompt for scene parsing
     try:
-        scene_data = await llm_client.generate_structured(scene_prompt)
+        scene_prompt = build_prompt("scene", """
+        Analyze this comic prompt and extract the key elements:
+        Prompt: "{prompt}"
+        Style: {style}
+        
+        Return a JSON object with:
+        - characters: list of character names/descriptions
+        - setting: the location/environment
+        - actions: list of actions/events happening
+        - mood: the overall mood/tone
+        - style_notes: specific style requirements for {style}
+        """, trim=("prompt",), prompt=prompt, style=style)
+        logger.debug(f"📝 scene_parser: Sending prompt to LLM: {scene_prompt}...")
+        
+        timeout = _budget(state, settings.planning_reserve_seconds)
+        scene_data = await asyncio.wait_for(llm_client.generate_structured(scene_prompt, SceneComponents), timeout=timeout)
         logger.debug(f"✅ scene_parser: LLM response received: {scene_data}")
+        scene_data = _scene_from(scene_data, prompt, style)
+        _record_progress(state, scene=scene_data)
         
         return {
             **state,
@@ -98,25 +294,14 @@ async def scene_parser(state: ComicState) -> ComicState:
             "messages": state.get("messages", []) + [f"Parsed scene: {len(scene_data.get('characters', []))} characters in {scene_data.get('setting', 'unknown')}"]
         }
     except Exception as e:
-        logger.warning(f"⚠️ scene_parser: LLM failed, using fallback: {e}")
+        logger.warning(f"⚠️ scene_parser: LLM failed, using fallback: {e!r}")
         # Fallback to simple parsing if LLM fails
-        words = prompt.lower().split()
-        characters = [word for word in words if word in ["kids", "children", "boy", "girl", "robot", "alien", "pirate", "ninja"]]
-        setting = "unknown location"
-        if "spaceship" in prompt.lower():
-            setting = "spaceship"
-        elif "pizza" in prompt.lower():
-            setting = "pizza place"
-        
-        scene_data = {
-            "characters": characters,
-            "setting": setting,
-            "actions": [],
-            "mood": "neutral",
-            "style_notes": f"Draw in {style} style"
-        }
+        scene_data = _fallback_scene(prompt, style)
+        characters = scene_data["characters"]
+        setting = scene_data["setting"]
         
         logger.debug(f"🔄 scene_parser: Fallback scene data: {scene_data}")
+        _record_progress(state, scene=scene_data)
         
         return {
             **state,
@@ -126,7 +311,12 @@ async def scene_parser(state: ComicState) -> ComicState:
 
 async def panel_planner(state: ComicState) -> ComicState:
     """Break scene into comic panels using LLM"""
+    if state.get("panel_descriptions"):
+        logger.debug("⏭️ panel_planner: Panels already planned by the fused planner")
+        return state
+    
     logger.debug(f"🔍 panel_planner: Starting with {state['panels']} panels, scene={state['scene']}")
+    _record_progress(state, stage="panel_planner")
     
     scene = state["scene"]
     panel_count = state["panels"]
@@ -138,69 +328,29 @@ async def panel_planner(state: ComicState) -> ComicState:
     llm_client = get_llm_client(api_key)
     
     # Create prompt for panel planning
-    panel_prompt = f"""
-    Create exactly {panel_count} comic panel descriptions for this story:
-    Original prompt: "{prompt}"
-    Style: {style}
-    Scene: {scene}
-    
-    Each panel should advance the story. Return a JSON object with exactly {panel_count} panels:
-    {{
-        "panels": [
-            {{"panel_number": 1, "description": "Detailed description for panel 1"}},
-            {{"panel_number": 2, "description": "Detailed description for panel 2"}},
-            ...
-        ]
-    }}
-    
-    IMPORTANT: You must return exactly {panel_count} panels. Each description should be detailed enough for image generation.
-    """
-    
-    logger.debug(f"📝 panel_planner: Sending panel prompt to LLM: {panel_prompt}...")
-    
     try:
-        panel_data = await llm_client.generate_structured(panel_prompt)
-        logger.debug(f"✅ panel_planner: LLM response received: {panel_data}")
-        
-        # Handle different response formats
-        panel_descriptions = []
-        
-        if isinstance(panel_data, list):
-            # Direct list of descriptions
-            panel_descriptions = [str(desc) for desc in panel_data]
-        elif isinstance(panel_data, dict):
-            # JSON object with panels array
-            if 'panels' in panel_data:
-                panels = panel_data['panels']
-                for panel in panels:
-                    if isinstance(panel, dict) and 'description' in panel:
-                        panel_descriptions.append(panel['description'])
-                    else:
-                        panel_descriptions.append(str(panel))
-            else:
-                # Try to extract descriptions from any key
-                for key, value in panel_data.items():
-                    if isinstance(value, str):
-                        panel_descriptions.append(value)
-                    elif isinstance(value, dict) and 'description' in value:
-                        panel_descriptions.append(value['description'])
-        elif isinstance(panel_data, str):
-            # Single string response
-            panel_descriptions = [panel_data]
-        else:
-            # Fallback: convert to string
-            panel_descriptions = [str(panel_data)]
+        panel_prompt = build_prompt("panels", """
+        Create exactly {panel_count} comic panel descriptions for this story:
+        Original prompt: "{prompt}"
+        Style: {style}
+        Scene: {scene}
         
-        logger.debug(f"📝 panel_planner: Extracted {len(panel_descriptions)} panel descriptions: {panel_descriptions}")
+        Each panel should advance the story. Return exactly {panel_count} panels numbered
+        1 to {panel_count}. Each description should be detailed enough for image generation.
+        """, trim=("scene", "prompt"), prompt=prompt, style=style, scene=scene, panel_count=panel_count)
+        logger.debug(f"📝 panel_planner: Sending panel prompt to LLM: {panel_prompt}...")
         
-        # Ensure we have the right number of panels
-        while len(panel_descriptions) < panel_count:
-            fallback_desc = f"Panel {len(panel_descriptions) + 1}: {scene.get('characters', [])} in {scene.get('setting', 'unknown')}"
-            panel_descriptions.append(fallback_desc)
-            logger.debug(f"🔄 panel_planner: Added fallback panel: {fallback_desc}")
+        timeout = _budget(state, settings.image_reserve_seconds)
+        panel_data = await asyncio.wait_for(llm_client.generate_structured(panel_prompt, PanelPlan), timeout=timeout)
+        logger.debug(f"✅ panel_planner: LLM response received: {panel_data}")
         
-        panel_descriptions = panel_descriptions[:panel_count]
+        # Short or invalid plans cost one follow-up for the missing panels, not the whole plan
+        panel_descriptions = await _complete_panels(
+            llm_client, _valid_panels(panel_data, panel_count), panel_count, scene,
+            f'Plan a {panel_count}-panel comic in {style} style for: "{prompt}"', _budget(state, settings.image_reserve_seconds)
+        )
         logger.debug(f"📊 panel_planner: Final panel descriptions: {panel_descriptions}")
+        _record_progress(state, panel_descriptions=panel_descriptions)
         
         return {
             **state,
@@ -208,14 +358,12 @@ async def panel_planner(state: ComicState) -> ComicState:
             "messages": state.get("messages", []) + [f"Planned {len(panel_descriptions)} panels using LLM"]
         }
     except Exception as e:
-        logger.warning(f"⚠️ panel_planner: LLM failed, using fallback: {e}")
+        logger.warning(f"⚠️ panel_planner: LLM failed, using fallback: {e!r}")
         # Fallback to simple panel creation
-        panel_descriptions = []
-        for i in range(panel_count):
-            description = f"Panel {i + 1}: {scene.get('characters', [])} in {scene.get('setting', 'unknown')} doing {scene.get('actions', [])}"
-            panel_descriptions.append(description)
+        panel_descriptions = _fallback_panels(scene, panel_count)
         
         logger.debug(f"🔄 panel_planner: Fallback panel descriptions: {panel_descriptions}")
+        _record_progress(state, panel_descriptions=panel_descriptions)
         
         return {
             **state,
@@ -223,137 +371,202 @@ async def panel_planner(state: ComicState) -> ComicState:
             "messages": state.get("messages", []) + [f"Planned {panel_count} panels (fallback)"]
         }
 
-async def image_generator(state: ComicState) -> ComicState:
-    """Generate images for each panel using DALL-E"""
-    logger.debug(f"🔍 image_generator: Starting with {len(state['panel_descriptions'])} panel descriptions")
+async def render_panel_images(state: ComicState, panel_descriptions: List[str], image_data_list: List[Any],
+                              panel_numbers: Optional[List[int]] = None, placeholders: bool = True) -> List[int]:
+    """Generate an image per description into image_data_list as scratch handles.
     
-    panel_descriptions = state["panel_descriptions"]
+    Panels that fail or run out of time get a placeholder, or stay None when
+    placeholders is False; their numbers are returned. panel_numbers (default
+    1..n) label them in logs and placeholders.
+    """
+    panel_numbers = panel_numbers or list(range(1, len(panel_descriptions) + 1))
     style = state["style"]
     scene = state["scene"]
+    output_format = state["output_format"]
+    tier_options = image_tier_options(state.get("image_tier"))
     
     # Get image generator
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        logger.error("❌ image_generator: OPENAI_API_KEY environment variable required")
+        logger.error("❌ render_panel_images: OPENAI_API_KEY environment variable required")
         raise Exception("OPENAI_API_KEY environment variable required")
     
-    logger.debug("🎨 image_generator: Getting image generator")
+    logger.debug("🎨 render_panel_images: Getting image generator")
     image_gen = get_image_generator(api_key)
-    
-    image_data_list = []
-    
-    for i, description in enumerate(panel_descriptions):
-        logger.debug(f"🎨 image_generator: Generating image {i+1}/{len(panel_descriptions)}: {description[:50]}...")
-        
+    scratch = get_scratch_store()
+    # Sibling jobs rendering one plan share a scheduler; otherwise the job gets its own
+    semaphore = state.get("image_slots") or asyncio.Semaphore(settings.image_concurrency)
+    failed: List[int] = []
+    # Visible to pop_partial_result if the job stops before the stage returns
+    _record_progress(state, failed_panels=failed)
+    
+    async def render_panel(i: int, description: str):
+        panel_number = panel_numbers[i]
+        # Only the description differs between panels; the style line is trimmed first
         try:
-            # Create detailed image prompt
-            image_prompt = f"""
-            Create a comic panel image: {description}
-            Style: {style}
-            Mood: {scene.get('mood', 'neutral')}
-            Style notes: {scene.get('style_notes', '')}
-            
-            Make it visually appealing and clear. Comic book style, vibrant colors.
-            """
-            
-            logger.debug(f"📝 image_generator: Sending image prompt: {image_prompt.strip()[:100]}...")
-            
-            # Generate image
-            image_data = await image_gen.generate_image(image_prompt.strip())
-            logger.debug(f"✅ image_generator: Image {i+1} generated, size: {len(image_data)} bytes")
-            image_data_list.append(image_data)
-            
+            image_prompt = build_prompt("image", """
+            Comic panel: {description}
+            Style: {style}. Mood: {mood}. {style_notes}
+            Clear, vibrant comic book art.
+            """, trim=("style_notes", "description"), description=description, style=style,
+                mood=scene.get("mood") or "neutral", style_notes=scene.get("style_notes") or "")
         except Exception as e:
-            logger.warning(f"⚠️ image_generator: Image generation failed for panel {i+1}: {e}")
-            # Create a simple placeholder image if generation fails
-            from PIL import Image, ImageDraw, ImageFont
-            
-            # Create a placeholder image
-            img = Image.new('RGB', (512, 512), color='lightgray')
-            draw = ImageDraw.Draw(img)
-            
-            try:
-                font = ImageFont.truetype("Arial.ttf", 20)
-            except:
-                font = ImageFont.load_default()
-            
-            draw.text((50, 200), f"Panel {i+1}", fill='black', font=font)
-            draw.text((50, 250), "Image generation failed", fill='red', font=font)
-            
-            # Convert to bytes
-            from io import BytesIO
-            output = BytesIO()
-            img.save(output, format='PNG')
-            placeholder_data = output.getvalue()
-            logger.debug(f"🔄 image_generator: Created placeholder for panel {i+1}, size: {len(placeholder_data)} bytes")
-            image_data_list.append(placeholder_data)
+            # Only this panel falls back to a placeholder, the rest of the stage carries on
+            logger.warning(f"⚠️ render_panel_images: Could not build the prompt for panel {panel_number}: {e}")
+            image_prompt = None
+        
+        async with semaphore:
+            attempts = 1 + settings.image_retries if image_prompt else 0
+            for attempt in range(attempts):
+                # Sub-deadline: whatever is left once layout time is set aside
+                timeout = _budget(state, settings.layout_reserve_seconds)
+                if timeout <= 0:
+                    logger.warning(f"⏱️ render_panel_images: No time left for panel {panel_number}")
+                    failed.append(panel_number)
+                    if not placeholders:
+                        return
+                    placeholder = await get_render_pool().run(render_panel_placeholder, panel_number, "Out of time", output_format)
+                    image_data_list[i] = await scratch.aput(placeholder)
+                    return
+                
+                # Tight budget: fall back to the cheaper, faster model and size,
+                # unless the tier already uses it
+                kwargs = tier_options
+                if _remaining(state) < settings.degraded_image_threshold and tier_options["model"] != settings.degraded_image_model:
+                    kwargs = {"model": settings.degraded_image_model, "size": settings.degraded_image_size, "quality": "standard"}
+                    logger.info(f"⏱️ render_panel_images: {_remaining(state):.1f}s left, degrading panel {panel_number} to {kwargs}")
+                
+                logger.debug(f"🎨 render_panel_images: Generating panel {panel_number} (attempt {attempt+1}/{attempts}): {description[:50]}...")
+                try:
+                    image_data = await asyncio.wait_for(image_gen.generate_image(image_prompt, **kwargs), timeout=timeout)
+                    logger.debug(f"✅ render_panel_images: Panel {panel_number} generated, size: {len(image_data)} bytes")
+                    # DALL-E returns PNG; re-encode when another output format was asked for
+                    if sniff_media_type(image_data) != media_type_for(output_format):
+                        image_data = await get_render_pool().run(transcode, image_data, output_format)
+                    image_data_list[i] = await scratch.aput(image_data)
+                    return
+                except Exception as e:
+                    logger.warning(f"⚠️ render_panel_images: Image generation failed for panel {panel_number}: {e!r}")
+                    # Retrying is only worth it while the budget is comfortable
+                    if _remaining(state) < settings.degraded_image_threshold:
+                        break
+        
+        # Create a simple placeholder image if generation fails
+        failed.append(panel_number)
+        if not placeholders:
+            return
+        placeholder = await get_render_pool().run(render_panel_placeholder, panel_number, "Image generation failed", output_format)
+        image_data_list[i] = await scratch.aput(placeholder)
+        logger.debug(f"🔄 render_panel_images: Created placeholder for panel {panel_number}, size: {len(placeholder)} bytes")
+    
+    await asyncio.gather(*(render_panel(i, description) for i, description in enumerate(panel_descriptions)))
+    return sorted(failed)
+
+async def image_generator(state: ComicState) -> ComicState:
+    """Generate images for each panel using DALL-E"""
+    logger.debug(f"🔍 image_generator: Starting with {len(state['panel_descriptions'])} panel descriptions")
+    
+    panel_descriptions = state["panel_descriptions"]
     
-    logger.debug(f"✅ image_generator: Generated {len(image_data_list)} images total")
+    # Panels are filled in place so a cancelled job keeps the ones already paid for
+    image_data_list = [None] * len(panel_descriptions)
+    _record_progress(state, stage="image_generator", image_data=image_data_list)
+    failed = await render_panel_images(state, panel_descriptions, image_data_list)
+    
+    logger.debug(f"✅ image_generator: Generated {len(image_data_list)} images total, {len(failed)} failed")
     
     return {
         **state,
         "image_data": image_data_list,
-        "messages": state.get("messages", []) + [f"Generated {len(image_data_list)} images in {style} style"]
+        "failed_panels": failed,
+        "messages": state.get("messages", []) + [f"Generated {len(image_data_list)} images in {state['style']} style"]
     }
 
 async def layout_assembler(state: ComicState) -> ComicState:
     """Assemble panels into final comic"""
     logger.debug(f"🔍 layout_assembler: Starting with {len(state['image_data'])} images")
+    _record_progress(state, stage="layout_assembler")
     
-    image_data_list = state["image_data"]
+    scratch = get_scratch_store()
     job_id = state["job_id"]
     prompt = state["prompt"]
     
-    # Get image generator for layout creation
-    api_key = os.getenv("OPENAI_API_KEY")
-    logger.debug("🎨 layout_assembler: Getting image generator for layout")
-    image_gen = get_image_generator(api_key)
+    # Pillow work is CPU-bound; keep it off the event loop
+    render_pool = get_render_pool()
     
     try:
         logger.debug(f"📝 layout_assembler: Creating comic layout with title: {prompt[:50]}")
-        # Create comic layout
-        comic_data = image_gen.create_comic_layout(image_data_list, title=prompt[:50])
+        # The layout is the one place every panel's bytes are needed at once
+        image_data_list = await asyncio.gather(*(scratch.aget(handle) for handle in state["image_data"]))
+        comic_data = await render_pool.run(create_comic_layout, image_data_list, prompt[:50], settings.layout_resample, state["output_format"])
+        del image_data_list
         logger.debug(f"✅ layout_assembler: Comic layout created, size: {len(comic_data)} bytes")
         
         return {
             **state,
-            "comic_data": comic_data,
+            "comic_data": await scratch.aput(comic_data),
             "messages": state.get("messages", []) + ["Comic assembled successfully with real images"]
         }
     except Exception as e:
         logger.warning(f"⚠️ layout_assembler: Layout creation failed, using fallback: {e}")
         # Create a simple fallback layout
-        from PIL import Image, ImageDraw, ImageFont
-        
-        # Create a simple layout
-        total_width = 1024
-        total_height = 768
-        canvas = Image.new('RGB', (total_width, total_height), 'white')
-        draw = ImageDraw.Draw(canvas)
-        
-        try:
-            font = ImageFont.truetype("Arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
-        
-        draw.text((50, 50), f"Comic: {prompt[:50]}", fill='black', font=font)
-        draw.text((50, 100), f"Job ID: {job_id}", fill='gray', font=font)
-        draw.text((50, 150), "Layout assembly failed - using fallback", fill='red', font=font)
-        
-        # Convert to bytes
-        from io import BytesIO
-        output = BytesIO()
-        canvas.save(output, format='PNG')
-        comic_data = output.getvalue()
+        comic_data = await render_pool.run(render_fallback_layout, prompt, job_id, state["output_format"])
         
         logger.debug(f"🔄 layout_assembler: Created fallback layout, size: {len(comic_data)} bytes")
         
         return {
             **state,
-            "comic_data": comic_data,
+            "comic_data": await scratch.aput(comic_data),
             "messages": state.get("messages", []) + ["Comic assembled with fallback layout"]
         }
 
+async def finalize_panels(state: Dict[str, Any], draft_images: List[bytes], panel_numbers: List[int]) -> Dict[str, Any]:
+    """Re-render a draft's chosen panels at the state's image tier and re-assemble the comic.
+    
+    state carries the draft's prompt, style, scene and panel_descriptions. Panels
+    that are not chosen, or whose upgrade fails, keep their draft image. Background
+    repair uses the same path to replace placeholders and, as None draft images,
+    panels a job stopped before producing.
+    """
+    logger.debug(f"🔍 finalize_panels: Upgrading panels {panel_numbers} of job {state['job_id']} to {state['image_tier']}")
+    scratch = get_scratch_store()
+    deadline_seconds = state.get("deadline_seconds") or settings.job_deadline_seconds
+    state = {**state, "deadline": time.monotonic() + deadline_seconds}
+    
+    upgraded = [None] * len(panel_numbers)
+    _record_progress(state, stage="finalize", image_data=upgraded)
+    try:
+        descriptions = [state["panel_descriptions"][number - 1] for number in panel_numbers]
+        await render_panel_images(state, descriptions, upgraded, panel_numbers, placeholders=False)
+        
+        final_images = list(draft_images)
+        for number, handle in zip(panel_numbers, upgraded):
+            if handle is not None:
+                final_images[number - 1] = await scratch.aget(handle)
+        for number, image in enumerate(final_images, 1):
+            # Never produced because the job stopped early, and still failing
+            if image is None:
+                final_images[number - 1] = await get_render_pool().run(
+                    render_panel_placeholder, number, "Image generation failed", state["output_format"]
+                )
+        comic_data = await get_render_pool().run(
+            create_comic_layout, final_images, state["prompt"][:50], settings.layout_resample, state["output_format"]
+        )
+        image_data = [await scratch.aput(image) for image in final_images]
+        del final_images
+    finally:
+        scratch.release(upgraded)
+        job_progress.pop(state["job_id"], None)
+    
+    done = sum(1 for handle in upgraded if handle is not None)
+    logger.debug(f"✅ finalize_panels: Upgraded {done}/{len(panel_numbers)} panels of job {state['job_id']}")
+    return {
+        "image_data": image_data,
+        "comic_data": await scratch.aput(comic_data),
+        "upgraded": [number for number, handle in zip(panel_numbers, upgraded) if handle is not None],
+        "message": f"Upgraded {done} of {len(panel_numbers)} panels to {state['image_tier']}"
+    }
+
 # Create the LangGraph workflow
 def create_comic_workflow():
     """Create the LangGraph workflow for comic generation"""
@@ -381,6 +594,82 @@ def create_comic_workflow():
     
     return compiled_workflow
 
+def create_planning_workflow():
+    """Create the planning half of the workflow: scene parsing and panel planning only"""
+    logger.debug("🔧 create_planning_workflow: Creating LangGraph workflow")
+    
+    workflow = StateGraph(ComicState)
+    workflow.add_node("scene_parser", scene_parser)
+    workflow.add_node("panel_planner", panel_planner)
+    
+    workflow.set_entry_point("scene_parser")
+    workflow.add_edge("scene_parser", "panel_planner")
+    workflow.add_edge("panel_planner", END)
+    
+    return workflow.compile()
+
+def create_render_workflow():
+    """Create the rendering half of the workflow, for state that already carries a plan"""
+    logger.debug("🔧 create_render_workflow: Creating LangGraph workflow")
+    
+    workflow = StateGraph(ComicState)
+    workflow.add_node("image_generator", image_generator)
+    workflow.add_node("layout_assembler", layout_assembler)
+    
+    workflow.set_entry_point("image_generator")
+    workflow.add_edge("image_generator", "layout_assembler")
+    workflow.add_edge("layout_assembler", END)
+    
+    return workflow.compile()
+
+def plan_for_style(plan: Dict[str, Any], planned_style: str, style: str) -> Dict[str, Any]:
+    """A plan made for one art style, re-aimed at another: only the style notes change"""
+    if style == planned_style:
+        return plan
+    return {**plan, "scene": {**plan["scene"], "style_notes": f"Draw in {style} style"}}
+
+def create_plan_pipeline():
+    """Create a pipeline that only plans: scene and panel descriptions, no images"""
+    logger.debug("🚀 create_plan_pipeline: Creating plan pipeline")
+    workflow = create_planning_workflow()
+    
+    async def plan(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Plan a comic; raises on timeout, since there is nothing partial worth keeping"""
+        deadline_seconds = state.get("deadline_seconds") or settings.job_deadline_seconds
+        # Fixed when the request arrived, if the caller knows when that was
+        deadline = state.get("deadline") or time.monotonic() + deadline_seconds
+        langgraph_state = {
+            "prompt": state["prompt"],
+            "style": state["style"],
+            "panels": state["panels"],
+            "job_id": state["job_id"],
+            "deadline": deadline,
+            "messages": []
+        }
+        
+        try:
+            result = await asyncio.wait_for(workflow.ainvoke(langgraph_state), timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            job_progress.pop(state["job_id"], None)
+        logger.debug(f"✅ plan: Planned {len(result['panel_descriptions'])} panels for job {state['job_id']}")
+        return {
+            "scene": result["scene"],
+            "panel_descriptions": result["panel_descriptions"],
+            "messages": result["messages"]
+        }
+    
+    return plan
+
+def unfinished_result(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Result of a job that stopped early: the panels it produced, and the rest as failed_panels"""
+    partial = pop_partial_result(state["job_id"])
+    if not partial["image_data"]:
+        # Stopped before any image was started: every panel is missing
+        descriptions = partial.get("panel_descriptions") or state.get("panel_descriptions") or []
+        partial["image_data"] = [None] * len(descriptions)
+        partial["failed_panels"] = list(range(1, (len(descriptions) or state["panels"]) + 1))
+    return {**state, **partial}
+
 # Main pipeline function that uses LangGraph
 def create_comic_pipeline():
     """Create the main comic generation pipeline using LangGraph"""
@@ -388,6 +677,7 @@ def create_comic_pipeline():
     
     # Create the LangGraph workflow
     workflow = create_comic_workflow()
+    render_workflow = create_render_workflow()
     
     async def pipeline(state: Dict[str, Any]) -> Dict[str, Any]:
         """Main pipeline that runs the LangGraph workflow"""
@@ -398,50 +688,74 @@ def create_comic_pipeline():
             state["job_id"] = str(uuid.uuid4())
             logger.debug(f"🆔 pipeline: Generated job_id: {state['job_id']}")
         
+        # The deadline is absolute so every node sees the same shrinking budget; callers
+        # pass the one fixed when the request arrived, so queueing counts against it
+        deadline_seconds = state.get("deadline_seconds") or settings.job_deadline_seconds
+        deadline = state.get("deadline") or time.monotonic() + deadline_seconds
+        
         # Initialize LangGraph state
         langgraph_state = {
             "prompt": state["prompt"],
             "style": state["style"],
             "panels": state["panels"],
             "job_id": state["job_id"],
+            "deadline": deadline,
+            "output_format": state.get("output_format") or settings.output_format,
+            "image_tier": state.get("image_tier") or settings.image_tier,
             "messages": []
         }
         
+        # An approved plan (from create_plan_pipeline) goes straight to rendering
+        planned = bool(state.get("panel_descriptions"))
+        if planned:
+            langgraph_state["scene"] = state["scene"]
+            langgraph_state["panel_descriptions"] = state["panel_descriptions"]
+        if state.get("image_slots"):
+            langgraph_state["image_slots"] = state["image_slots"]
+        
         logger.debug(f"📋 pipeline: Initialized LangGraph state: {langgraph_state}")
         
         # Run the LangGraph workflow
         try:
             logger.debug("🚀 pipeline: Invoking LangGraph workflow")
-            result = await workflow.ainvoke(langgraph_state)
+            # Nodes degrade on their own as the budget shrinks; this is only a backstop
+            result = await asyncio.wait_for(
+                (render_workflow if planned else workflow).ainvoke(langgraph_state), timeout=max(0.0, deadline - time.monotonic())
+            )
             logger.debug(f"✅ pipeline: LangGraph workflow completed, result keys: {list(result.keys())}")
             
-            # Convert image data to base64 for API response
-            image_data_b64 = []
-            for i, img_data in enumerate(result.get("image_data", [])):
-                image_data_b64.append(base64.b64encode(img_data).decode('utf-8'))
-                logger.debug(f"🖼️ pipeline: Converted image {i+1} to base64, size: {len(img_data)} bytes")
-            
-            comic_data_b64 = base64.b64encode(result.get("comic_data", b"")).decode('utf-8')
-            logger.debug(f"📄 pipeline: Converted comic data to base64, size: {len(result.get('comic_data', b''))} bytes")
-            
-            # Convert back to our format
+            # Raw bytes are handed straight to the caller; base64 is the API's concern
             final_result = {
                 **state,
                 "scene": result["scene"],
                 "panel_descriptions": result["panel_descriptions"],
-                "image_data": image_data_b64,
-                "comic_data": comic_data_b64,
+                "image_data": result.get("image_data", []),
+                "comic_data": result.get("comic_data"),
+                "failed_panels": result.get("failed_panels", []),
                 "messages": result["messages"],
                 "message": result["messages"][-1] if result["messages"] else "Pipeline completed"
             }
             
-            logger.debug(f"✅ pipeline: Final result prepared with {len(image_data_b64)} images")
+            logger.debug(f"✅ pipeline: Final result prepared with {len(final_result['image_data'])} images")
+            job_progress.pop(state["job_id"], None)
             return final_result
             
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ pipeline: Job {state['job_id']} exceeded its {deadline_seconds}s deadline")
+            return {
+                **unfinished_result(state),
+                "error": "Deadline exceeded",
+                "message": f"Deadline exceeded after {deadline_seconds}s"
+            }
+        except asyncio.CancelledError:
+            # Cancellation propagates into whichever provider call is pending;
+            # progress is left in place for pop_partial_result()
+            logger.info(f"🛑 pipeline: Workflow cancelled for job {state['job_id']}")
+            raise
         except Exception as e:
             logger.error(f"❌ pipeline: Workflow failed: {e}")
             return {
-                **state,
+                **unfinished_result(state),
                 "error": str(e),
                 "message": f"Pipeline failed: {str(e)}"
             }
@@ -20,6 +20,30 @@ class Settings(BaseSettings):
     # Storage Configuration
     storage_dir: str = "./output"
     comic_output_dir: str = "./output/comics"
+    storage_backend: str = Field(default="local", env="STORAGE_BACKEND")  # local or s3
+    s3_bucket: Optional[str] = Field(default=None, env="S3_BUCKET")
+    s3_prefix: str = Field(default="", env="S3_PREFIX")
+    s3_endpoint_url: Optional[str] = Field(default=None, env="S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+    s3_region: Optional[str] = Field(default=None, env="S3_REGION")
+    s3_access_key_id: Optional[str] = Field(default=None, env="S3_ACCESS_KEY_ID")
+    s3_secret_access_key: Optional[str] = Field(default=None, env="S3_SECRET_ACCESS_KEY")
+    s3_presign_expiry: int = Field(default=3600, env="S3_PRESIGN_EXPIRY")
+    s3_multipart_threshold_mb: int = Field(default=8, env="S3_MULTIPART_THRESHOLD_MB")
+    # Images in flight (pipeline state, unsaved results) beyond this budget spill to SCRATCH_DIR
+    scratch_dir: str = Field(default="./output/scratch", env="SCRATCH_DIR")
+    scratch_memory_mb: float = Field(default=32.0, env="SCRATCH_MEMORY_MB")
+    scratch_release_delay_seconds: float = Field(default=10.0, env="SCRATCH_RELEASE_DELAY_SECONDS")  # grace for in-flight reads once stored
+    comic_index_path: str = Field(default="./output/comics/index.sqlite3", env="COMIC_INDEX_PATH")
+    retention_quota_gb: float = Field(default=0, env="RETENTION_QUOTA_GB")  # 0 disables the quota
+    retention_max_age_days: float = Field(default=0, env="RETENTION_MAX_AGE_DAYS")  # 0 disables the age limit
+    retention_interval_seconds: float = Field(default=300, env="RETENTION_INTERVAL_SECONDS")
+    retention_batch_size: int = Field(default=50, env="RETENTION_BATCH_SIZE")
+    access_touch_interval: float = Field(default=60, env="ACCESS_TOUCH_INTERVAL")
+    artifact_writer_threads: int = Field(default=4, env="ARTIFACT_WRITER_THREADS")
+    artifact_fsync: str = Field(default="file", env="ARTIFACT_FSYNC")  # none, file or full
+    artifact_cache_control: str = Field(default="public, max-age=31536000, immutable", env="ARTIFACT_CACHE_CONTROL")
+    # When set (e.g. "/protected-comics"), local artifacts are handed to nginx via X-Accel-Redirect
+    x_accel_redirect_prefix: Optional[str] = Field(default=None, env="X_ACCEL_REDIRECT_PREFIX")
     
     # Server Configuration
     host: str = "0.0.0.0"
@@ -29,11 +53,71 @@ class Settings(BaseSettings):
     # Job Configuration
     max_panels: int = Field(default=6, env="MAX_PANELS")
     min_panels: int = Field(default=2, env="MIN_PANELS")
+    max_concurrent_jobs: int = Field(default=4, env="MAX_CONCURRENT_JOBS")
+    disconnect_poll_interval: float = Field(default=0.5, env="DISCONNECT_POLL_INTERVAL")
+    idempotency_key_seconds: float = Field(default=86400.0, env="IDEMPOTENCY_KEY_SECONDS")  # how long a retry can reuse a key
+    plan_ttl_seconds: float = Field(default=3600.0, env="PLAN_TTL_SECONDS")  # how long a /plan waits for its /render
     
     # Image Generation Settings
     image_width: int = Field(default=1024, env="IMAGE_WIDTH")
     image_height: int = Field(default=1024, env="IMAGE_HEIGHT")
     image_quality: str = Field(default="standard", env="IMAGE_QUALITY")
+    image_tier: str = Field(default="standard", env="IMAGE_TIER")  # draft, balanced, standard or hd
+    draft_image_tier: str = Field(default="draft", env="DRAFT_IMAGE_TIER")  # progressive jobs render this first
+    progressive_auto_finalize: bool = Field(default=True, env="PROGRESSIVE_AUTO_FINALIZE")
+    image_concurrency: int = Field(default=3, env="IMAGE_CONCURRENCY")
+    image_retries: int = Field(default=1, env="IMAGE_RETRIES")
+    repair_attempts: int = Field(default=5, env="REPAIR_ATTEMPTS")  # background retries of failed panels
+    repair_backoff_seconds: float = Field(default=15.0, env="REPAIR_BACKOFF_SECONDS")  # doubles after every attempt
+    repair_backoff_max_seconds: float = Field(default=300.0, env="REPAIR_BACKOFF_MAX_SECONDS")
+    
+    # Prompt Budgets (estimated input tokens per stage, see utils/prompts.py)
+    prompt_token_budgets: str = Field(
+        default="scene:300,fused:400,panels:800,repair:1200,outline:500,page:900,image:250",
+        env="PROMPT_TOKEN_BUDGETS"
+    )
+    
+    # Deadline Budgets (seconds)
+    job_deadline_seconds: float = Field(default=45.0, env="JOB_DEADLINE_SECONDS")
+    planning_reserve_seconds: float = Field(default=20.0, env="PLANNING_RESERVE_SECONDS")
+    image_reserve_seconds: float = Field(default=15.0, env="IMAGE_RESERVE_SECONDS")
+    layout_reserve_seconds: float = Field(default=2.0, env="LAYOUT_RESERVE_SECONDS")
+    fused_planning_threshold: float = Field(default=35.0, env="FUSED_PLANNING_THRESHOLD")
+    degraded_image_threshold: float = Field(default=20.0, env="DEGRADED_IMAGE_THRESHOLD")
+    degraded_image_model: str = Field(default="dall-e-2", env="DEGRADED_IMAGE_MODEL")
+    degraded_image_size: str = Field(default="512x512", env="DEGRADED_IMAGE_SIZE")
+    
+    # Long-form Comics (outline first, then planned and composed page by page)
+    long_form_max_panels: int = Field(default=60, env="LONG_FORM_MAX_PANELS")
+    panels_per_page: int = Field(default=6, env="PANELS_PER_PAGE")
+    long_form_plan_concurrency: int = Field(default=4, env="LONG_FORM_PLAN_CONCURRENCY")
+    long_form_page_seconds: float = Field(default=60.0, env="LONG_FORM_PAGE_SECONDS")
+    
+    # Render Pool (executor: thread or process)
+    render_executor: str = Field(default="thread", env="RENDER_EXECUTOR")
+    render_workers: int = Field(default=2, env="RENDER_WORKERS")
+    layout_resample: str = Field(default="balanced", env="LAYOUT_RESAMPLE")
+    layout_panel_max: int = Field(default=512, env="LAYOUT_PANEL_MAX")
+    tile_cache_mb: float = Field(default=64.0, env="TILE_CACHE_MB")
+    font_paths: str = Field(default="DejaVuSans.ttf,Arial.ttf", env="FONT_PATHS")
+    title_font_size: int = Field(default=24, env="TITLE_FONT_SIZE")
+    placeholder_font_size: int = Field(default=20, env="PLACEHOLDER_FONT_SIZE")
+    
+    # Output Encoders (format: png, webp, avif or jpeg)
+    output_format: str = Field(default="png", env="OUTPUT_FORMAT")
+    png_compress_level: int = Field(default=6, env="PNG_COMPRESS_LEVEL")
+    png_optimize: bool = Field(default=False, env="PNG_OPTIMIZE")
+    webp_quality: int = Field(default=80, env="WEBP_QUALITY")
+    webp_lossless: bool = Field(default=False, env="WEBP_LOSSLESS")
+    webp_method: int = Field(default=4, env="WEBP_METHOD")
+    avif_quality: int = Field(default=60, env="AVIF_QUALITY")
+    avif_speed: int = Field(default=6, env="AVIF_SPEED")
+    jpeg_quality: int = Field(default=85, env="JPEG_QUALITY")
+    negotiate_formats: str = Field(default="avif,webp", env="NEGOTIATE_FORMATS")
+    
+    # Thumbnails (comma-separated widths allowed in ?w=)
+    thumbnail_widths: str = Field(default="128,256,400,800", env="THUMBNAIL_WIDTHS")
+    gallery_thumbnail_width: int = Field(default=400, env="GALLERY_THUMBNAIL_WIDTH")
     
     class Config:
         env_file = ".env"
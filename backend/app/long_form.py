@@ -0,0 +1,319 @@
+"""
+Long-form comics (dozens of panels) as a LangGraph pipeline.
+
+Planning is hierarchical: one LLM call outlines the story page by page,
+then each page's panels are planned in parallel. Pages are then rendered
+and composed one at a time, and each finished page is stored (panels, page
+image, updated job record) before the next one starts, so peak memory is
+one page's worth of images. The stored record carries per-page state, which
+is what lets POST /jobs/{job_id}/resume pick up where a job stopped.
+"""
+
+import os
+import math
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, TypedDict
+
+from langgraph.graph import StateGraph, END
+
+from pydantic import ValidationError
+
+from .config import settings
+from .schemas import PanelPlan, Outline, PageSummary
+from .comic_pipeline import (
+    job_progress, render_panel_images, _record_progress, _valid_panels, _complete_panels,
+    _scene_from, _fallback_scene, _fallback_panels
+)
+from .utils.llm import get_llm_client
+from .utils.prompts import build_prompt
+from .utils.layout import create_comic_layout
+from .utils.render_pool import get_render_pool
+from .utils.storage import get_artifact_writer, job_key
+from .utils.manifest import get_comic_index
+from .utils.scratch import get_scratch_store
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class LongFormState(TypedDict):
+    """State schema for the long-form pipeline"""
+    prompt: str
+    style: str
+    panels: int
+    panels_per_page: int
+    job_id: str
+    deadline: float  # time.monotonic() by which the current page must finish
+    output_format: str
+    image_tier: str
+    scene: Dict[str, Any]  # Story-wide characters, setting, mood and style notes
+    record: Dict[str, Any]  # Job record, rewritten to storage after every page
+    messages: List[str]
+
+def page_sizes(panels: int, panels_per_page: int) -> List[int]:
+    """Panels on each page: full pages, then whatever is left over"""
+    pages = math.ceil(panels / panels_per_page)
+    return [min(panels_per_page, panels - page * panels_per_page) for page in range(pages)]
+
+def _new_record(state: LongFormState) -> Dict[str, Any]:
+    """Job record for a long-form job that has not rendered anything yet"""
+    return {
+        "job_id": state["job_id"],
+        "created": time.time(),
+        "style": state["style"],
+        "prompt": state["prompt"],
+        "key": job_key(state["job_id"]),
+        "mode": "long",
+        "panel_count": state["panels"],
+        "panels_per_page": state["panels_per_page"],
+        "output_format": state["output_format"],
+        "image_tier": state["image_tier"],
+        "outline": None,
+        "comic": None,
+        "panels": [],
+        "pages": [
+            {"page": i + 1, "state": "pending", "size": size, "summary": None, "plan": None, "image": None, "panels": []}
+            for i, size in enumerate(page_sizes(state["panels"], state["panels_per_page"]))
+        ]
+    }
+
+async def _save_record(record: Dict[str, Any]):
+    """Rewrite the job record and keep the /comics index in step once there is a cover"""
+    await get_artifact_writer().put_record(record)
+    if record.get("comic"):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, get_comic_index().add_job_record, record)
+
+def _llm_client():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.error("❌ long_form: OPENAI_API_KEY environment variable required")
+        raise Exception("OPENAI_API_KEY environment variable required")
+    return get_llm_client(api_key)
+
+def _valid_summaries(outline_data: Any, page_count: int) -> Dict[int, str]:
+    """Summaries by page number from an Outline-shaped response; invalid, duplicate or extra pages are left out"""
+    summaries: Dict[int, str] = {}
+    items = outline_data.get("pages") if isinstance(outline_data, dict) else None
+    for item in items if isinstance(items, list) else []:
+        try:
+            page = PageSummary.model_validate(item)
+        except ValidationError:
+            continue
+        if 1 <= page.page <= page_count and page.page not in summaries and page.summary.strip():
+            summaries[page.page] = page.summary.strip()
+    return summaries
+
+# LangGraph Node Functions
+async def outline_planner(state: LongFormState) -> LongFormState:
+    """Outline the whole story as one summary per page"""
+    record = state["record"]
+    _record_progress(state, stage="outline_planner", record=record)
+    if record.get("outline"):
+        logger.debug(f"⏭️ outline_planner: Job {state['job_id']} already has an outline")
+        return {**state, "scene": record["outline"]["scene"]}
+    
+    pages = record["pages"]
+    logger.debug(f"🔍 outline_planner: Outlining {len(pages)} pages for job {state['job_id']}")
+    try:
+        outline_prompt = build_prompt("outline", """
+        Outline a {page_count}-page comic ({panel_count} panels in total) for this prompt:
+        Prompt: "{prompt}"
+        Style: {style}
+        
+        Return the scene (characters, setting, actions, mood, style notes) and
+        exactly {page_count} pages numbered 1 to {page_count}, each summarizing what happens on it.
+        The pages should tell one continuous story with a beginning, middle and end.
+        """, trim=("prompt",), page_count=len(pages), panel_count=state["panels"], prompt=state["prompt"], style=state["style"])
+        data = await asyncio.wait_for(_llm_client().generate_structured(outline_prompt, Outline), timeout=settings.long_form_page_seconds)
+        logger.debug(f"✅ outline_planner: LLM response received: {data}")
+        scene = _scene_from(data.get("scene"), state["prompt"], state["style"])
+        summaries = _valid_summaries(data, len(pages))
+        message = f"Outlined {len(pages)} pages using LLM"
+    except Exception as e:
+        logger.warning(f"⚠️ outline_planner: LLM failed, using fallback: {e!r}")
+        scene = _fallback_scene(state["prompt"], state["style"])
+        summaries = {}
+        message = f"Outlined {len(pages)} pages (fallback)"
+    
+    for i, page in enumerate(pages):
+        page["summary"] = summaries.get(i + 1) or f"Part {i + 1} of {len(pages)}: {state['prompt']}"
+    record["outline"] = {"scene": scene}
+    await _save_record(record)
+    
+    return {
+        **state,
+        "scene": scene,
+        "messages": state.get("messages", []) + [message]
+    }
+
+async def page_planner(state: LongFormState) -> LongFormState:
+    """Plan the panels of every unplanned page, several pages at a time"""
+    record = state["record"]
+    scene = state["scene"]
+    pages = record["pages"]
+    unplanned = [page for page in pages if not page["plan"]]
+    _record_progress(state, stage="page_planner")
+    logger.debug(f"🔍 page_planner: Planning {len(unplanned)} of {len(pages)} pages for job {state['job_id']}")
+    
+    llm_client = _llm_client()
+    semaphore = asyncio.Semaphore(settings.long_form_plan_concurrency)
+    
+    async def plan_page(page: Dict[str, Any]):
+        previous = pages[page["page"] - 2]["summary"] if page["page"] > 1 else "This is the first page."
+        async with semaphore:
+            try:
+                page_prompt = build_prompt("page", """
+                Create exactly {size} comic panel descriptions for page {page} of {page_count}:
+                Original prompt: "{prompt}"
+                Style: {style}
+                Scene: {scene}
+                Previous page: {previous}
+                This page: {summary}
+                
+                Return exactly {size} panels numbered 1 to {size}, each detailed enough for image generation.
+                """, trim=("scene", "previous", "prompt"), size=page["size"], page=page["page"], page_count=len(pages),
+                    prompt=state["prompt"], style=state["style"], scene=scene, previous=previous, summary=page["summary"])
+                panel_data = await asyncio.wait_for(llm_client.generate_structured(page_prompt, PanelPlan), timeout=settings.long_form_page_seconds)
+                page["plan"] = await _complete_panels(
+                    llm_client, _valid_panels(panel_data, page["size"]), page["size"], scene,
+                    f'Plan page {page["page"]} of {len(pages)} of a comic in {state["style"]} style for: "{state["prompt"]}". This page: {page["summary"]}',
+                    settings.long_form_page_seconds
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ page_planner: LLM failed for page {page['page']}, using fallback: {e!r}")
+                page["plan"] = _fallback_panels(scene, page["size"])
+    
+    await asyncio.gather(*(plan_page(page) for page in unplanned))
+    if unplanned:
+        await _save_record(record)
+    
+    return {
+        **state,
+        "messages": state.get("messages", []) + [f"Planned {len(unplanned)} pages"]
+    }
+
+async def page_composer(state: LongFormState) -> LongFormState:
+    """Render, compose and store unfinished pages one at a time"""
+    record = state["record"]
+    writer = get_artifact_writer()
+    render_pool = get_render_pool()
+    scratch = get_scratch_store()
+    title = state["prompt"][:40]
+    first_panel = 1
+    
+    for page in record["pages"]:
+        if page["state"] == "done":
+            first_panel += page["size"]
+            continue
+        
+        logger.debug(f"🔍 page_composer: Rendering page {page['page']}/{len(record['pages'])} of job {state['job_id']}")
+        # Every page gets its own budget; the panel renderer degrades against it
+        page_state = {**state, "deadline": time.monotonic() + settings.long_form_page_seconds}
+        page["state"] = "rendering"
+        image_data_list = [None] * page["size"]
+        _record_progress(state, stage="page_composer", image_data=image_data_list)
+        try:
+            failed = await render_panel_images(page_state, page["plan"], image_data_list, list(range(first_panel, first_panel + page["size"])))
+            images = await asyncio.gather(*(scratch.aget(handle) for handle in image_data_list))
+            page_data = await render_pool.run(
+                create_comic_layout, images, f"{title} - Page {page['page']}", settings.layout_resample, state["output_format"]
+            )
+            entries = await writer.save_blobs(f"job:{state['job_id']}", [*images, page_data])
+            # Only this page's images were ever held; drop them before the next one
+            del images, page_data
+        except BaseException:
+            # The page starts over on resume
+            page["state"] = "pending"
+            raise
+        finally:
+            scratch.release(image_data_list)
+        
+        page["panels"] = entries[:-1]
+        page["image"] = entries[-1]
+        page["state"] = "done"
+        # Placeholders are kept; the flag tells readers the comic is partial
+        record["failed_panels"] = record.get("failed_panels", []) + failed
+        record["panels"] = [entry for done in record["pages"] for entry in done["panels"]]
+        record["comic"] = record["pages"][0]["image"]
+        await _save_record(record)
+        first_panel += page["size"]
+        logger.debug(f"✅ page_composer: Stored page {page['page']} ({page['image']['size']} bytes)")
+    
+    done = sum(1 for page in record["pages"] if page["state"] == "done")
+    return {
+        **state,
+        "messages": state.get("messages", []) + [f"Composed {done} pages with {len(record['panels'])} panels"]
+    }
+
+# Create the LangGraph workflow
+def create_long_form_workflow():
+    """Create the LangGraph workflow for long-form comics"""
+    logger.debug("🔧 create_long_form_workflow: Creating LangGraph workflow")
+    
+    workflow = StateGraph(LongFormState)
+    workflow.add_node("outline_planner", outline_planner)
+    workflow.add_node("page_planner", page_planner)
+    workflow.add_node("page_composer", page_composer)
+    
+    workflow.set_entry_point("outline_planner")
+    workflow.add_edge("outline_planner", "page_planner")
+    workflow.add_edge("page_planner", "page_composer")
+    workflow.add_edge("page_composer", END)
+    
+    return workflow.compile()
+
+def create_long_form_pipeline():
+    """Create the long-form pipeline; pass a stored record as state["record"] to resume it"""
+    logger.debug("🚀 create_long_form_pipeline: Creating long-form pipeline")
+    workflow = create_long_form_workflow()
+    
+    async def pipeline(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Run (or resume) a long-form job; its pages are stored as they finish"""
+        if "job_id" not in state:
+            state["job_id"] = str(uuid.uuid4())
+        
+        langgraph_state = {
+            "prompt": state["prompt"],
+            "style": state["style"],
+            "panels": state["panels"],
+            "panels_per_page": state.get("panels_per_page") or settings.panels_per_page,
+            "job_id": state["job_id"],
+            "deadline": time.monotonic() + settings.long_form_page_seconds,
+            "output_format": state.get("output_format") or settings.output_format,
+            "image_tier": state.get("image_tier") or settings.image_tier,
+            "messages": []
+        }
+        record: Optional[Dict[str, Any]] = state.get("record")
+        langgraph_state["record"] = record or _new_record(langgraph_state)
+        
+        try:
+            logger.debug(f"🚀 pipeline: Invoking long-form workflow for job {state['job_id']}")
+            result = await workflow.ainvoke(langgraph_state)
+            job_progress.pop(state["job_id"], None)
+            return {
+                **state,
+                "record": result["record"],
+                "image_data": [],
+                "messages": result["messages"],
+                "message": result["messages"][-1] if result["messages"] else "Pipeline completed"
+            }
+        except asyncio.CancelledError:
+            # Finished pages are already stored; pop_partial_result() hands back the record
+            logger.info(f"🛑 pipeline: Long-form workflow cancelled for job {state['job_id']}")
+            raise
+        except Exception as e:
+            logger.error(f"❌ pipeline: Long-form workflow failed: {e}")
+            # page_composer already freed the panels of the page that failed
+            job_progress.pop(state["job_id"], None)
+            return {
+                **state,
+                # Pages finished before the failure stay stored and resumable
+                "record": langgraph_state["record"],
+                "error": str(e),
+                "message": f"Pipeline failed: {str(e)}"
+            }
+    
+    return pipeline
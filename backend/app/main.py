@@ -1,223 +1,1258 @@
 import logging
 import os
 import base64
+import hashlib
+import json
+import time
+import random
+from contextlib import asynccontextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from typing import Dict, List, Optional, Any, Set
+from fastapi import FastAPI, HTTPException, Request, Query, Header
+from fastapi.responses import Response, FileResponse, RedirectResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 import asyncio
 from app.schemas import (
-    GenerateRequest, GenerateResponse, StatusResponse, HealthResponse,
-    ArtStyle, JobState
+    GenerateRequest, GenerateResponse, PlanResponse, RenderRequest, StatusResponse, HealthResponse,
+    CancelResponse, FinalizeRequest, FinalizeResponse, ArtStyle, JobState, OutputFormat
 )
 from app.config import settings
-from app.comic_pipeline import create_comic_pipeline
+from app.comic_pipeline import (
+    create_comic_pipeline, create_plan_pipeline, pop_partial_result, get_job_progress, get_live_record,
+    finalize_panels, plan_for_style
+)
+from app.long_form import create_long_form_pipeline
+from app.utils.storage import get_artifact_writer, get_storage, job_key, pages_version
+from app.utils.manifest import get_comic_index
+from app.utils.retention import create_retention_service
+from app.utils.metrics import metrics
+from app.utils.render_pool import get_render_pool, shutdown_render_pool
+from app.utils.encoders import available_formats, negotiable_formats, negotiate_format, sniff_media_type
+from app.utils.layout import render_derivative
+from app.utils.variants import allowed_widths, get_variant
+from app.utils.export import EXPORT_FORMATS, create_export, export_etag, job_pages
+from app.utils.scratch import BlobHandle, get_scratch_store
 import uuid
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Prompt-to-Comic API", version="0.1.0")
+# Write-behind persistence tasks that have not finished yet
+persist_tasks: Set[asyncio.Task] = set()
+
+# Final-quality upgrades of progressive jobs, keyed by job ID
+finalize_tasks: Dict[str, asyncio.Task] = {}
+
+# Background retries of panels that failed and were left as placeholders, keyed by job ID
+repair_tasks: Dict[str, asyncio.Task] = {}
+
+def forget_evicted_job(job_id: str):
+    """Drop in-memory state for a job whose stored artifacts were evicted"""
+    job = jobs.get(job_id)
+    if job and job["state"] in SERVABLE_STATES and job_id not in running_jobs:
+        jobs.pop(job_id, None)
+        last_touched.pop(job_id, None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    retention = create_retention_service(get_comic_index(), get_storage(), on_evict=forget_evicted_job)
+    retention_task = asyncio.create_task(retention.run(), name="retention") if retention else None
+    yield
+    if retention_task:
+        retention_task.cancel()
+    # Unfinished upgrades can be restarted with POST /jobs/{job_id}/finalize
+    for task in finalize_tasks.values():
+        task.cancel()
+    for task in repair_tasks.values():
+        task.cancel()
+    # Flush pending artifact writes before the process exits
+    if persist_tasks:
+        logger.info(f"💾 lifespan: Waiting for {len(persist_tasks)} pending artifact writes")
+        await asyncio.gather(*persist_tasks, return_exceptions=True)
+    get_artifact_writer().shutdown()
+    shutdown_render_pool()
+
+app = FastAPI(title="Prompt-to-Comic API", version="0.1.0", lifespan=lifespan)
 
 # Create pipeline instance
 logger.debug("🚀 main: Creating comic pipeline instance")
 comic_pipeline = create_comic_pipeline()
+plan_pipeline = create_plan_pipeline()
+long_form_pipeline = create_long_form_pipeline()
 logger.debug("✅ main: Comic pipeline created")
 
 # In-memory job storage (replace with database in production)
 jobs = {}
 
+# Pipeline tasks that are still running, keyed by job ID, so they can be cancelled
+running_jobs: Dict[str, asyncio.Task] = {}
+
+# Worker slots bounding how many pipelines run at once
+job_slots = asyncio.Semaphore(settings.max_concurrent_jobs)
+
+# States whose already-produced artifacts can be served
+SERVABLE_STATES = {JobState.DONE.value, JobState.CANCELLED.value}
+
 # Create output directory
-OUTPUT_DIR = Path("output/comics")
+OUTPUT_DIR = Path(settings.comic_output_dir)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def save_comic_files(job_id: str, result: dict):
-    """Save comic files to disk"""
+# When each job was last recorded as accessed, to throttle index writes
+last_touched: Dict[str, float] = {}
+
+# Minimal stand-in for a job this replica did not run, rebuilt from its stored record
+STORED_JOB_MESSAGE = "Loaded from storage"
+
+async def persist_artifacts(job_id: str, result: dict):
+    """Write a job's raw artifact bytes to disk and record where they went"""
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        job_dir = OUTPUT_DIR / f"job_{job_id[:8]}_{timestamp}"
-        job_dir.mkdir(parents=True, exist_ok=True)
-        
-        logger.debug(f"💾 save_comic_files: Saving files to {job_dir}")
-        
-        # Save panel images
-        if "image_data" in result:
-            for i, img_b64 in enumerate(result["image_data"]):
-                img_data = base64.b64decode(img_b64)
-                panel_filename = job_dir / f"panel_{i+1}.png"
-                with open(panel_filename, 'wb') as f:
-                    f.write(img_data)
-                logger.debug(f"✅ Saved panel {i+1}: {panel_filename}")
-        
-        # Save final comic
-        if "comic_data" in result:
-            comic_data = base64.b64decode(result["comic_data"])
-            comic_filename = job_dir / "comic.png"
-            with open(comic_filename, 'wb') as f:
-                f.write(comic_data)
-            logger.debug(f"✅ Saved comic: {comic_filename}")
-        
-        return str(job_dir)
+        request = jobs.get(job_id, {}).get("request", {})
+        metadata = {
+            "style": request.get("style"),
+            "prompt": request.get("text"),
+            # Panels that are a placeholder or missing; empty once the comic is complete
+            "failed_panels": result.get("failed_panels", [])
+        }
+        if request.get("progressive"):
+            # Everything an upgrade needs, so it can run later or on another replica
+            metadata.update({
+                "progressive": True,
+                "scene": result.get("scene"),
+                "panel_descriptions": result.get("panel_descriptions"),
+                "output_format": request.get("output_format") or settings.output_format,
+                "image_tier": request.get("image_tier") or settings.image_tier,
+                "draft": result.get("draft")
+            })
+        scratch = get_scratch_store()
+        handles = result.get("image_data", [])
+        comic = result.get("comic_data")
+        images = [await scratch.aget(handle) if handle else None for handle in handles]
+        artifacts = await get_artifact_writer().save_comic(job_id, images, await scratch.aget(comic) if comic else None, metadata)
+        del images
+        logger.info(f"💾 persist_artifacts: Job record saved to {artifacts['key']}")
         
+        # Keep the /comics manifest in step with what is in storage
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, get_comic_index().add_job_record, artifacts)
+        if job_id in jobs:
+            jobs[job_id]["files_path"] = artifacts["key"]
+            jobs[job_id]["artifacts"] = artifacts
+        # Served from storage from now on. Requests running on the threadpool may have picked
+        # the scratch handles up just before the swap, so the copies outlive them briefly
+        loop.call_later(settings.scratch_release_delay_seconds, scratch.release, [*handles, comic])
     except Exception as e:
-        logger.error(f"❌ save_comic_files: Failed to save files: {e}")
+        logger.error(f"❌ persist_artifacts: Failed to save files for job {job_id}: {e}")
+
+def schedule_persist(job_id: str, result: dict):
+    """Queue write-behind persistence; artifacts are served from memory until it lands"""
+    task = asyncio.create_task(persist_artifacts(job_id, result), name=f"persist-{job_id}")
+    persist_tasks.add(task)
+    task.add_done_callback(persist_tasks.discard)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check an If-None-Match header against a strong ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison is what RFC 9110 prescribes for If-None-Match
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def load_stored_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Find a job in memory, or rebuild a servable entry from its stored record"""
+    if job_id in jobs:
+        return jobs[job_id]
+    
+    storage = get_storage()
+    if not storage.exists(job_key(job_id)):
         return None
+    
+    record = json.loads(storage.get(job_key(job_id)))
+    logger.debug(f"📦 load_stored_job: Loaded job {job_id} from storage")
+    state, message = JobState.DONE.value, STORED_JOB_MESSAGE
+    pending = [page["page"] for page in record.get("pages", []) if page["state"] != "done"]
+    if pending:
+        # A long-form job that stopped part-way; POST /jobs/{job_id}/resume finishes it
+        state, message = JobState.CANCELLED.value, f"Stopped with {len(pending)} pages left to render"
+    job = {
+        "state": state,
+        "message": message,
+        "result": {},
+        "files_path": record["key"],
+        "artifacts": record
+    }
+    if record.get("progressive"):
+        # Upgraded records keep the draft alongside; others are still the draft
+        job["final"] = {"state": "done" if record.get("draft") else "pending"}
+        if record.get("draft"):
+            job["draft"] = {"result": {}, "artifacts": record["draft"]}
+    return job
 
-@app.post("/generate", response_model=GenerateResponse)
-async def generate_comic(req: GenerateRequest):
-    """Generate a comic strip from a text prompt"""
-    logger.debug(f"🔍 generate_comic: Received request - style={req.style}, panels={req.panels}, text_length={len(req.text)}")
+def touch_job(job_id: str):
+    """Record an artifact access for LRU retention, at most once per interval"""
+    now = time.time()
+    if now - last_touched.get(job_id, 0) < settings.access_touch_interval:
+        return
+    last_touched[job_id] = now
+    try:
+        get_comic_index().touch(job_id, now)
+    except Exception as e:
+        logger.warning(f"⚠️ touch_job: Failed to record access for job {job_id}: {e}")
+
+def choose_format(request: Request, requested: Optional[OutputFormat]) -> Optional[str]:
+    """Output format for an artifact response: ?format= first, then Accept negotiation"""
+    if requested:
+        if requested.value not in available_formats():
+            raise HTTPException(status_code=400, detail=f"Output format not available. Must be one of: {available_formats()}")
+        return requested.value
+    return negotiate_format(request.headers.get("accept"), negotiable_formats())
+
+def check_width(width: Optional[int]) -> Optional[int]:
+    """Validate a ?w= thumbnail width against the allowed sizes"""
+    if width is not None and width not in allowed_widths():
+        raise HTTPException(status_code=400, detail=f"Unsupported width. Must be one of: {allowed_widths()}")
+    return width
+
+def artifact_bytes(entry: Optional[Dict[str, Any]], handle: Optional[BlobHandle]) -> bytes:
+    """Materialize an artifact from storage once it is stored, else from the scratch store"""
+    if entry:
+        return get_storage().get(entry["key"])
+    return get_scratch_store().get(handle)
+
+def artifact_version(etag: str) -> str:
+    """The ?v= token of an artifact URL, from its ETag"""
+    return etag.strip('"')[:16]
+
+def cache_control(request: Request, version: Optional[str]) -> str:
+    """Cache forever only a URL versioned with the content it gets now; revalidate any other"""
+    if version and request.query_params.get("v") == version:
+        return settings.artifact_cache_control
+    # Unversioned URLs (or stale versions) are re-composed by repair and finalize
+    return "no-cache"
+
+def serve_artifact(request: Request, entry: Optional[Dict[str, Any]], fallback: Optional[BlobHandle],
+                   fmt: Optional[str] = None, width: Optional[int] = None) -> Response:
+    """Serve a stored artifact from storage, honouring If-None-Match and Range"""
+    # Versioned by the original, whichever variant of it this request is for
+    current = entry["etag"] if entry else fallback.etag if fallback is not None else None
+    headers = {"Cache-Control": cache_control(request, artifact_version(current) if current else None)}
+    if negotiable_formats():
+        # The same URL yields different encodings depending on Accept
+        headers["Vary"] = "Accept"
     
-    # Validate art style
-    if req.style not in [style.value for style in ArtStyle]:
-        logger.warning(f"⚠️ generate_comic: Invalid art style '{req.style}'")
-        raise HTTPException(status_code=400, detail=f"Invalid art style. Must be one of: {[style.value for style in ArtStyle]}")
+    if (fmt or width) and entry:
+        # Re-encoded/downscaled once, then served from the variant cache like any blob
+        entry = get_variant(entry, fmt, width)
+    elif (fmt or width) and fallback is not None:
+        # Rendered per request until the original is stored and the variant cache can take over
+        derivative = get_render_pool().run_sync(
+            render_derivative, get_scratch_store().get(fallback), fmt, width, settings.layout_resample
+        )
+        headers["ETag"] = f'"{hashlib.sha256(derivative).hexdigest()}"'
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=derivative, media_type=sniff_media_type(derivative), headers=headers)
     
-    # Validate panel count
-    if req.panels < settings.min_panels or req.panels > settings.max_panels:
-        logger.warning(f"⚠️ generate_comic: Invalid panel count {req.panels}")
-        raise HTTPException(status_code=400, detail=f"Panel count must be between {settings.min_panels} and {settings.max_panels}")
+    if entry:
+        media_type = entry.get("media_type", "image/png")
+        headers["ETag"] = entry["etag"]
+        if _etag_matches(request, entry["etag"]):
+            logger.debug(f"✅ serve_artifact: {entry['key']} not modified")
+            return Response(status_code=304, headers=headers)
+        
+        storage = get_storage()
+        path = storage.local_path(entry["key"])
+        if path and settings.x_accel_redirect_prefix:
+            # Hand the transfer to the fronting proxy, which sendfile()s it
+            headers["X-Accel-Redirect"] = f"{settings.x_accel_redirect_prefix.rstrip('/')}/{entry['key']}"
+            return Response(headers=headers, media_type=media_type)
+        if path:
+            logger.debug(f"✅ serve_artifact: Streaming {path} ({entry['size']} bytes)")
+            # FileResponse streams from the file and answers Range/If-Range itself
+            return FileResponse(path, media_type=media_type, headers=headers)
+        
+        url = storage.url_for(entry["key"])
+        if url:
+            # Let the client download straight from the object store; the
+            # presigned URL expires, so the redirect itself must not be cached
+            logger.debug(f"↪️ serve_artifact: Redirecting to object store for {entry['key']}")
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
     
-    # Generate job ID
-    job_id = str(uuid.uuid4())
-    logger.debug(f"🆔 generate_comic: Generated job_id: {job_id}")
+    if fallback is None:
+        raise HTTPException(status_code=404, detail="Artifact not found in storage")
     
-    # Store job info
-    jobs[job_id] = {
-        "state": JobState.PENDING.value,
-        "request": req.dict(),
-        "message": "Job created successfully"
-    }
-    logger.debug(f"💾 generate_comic: Stored job {job_id} in memory")
+    # Not stored yet (write-behind still pending, or it failed): serve from the scratch store
+    headers["ETag"] = fallback.etag
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    logger.debug(f"🔄 serve_artifact: Serving {fallback.size} bytes from the scratch store")
+    path = get_scratch_store().local_path(fallback)
+    if path:
+        return FileResponse(path, media_type=fallback.media_type, headers=headers)
+    return Response(content=get_scratch_store().get(fallback), media_type=fallback.media_type, headers=headers)
+
+def request_deadline(req: GenerateRequest) -> Optional[float]:
+    """Absolute time.monotonic() deadline of a request, counted from its arrival; None for long-form jobs"""
+    if req.long_form:
+        # Paced page by page instead, and resumable
+        return None
+    return time.monotonic() + (req.deadline_seconds or settings.job_deadline_seconds)
+
+@asynccontextmanager
+async def job_slot(deadline: Optional[float] = None):
+    """Hold a worker slot, giving up once the deadline passes while queued for one"""
+    if deadline is None:
+        await job_slots.acquire()
+    else:
+        try:
+            await asyncio.wait_for(job_slots.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            metrics.inc("job_slot_timeouts_total")
+            raise Exception("Deadline exceeded while waiting for a worker slot")
+    try:
+        yield
+    finally:
+        job_slots.release()
+
+async def run_job(job_id: str, req: GenerateRequest, record: Optional[Dict[str, Any]] = None,
+                  plan: Optional[Dict[str, Any]] = None, image_slots: Optional[asyncio.Semaphore] = None,
+                  deadline: Optional[float] = None):
+    """Run the pipeline for a job inside a worker slot and record the outcome.
     
-    # Run the pipeline asynchronously
+    image_slots is the image scheduler of a multi-style fan-out, which already holds the job slot.
+    deadline (from request_deadline) bounds the wait for a slot and the pipeline together.
+    """
     try:
-        pipeline_state = {
-            "prompt": req.text,
-            "style": req.style,
-            "panels": req.panels,
-            "job_id": job_id
-        }
-        
-        logger.debug(f"🚀 generate_comic: Starting pipeline for job {job_id}")
-        result = await comic_pipeline(pipeline_state)
-        logger.debug(f"✅ generate_comic: Pipeline completed for job {job_id}")
-        
-        # Save files to disk
-        saved_path = save_comic_files(job_id, result)
-        if saved_path:
-            logger.info(f"💾 generate_comic: Files saved to {saved_path}")
+        async with (nullcontext() if image_slots else job_slot(deadline)):
+            jobs[job_id]["state"] = JobState.PROCESSING.value
+            jobs[job_id]["message"] = "Generating comic"
+            
+            pipeline_state = {
+                "prompt": req.text,
+                "style": req.style,
+                "panels": req.panels,
+                "job_id": job_id,
+                "deadline_seconds": req.deadline_seconds,
+                "deadline": deadline,
+                "output_format": req.output_format.value if req.output_format else None,
+                "image_tier": req.image_tier.value if req.image_tier else None,
+                "image_slots": image_slots
+            }
+            
+            if plan:
+                # Approved in POST /plan: render without planning again
+                pipeline_state.update(plan)
+            
+            if req.progressive:
+                # Draft first; the requested tier is applied when it is finalized
+                pipeline_state["image_tier"] = settings.draft_image_tier
+            
+            logger.debug(f"🚀 run_job: Starting pipeline for job {job_id}")
+            if req.long_form:
+                # Stored page by page as it goes; a stored record resumes where it stopped
+                result = await long_form_pipeline({**pipeline_state, "panels_per_page": req.panels_per_page, "record": record})
+            else:
+                result = await comic_pipeline(pipeline_state)
+            logger.debug(f"✅ run_job: Pipeline completed for job {job_id}")
         
         # Update job status
+        record = result.get("record")
         jobs[job_id] = {
             "state": JobState.DONE.value,
             "request": req.dict(),
             "result": result,
             "message": result.get("message", "Comic generated successfully"),
-            "files_path": saved_path
+            "files_path": record["key"] if record else None,
+            "artifacts": record
+        }
+        logger.debug(f"💾 run_job: Updated job {job_id} status to DONE")
+        
+        # Save files to disk without holding up the response
+        if not record:
+            schedule_persist(job_id, result)
+        
+        upgrading = req.progressive and not result.get("error") and settings.progressive_auto_finalize
+        if req.progressive and not result.get("error"):
+            jobs[job_id]["final"] = {"state": "pending"}
+            if upgrading:
+                start_finalize(job_id)
+        
+        # An automatic upgrade re-renders every panel anyway and repairs after itself; a job
+        # that stopped before planning its panels has nothing to repair from
+        unfinished = result.get("failed_panels") or not result.get("comic_data")
+        if unfinished and result.get("panel_descriptions") and not record and not upgrading:
+            start_repair(job_id)
+        
+    except asyncio.CancelledError:
+        logger.info(f"🛑 run_job: Job {job_id} cancelled, keeping produced artifacts")
+        partial = pop_partial_result(job_id)
+        record = partial.get("record")
+        jobs[job_id] = {
+            "state": JobState.CANCELLED.value,
+            "request": req.dict(),
+            "result": partial,
+            "message": partial["message"],
+            "files_path": record["key"] if record else None,
+            "artifacts": record
         }
-        logger.debug(f"💾 generate_comic: Updated job {job_id} status to DONE")
+        logger.debug(f"💾 run_job: Updated job {job_id} status to CANCELLED")
+        if any(partial.get("image_data", [])):
+            schedule_persist(job_id, partial)
+        raise
         
     except Exception as e:
-        logger.error(f"❌ generate_comic: Pipeline failed for job {job_id}: {e}")
+        logger.error(f"❌ run_job: Pipeline failed for job {job_id}: {e}")
         jobs[job_id] = {
             "state": JobState.FAILED.value,
             "request": req.dict(),
             "message": f"Generation failed: {str(e)}"
         }
-        logger.debug(f"💾 generate_comic: Updated job {job_id} status to FAILED")
+        logger.debug(f"💾 run_job: Updated job {job_id} status to FAILED")
+
+async def wait_for_persist(job_id: str):
+    """Wait until a job's pending write-behind, if any, has landed"""
+    pending = [task for task in persist_tasks if task.get_name() == f"persist-{job_id}"]
+    if pending:
+        await asyncio.wait(pending)
+
+async def run_finalize(job_id: str, panel_numbers: Optional[List[int]] = None):
+    """Upgrade a progressive job's draft panels to its final tier and re-assemble the comic"""
+    job = jobs[job_id]
+    try:
+        async with job_slots:
+            job["final"] = {"state": JobState.PROCESSING.value, "panels": panel_numbers}
+            # The draft is read back from storage, which also makes it the record to build on
+            await wait_for_persist(job_id)
+            record = job.get("artifacts")
+            if not record:
+                raise Exception("Draft was not stored")
+            
+            # Jobs loaded from storage only have their record to go on
+            job.setdefault("request", {
+                "text": record["prompt"], "style": record["style"], "progressive": True,
+                "output_format": record["output_format"], "image_tier": record["image_tier"]
+            })
+            panel_numbers = panel_numbers or list(range(1, len(record["panels"]) + 1))
+            job["final"]["panels"] = panel_numbers
+            loop = asyncio.get_running_loop()
+            draft_images = await loop.run_in_executor(
+                None, lambda: [get_storage().get(entry["key"]) for entry in record["panels"]]
+            )
+            state = {
+                "job_id": job_id,
+                "prompt": record["prompt"],
+                "style": record["style"],
+                "scene": record["scene"],
+                "panel_descriptions": record["panel_descriptions"],
+                "output_format": record["output_format"],
+                "image_tier": record["image_tier"],
+                "deadline_seconds": job.get("request", {}).get("deadline_seconds")
+            }
+            final = await finalize_panels(state, draft_images, panel_numbers)
+            del draft_images
+        
+        draft = {"result": job["result"], "artifacts": record}
+        jobs[job_id] = {
+            **job,
+            "result": {
+                **job["result"],
+                **final,
+                "scene": record["scene"],
+                "panel_descriptions": record["panel_descriptions"],
+                "failed_panels": [
+                    number for number in job["result"].get("failed_panels", record.get("failed_panels", []))
+                    if number not in final["upgraded"]
+                ],
+                "draft": {"comic": record["comic"], "panels": record["panels"]}
+            },
+            "message": final["message"],
+            "files_path": None,
+            "artifacts": None,
+            "draft": draft,
+            "final": {"state": JobState.DONE.value, "panels": final["upgraded"]}
+        }
+        logger.info(f"✅ run_finalize: {final['message']} for job {job_id}")
+        schedule_persist(job_id, jobs[job_id]["result"])
+        if jobs[job_id]["result"]["failed_panels"]:
+            start_repair(job_id)
+    except asyncio.CancelledError:
+        job["final"] = {"state": JobState.CANCELLED.value, "panels": panel_numbers}
+        raise
+    except Exception as e:
+        logger.error(f"❌ run_finalize: Upgrade failed for job {job_id}: {e}")
+        job["final"] = {"state": JobState.FAILED.value, "panels": panel_numbers, "message": str(e)}
+    finally:
+        finalize_tasks.pop(job_id, None)
+
+def start_finalize(job_id: str, panel_numbers: Optional[List[int]] = None):
+    """Start upgrading a progressive job in the background"""
+    # The upgrade replaces the comic a pending repair would build on; it repairs after itself
+    repair = repair_tasks.pop(job_id, None)
+    if repair:
+        repair.cancel()
+    jobs[job_id]["final"] = {"state": JobState.PENDING.value, "panels": panel_numbers}
+    finalize_tasks[job_id] = asyncio.create_task(run_finalize(job_id, panel_numbers), name=f"finalize-{job_id}")
+
+async def run_repair(job_id: str):
+    """Retry a job's failed panels with backoff and re-compose the comic as they succeed.
+    
+    A job that ran out of time before its layout gets the comic composed here as well.
+    """
+    job = jobs[job_id]
+    delay = settings.repair_backoff_seconds
+    try:
+        for attempt in range(1, settings.repair_attempts + 1):
+            failed = job["result"]["failed_panels"]
+            job["repair"] = {"state": JobState.PENDING.value, "panels": failed, "attempts": attempt - 1}
+            # Jittered so repairs queued by one outage do not all retry at once
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, settings.repair_backoff_max_seconds)
+            
+            # Waits for a free job slot, so repairs only use capacity new jobs leave over
+            async with job_slots:
+                job["repair"]["state"] = JobState.PROCESSING.value
+                await wait_for_persist(job_id)
+                record = job.get("artifacts")
+                if not record:
+                    raise Exception("Comic was not stored")
+                
+                request = job.get("request", {})
+                # A progressive job is repaired at the tier its current panels were drawn at
+                drafted = request.get("progressive") and job.get("final", {}).get("state") != JobState.DONE.value
+                loop = asyncio.get_running_loop()
+                # Panels a stopped job never produced have no entry and are rendered from scratch
+                images = await loop.run_in_executor(
+                    None, lambda: [get_storage().get(entry["key"]) if entry else None for entry in record["panels"]]
+                )
+                state = {
+                    "job_id": job_id,
+                    "prompt": record["prompt"],
+                    "style": record["style"],
+                    "scene": job["result"]["scene"],
+                    "panel_descriptions": job["result"]["panel_descriptions"],
+                    "output_format": request.get("output_format") or settings.output_format,
+                    "image_tier": settings.draft_image_tier if drafted else request.get("image_tier") or settings.image_tier,
+                    "deadline_seconds": request.get("deadline_seconds")
+                }
+                repaired = await finalize_panels(state, images, failed)
+                del images
+            
+            if not repaired["upgraded"] and job["result"].get("comic_data"):
+                # Only the scratch copies were made; the stored comic is unchanged
+                get_scratch_store().release([*repaired["image_data"], repaired["comic_data"]])
+                logger.info(f"🔄 run_repair: Attempt {attempt} repaired no panels of job {job_id}")
+                continue
+            
+            still_failed = [number for number in failed if number not in repaired["upgraded"]]
+            message = f"Repaired {len(repaired['upgraded'])} of {len(failed)} failed panels" if failed else "Comic assembled"
+            job = jobs[job_id] = {
+                **job,
+                "result": {
+                    **job["result"],
+                    "image_data": repaired["image_data"],
+                    "comic_data": repaired["comic_data"],
+                    "failed_panels": still_failed,
+                    # A job that stopped early has its comic now
+                    "error": None
+                },
+                "message": message,
+                "files_path": None,
+                "artifacts": None
+            }
+            logger.info(f"✅ run_repair: {message} for job {job_id}")
+            schedule_persist(job_id, job["result"])
+            if not still_failed:
+                job["repair"] = {"state": JobState.DONE.value, "panels": [], "attempts": attempt}
+                return
+        
+        job["repair"] = {"state": JobState.FAILED.value, "panels": job["result"]["failed_panels"], "attempts": settings.repair_attempts}
+        logger.warning(f"⚠️ run_repair: Gave up on panels {job['result']['failed_panels']} of job {job_id}")
+    except asyncio.CancelledError:
+        job["repair"] = {**job.get("repair", {}), "state": JobState.CANCELLED.value}
+        raise
+    except Exception as e:
+        logger.error(f"❌ run_repair: Repair failed for job {job_id}: {e}")
+        job["repair"] = {**job.get("repair", {}), "state": JobState.FAILED.value, "message": str(e)}
+    finally:
+        if repair_tasks.get(job_id) is asyncio.current_task():
+            repair_tasks.pop(job_id, None)
+
+def start_repair(job_id: str):
+    """Start retrying a job's failed panels in the background"""
+    jobs[job_id]["repair"] = {"state": JobState.PENDING.value, "panels": jobs[job_id]["result"]["failed_panels"], "attempts": 0}
+    repair_tasks[job_id] = asyncio.create_task(run_repair(job_id), name=f"repair-{job_id}")
+
+async def cancel_on_disconnect(request: Request, task: asyncio.Task):
+    """Cancel a job's task once the client that started it goes away"""
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info(f"🔌 cancel_on_disconnect: Client disconnected, cancelling {task.get_name()}")
+            task.cancel()
+            return
+        await asyncio.sleep(settings.disconnect_poll_interval)
+
+async def run_fanout(style_jobs: Dict[str, str], req: GenerateRequest, deadline: Optional[float] = None):
+    """Plan once, then render the plan in every style under one job slot and one image scheduler"""
+    primary = style_jobs[req.style]
+    renders: Dict[str, asyncio.Task] = {}
+    try:
+        async with job_slot(deadline):
+            for job_id in style_jobs.values():
+                jobs[job_id]["state"] = JobState.PROCESSING.value
+                jobs[job_id]["message"] = "Planning the shared story"
+            
+            plan = await plan_pipeline({
+                "prompt": req.text,
+                "style": req.style,
+                "panels": req.panels,
+                "job_id": primary,
+                "deadline_seconds": req.deadline_seconds,
+                "deadline": deadline
+            })
+            plan = {"scene": plan["scene"], "panel_descriptions": plan["panel_descriptions"]}
+            logger.debug(f"✅ run_fanout: Planned once for {len(style_jobs)} styles")
+            
+            # Every style contends for the same image calls, so the fan-out costs one job's worth of them
+            image_slots = asyncio.Semaphore(settings.image_concurrency)
+            for style, job_id in style_jobs.items():
+                style_req = req.copy(update={"style": style, "styles": None})
+                renders[job_id] = asyncio.create_task(
+                    run_job(job_id, style_req, plan=plan_for_style(plan, req.style, style), image_slots=image_slots, deadline=deadline),
+                    name=f"job-{job_id}"
+                )
+                # From here on DELETE /jobs/{job_id} cancels just this style
+                running_jobs[job_id] = renders[job_id]
+            await asyncio.wait(renders.values())
+    except asyncio.TimeoutError:
+        logger.error(f"⏱️ run_fanout: Planning for job {primary} exceeded its deadline")
+        for job_id in style_jobs.values():
+            jobs[job_id]["state"] = JobState.FAILED.value
+            jobs[job_id]["message"] = "Generation failed: planning exceeded its deadline"
+    except Exception as e:
+        logger.error(f"❌ run_fanout: Planning failed for job {primary}: {e}")
+        for job_id in style_jobs.values():
+            jobs[job_id]["state"] = JobState.FAILED.value
+            jobs[job_id]["message"] = f"Generation failed: {str(e)}"
+    except asyncio.CancelledError:
+        for job_id in style_jobs.values():
+            if job_id not in renders:
+                jobs[job_id]["state"] = JobState.CANCELLED.value
+                jobs[job_id]["message"] = "Cancelled while planning"
+        raise
+    finally:
+        for task in renders.values():
+            task.cancel()
+        if renders:
+            # Let cancelled styles record their partial results before returning
+            await asyncio.wait(renders.values())
+
+async def wait_until_done(task: asyncio.Task, job_ids: List[str], request: Request, detach: bool = False):
+    """Wait for a job's task, cancelling it if the client goes away unless the job is detached.
+    
+    A detached job (one started with an Idempotency-Key) runs on without its connection,
+    so a retry after a client timeout finds it running or finished rather than cancelled.
+    """
+    # Its own task so DELETE /jobs/{job_id} or a client disconnect can cancel
+    # it while this request is still waiting
+    for job_id in job_ids:
+        running_jobs[job_id] = task
+    task.add_done_callback(lambda _: [running_jobs.pop(job_id, None) for job_id in job_ids])
+    watcher = None if detach else asyncio.create_task(cancel_on_disconnect(request, task))
+    
+    try:
+        await asyncio.wait({task})
+    finally:
+        if watcher:
+            watcher.cancel()
+        if not task.done() and not detach:
+            task.cancel()
+
+async def run_job_until_done(job_id: str, req: GenerateRequest, request: Request,
+                             record: Optional[Dict[str, Any]] = None, plan: Optional[Dict[str, Any]] = None,
+                             deadline: Optional[float] = None, detach: bool = False):
+    """Run a job as its own task and wait for it, cancelling it if the client goes away unless detached"""
+    task = asyncio.create_task(run_job(job_id, req, record, plan, deadline=deadline), name=f"job-{job_id}")
+    await wait_until_done(task, [job_id], request, detach)
+
+def validate_generate_request(req: GenerateRequest):
+    """Reject requests the pipeline cannot serve, with a 400"""
+    # Validate art style
+    if req.style not in [style.value for style in ArtStyle]:
+        logger.warning(f"⚠️ validate_generate_request: Invalid art style '{req.style}'")
+        raise HTTPException(status_code=400, detail=f"Invalid art style. Must be one of: {[style.value for style in ArtStyle]}")
+    
+    # Validate panel count against the configured limits, which the schema leaves open
+    limit = "LONG_FORM_MAX_PANELS" if req.long_form else "MAX_PANELS"
+    max_panels = settings.long_form_max_panels if req.long_form else settings.max_panels
+    if req.panels < settings.min_panels or req.panels > max_panels:
+        logger.warning(f"⚠️ validate_generate_request: Invalid panel count {req.panels}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Panel count must be between {settings.min_panels} (MIN_PANELS) and {max_panels} ({limit})"
+        )
+    
+    if req.progressive and req.long_form:
+        raise HTTPException(status_code=400, detail="progressive and long_form cannot be combined")
+    
+    # Validate extra styles; a multi-style job shares one short-form plan
+    if req.styles:
+        if any(style not in [style.value for style in ArtStyle] for style in req.styles):
+            logger.warning(f"⚠️ validate_generate_request: Invalid styles {req.styles}")
+            raise HTTPException(status_code=400, detail=f"Invalid art style. Must be one of: {[style.value for style in ArtStyle]}")
+        if req.long_form:
+            raise HTTPException(status_code=400, detail="styles and long_form cannot be combined")
+    
+    # Validate output format against what this Pillow build can encode
+    if req.output_format and req.output_format.value not in available_formats():
+        logger.warning(f"⚠️ validate_generate_request: Output format '{req.output_format.value}' not available")
+        raise HTTPException(status_code=400, detail=f"Output format not available. Must be one of: {available_formats()}")
+
+async def claim_idempotency_key(key: str, req: GenerateRequest, response: GenerateResponse) -> Optional[GenerateResponse]:
+    """Bind an Idempotency-Key to this request; returns the original response if a retry already used it"""
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+    
+    fingerprint = hashlib.sha256(json.dumps(jsonable_encoder(req), sort_keys=True).encode()).hexdigest()
+    index = get_comic_index()
+    loop = asyncio.get_running_loop()
+    # Two rounds at most: a key left pointing at a lost job is released and claimed afresh
+    for _ in range(2):
+        now = time.time()
+        stored_fingerprint, stored_response = await loop.run_in_executor(
+            None, index.claim_idempotency_key, key, fingerprint, response.json(), now, now - settings.idempotency_key_seconds
+        )
+        if stored_fingerprint != fingerprint:
+            logger.warning(f"⚠️ claim_idempotency_key: Key {key!r} was already used with a different request")
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        
+        original = GenerateResponse.parse_raw(stored_response)
+        if original.job_id == response.job_id:
+            return None
+        if await restore_jobs(original):
+            logger.info(f"🔁 claim_idempotency_key: Key {key!r} replays job {original.job_id}")
+            metrics.inc("idempotent_replays_total")
+            return original
+        
+        # Keys outlive a restart, in-memory jobs do not; an unsaved job is gone for good
+        logger.warning(f"⚠️ claim_idempotency_key: Key {key!r} points at lost job {original.job_id}, running the request again")
+        await loop.run_in_executor(None, index.release_idempotency_key, key, stored_response)
+    raise HTTPException(status_code=409, detail="Idempotency-Key is being claimed concurrently; retry the request")
+
+async def restore_jobs(response: GenerateResponse) -> bool:
+    """Make the jobs a replayed response names pollable again; False if any of them is lost"""
+    job_ids = list(response.style_jobs.values()) if response.style_jobs else [response.job_id]
+    loop = asyncio.get_running_loop()
+    found = await loop.run_in_executor(None, lambda: [load_stored_job(job_id) for job_id in job_ids])
+    if any(job is None for job in found):
+        return False
+    for job_id, job in zip(job_ids, found):
+        # Rebuilt from storage when this process did not run it (or has restarted since)
+        jobs.setdefault(job_id, job)
+    return True
+
+@app.post("/generate", response_model=GenerateResponse, response_model_exclude_none=True)
+async def generate_comic(req: GenerateRequest, request: Request,
+                         idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Generate a comic strip from a text prompt"""
+    logger.debug(f"🔍 generate_comic: Received request - style={req.style}, panels={req.panels}, text_length={len(req.text)}")
+    validate_generate_request(req)
+    # Time spent queued for a worker slot counts against the deadline
+    deadline = request_deadline(req)
+    
+    # Generate job ID
+    job_id = str(uuid.uuid4())
+    logger.debug(f"🆔 generate_comic: Generated job_id: {job_id}")
+    
+    # One job per style, all rendered from a single plan
+    styles = list(dict.fromkeys([req.style, *(req.styles or [])]))
+    style_jobs = {style: job_id if style == req.style else str(uuid.uuid4()) for style in styles}
+    response = GenerateResponse(job_id=job_id, style_jobs=style_jobs if len(styles) > 1 else None)
+    
+    # Store job info
+    for style, style_job_id in style_jobs.items():
+        jobs[style_job_id] = {
+            "state": JobState.PENDING.value,
+            "request": req.copy(update={"style": style, "styles": None}).dict() if len(styles) > 1 else req.dict(),
+            "message": "Job created successfully"
+        }
+    logger.debug(f"💾 generate_comic: Stored job {job_id} in memory")
+    
+    # A retry of a request already seen gets that request's jobs, running or finished. The jobs
+    # are registered first, so a concurrent retry that replays them always finds them
+    if idempotency_key:
+        claimed = False
+        try:
+            original = await claim_idempotency_key(idempotency_key, req, response)
+            claimed = original is None
+        finally:
+            # Replayed or rejected: the jobs registered for this request never run
+            if not claimed:
+                for style_job_id in style_jobs.values():
+                    jobs.pop(style_job_id, None)
+        if original:
+            return original
+    
+    if len(styles) > 1:
+        task = asyncio.create_task(run_fanout(style_jobs, req, deadline), name=f"fanout-{job_id}")
+        await wait_until_done(task, list(style_jobs.values()), request, detach=bool(idempotency_key))
+        logger.debug(f"✅ generate_comic: Returning {len(style_jobs)} jobs for styles {styles}")
+        return response
+    
+    await run_job_until_done(job_id, req, request, deadline=deadline, detach=bool(idempotency_key))
     
     logger.debug(f"✅ generate_comic: Returning job_id {job_id}")
+    return response
+
+def plan_expired(job: Dict[str, Any], now: float) -> bool:
+    """Whether a planned job has waited longer than PLAN_TTL_SECONDS for its render"""
+    return job["state"] == JobState.PLANNED.value and now - job["planned"] > settings.plan_ttl_seconds
+
+def expire_plans():
+    """Forget plans nobody rendered in time, so unrendered plans cannot pile up in memory"""
+    now = time.time()
+    expired = [job_id for job_id, job in list(jobs.items()) if plan_expired(job, now)]
+    for job_id in expired:
+        jobs.pop(job_id, None)
+    if expired:
+        logger.info(f"🧹 expire_plans: Dropped {len(expired)} plans that were never rendered")
+        metrics.inc("plans_expired_total", len(expired))
+
+@app.post("/plan", response_model=PlanResponse)
+async def plan_comic(req: GenerateRequest):
+    """Plan a comic (scene and panel descriptions) without rendering any images"""
+    logger.debug(f"🔍 plan_comic: Received request - style={req.style}, panels={req.panels}, text_length={len(req.text)}")
+    validate_generate_request(req)
+    if req.long_form:
+        raise HTTPException(status_code=400, detail="long_form jobs are planned page by page; use /generate")
+    if req.styles:
+        raise HTTPException(status_code=400, detail="A plan renders in one style; use /generate for several")
+    
+    job_id = str(uuid.uuid4())
+    try:
+        plan = await plan_pipeline({
+            "prompt": req.text,
+            "style": req.style,
+            "panels": req.panels,
+            "job_id": job_id,
+            "deadline_seconds": req.deadline_seconds
+        })
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ plan_comic: Planning job {job_id} ran out of time")
+        raise HTTPException(status_code=504, detail="Planning exceeded its deadline")
+    
+    # Held until POST /jobs/{job_id}/render, or PLAN_TTL_SECONDS; nothing is stored before images exist
+    expire_plans()
+    jobs[job_id] = {
+        "state": JobState.PLANNED.value,
+        "planned": time.time(),
+        "request": req.dict(),
+        "plan": {"scene": plan["scene"], "panel_descriptions": plan["panel_descriptions"]},
+        "message": plan["messages"][-1] if plan["messages"] else "Plan ready"
+    }
+    logger.debug(f"✅ plan_comic: Planned job {job_id}")
+    return PlanResponse(job_id=job_id, **jobs[job_id]["plan"])
+
+@app.post("/jobs/{job_id}/render", response_model=GenerateResponse)
+async def render_plan(job_id: str, request: Request, body: Optional[RenderRequest] = None):
+    """Render a planned job, optionally with an edited scene or panel descriptions"""
+    logger.debug(f"🔍 render_plan: Rendering planned job {job_id}")
+    
+    job = jobs.get(job_id)
+    if job is None:
+        logger.warning(f"⚠️ render_plan: Job {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+    if plan_expired(job, time.time()):
+        logger.warning(f"⚠️ render_plan: Plan {job_id} expired before it was rendered")
+        jobs.pop(job_id, None)
+        raise HTTPException(status_code=410, detail="Plan expired; plan the comic again")
+    if job["state"] != JobState.PLANNED.value:
+        logger.warning(f"⚠️ render_plan: Job {job_id} is not awaiting render, state: {job['state']}")
+        raise HTTPException(status_code=409, detail=f"Job is not awaiting render (state: {job['state']})")
+    
+    plan = dict(job["plan"])
+    if body and body.scene is not None:
+        plan["scene"] = body.scene
+    if body and body.panel_descriptions is not None:
+        plan["panel_descriptions"] = body.panel_descriptions
+    
+    # Edits may change the panel count; it must still be one /generate would accept
+    req = GenerateRequest(**job["request"]).copy(update={"panels": len(plan["panel_descriptions"])})
+    validate_generate_request(req)
+    deadline = request_deadline(req)
+    
+    jobs[job_id] = {
+        "state": JobState.PENDING.value,
+        "request": req.dict(),
+        "message": "Rendering approved plan"
+    }
+    
+    await run_job_until_done(job_id, req, request, plan=plan, deadline=deadline)
+    
+    logger.debug(f"✅ render_plan: Returning job_id {job_id}")
     return GenerateResponse(job_id=job_id)
 
-@app.get("/status/{job_id}", response_model=StatusResponse)
-def check_status(job_id: str):
-    """Check the status of a comic generation job"""
-    logger.debug(f"🔍 check_status: Checking status for job {job_id}")
+@app.post("/jobs/{job_id}/resume", response_model=GenerateResponse)
+async def resume_job(job_id: str, request: Request):
+    """Render the pages a long-form job has not finished yet"""
+    logger.debug(f"🔍 resume_job: Resuming job {job_id}")
+    
+    if job_id in running_jobs:
+        logger.warning(f"⚠️ resume_job: Job {job_id} is still running")
+        raise HTTPException(status_code=409, detail="Job is still running")
+    
+    job = load_stored_job(job_id)
+    record = (job or {}).get("artifacts")
+    if not record:
+        logger.warning(f"⚠️ resume_job: No stored record for job {job_id}")
+        raise HTTPException(status_code=404, detail="Job not found in storage")
+    if record.get("mode") != "long":
+        raise HTTPException(status_code=400, detail="Only long-form jobs can be resumed")
+    if all(page["state"] == "done" for page in record["pages"]):
+        logger.debug(f"✅ resume_job: Job {job_id} has no pages left to render")
+        return GenerateResponse(job_id=job_id)
+    
+    req = GenerateRequest(
+        text=record["prompt"],
+        style=record["style"],
+        panels=record["panel_count"],
+        long_form=True,
+        panels_per_page=record["panels_per_page"],
+        output_format=record["output_format"],
+        image_tier=record.get("image_tier")
+    )
+    jobs[job_id] = {
+        "state": JobState.PENDING.value,
+        "request": req.dict(),
+        "message": "Job resumed"
+    }
+    
+    await run_job_until_done(job_id, req, request, record)
+    
+    logger.debug(f"✅ resume_job: Returning job_id {job_id}")
+    return GenerateResponse(job_id=job_id)
+
+@app.post("/jobs/{job_id}/finalize", response_model=FinalizeResponse)
+async def finalize_job(job_id: str, body: Optional[FinalizeRequest] = None):
+    """Upgrade a progressive job's draft to final quality, for all panels or only the chosen ones"""
+    logger.debug(f"🔍 finalize_job: Finalizing job {job_id}")
+    
+    job = load_stored_job(job_id)
+    if job is None:
+        logger.warning(f"⚠️ finalize_job: Job {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+    if "final" not in job:
+        raise HTTPException(status_code=400, detail="Not a progressive job")
+    if job["state"] != JobState.DONE.value:
+        raise HTTPException(status_code=400, detail="Draft not ready yet")
+    if job_id in finalize_tasks or job["final"]["state"] == JobState.DONE.value:
+        logger.warning(f"⚠️ finalize_job: Job {job_id} already finalizing or finalized")
+        raise HTTPException(status_code=409, detail=f"Upgrade already {job['final']['state']}")
+    
+    panel_numbers = body.panels if body else None
+    panel_count = len((job.get("artifacts") or {}).get("panels") or job["result"].get("image_data", []))
+    if panel_numbers and any(number < 1 or number > panel_count for number in panel_numbers):
+        raise HTTPException(status_code=400, detail=f"Panel numbers must be between 1 and {panel_count}")
+    
+    jobs[job_id] = job
+    start_finalize(job_id, sorted(set(panel_numbers)) if panel_numbers else None)
+    logger.debug(f"✅ finalize_job: Upgrade of job {job_id} started")
+    return FinalizeResponse(job_id=job_id, state=job["final"]["state"], message="Upgrade started")
+
+@app.delete("/jobs/{job_id}", response_model=CancelResponse)
+async def cancel_job(job_id: str):
+    """Cancel a running comic generation job"""
+    logger.debug(f"🔍 cancel_job: Cancelling job {job_id}")
+    
+    if job_id not in jobs:
+        logger.warning(f"⚠️ cancel_job: Job {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    task = running_jobs.get(job_id)
+    if task is None or task.done():
+        state = jobs[job_id]["state"]
+        if state == JobState.CANCELLED.value:
+            return CancelResponse(job_id=job_id, state=state, message=jobs[job_id].get("message"))
+        logger.warning(f"⚠️ cancel_job: Job {job_id} is not running, state: {state}")
+        raise HTTPException(status_code=409, detail=f"Job is not running (state: {state})")
+    
+    task.cancel()
+    # Wait for the task to unwind so the response reflects the saved partial state
+    await asyncio.wait({task})
+    
+    logger.info(f"🛑 cancel_job: Job {job_id} cancelled")
+    return CancelResponse(job_id=job_id, state=jobs[job_id]["state"], message=jobs[job_id].get("message"))
+
+# Inline payloads /status only returns when asked for via ?fields=
+INLINE_STATUS_FIELDS = {"comic_data", "panel_images"}
+
+def _artifact_url(path: str, entry: Optional[Dict[str, Any]]) -> str:
+    """URL for an artifact, versioned by its ETag so it can be cached forever"""
+    if entry:
+        return f"{path}?v={artifact_version(entry['etag'])}"
+    return path
+
+@app.get("/status/{job_id}", response_model=StatusResponse, response_model_exclude_none=True)
+def check_status(job_id: str, request: Request, fields: Optional[str] = None):
+    """Check the status of a comic generation job.
+    
+    Returns state, progress and artifact URLs. Base64 payloads are only
+    included when requested, e.g. ?fields=comic_data,panel_images.
+    """
+    logger.debug(f"🔍 check_status: Checking status for job {job_id}, fields={fields}")
     
     if job_id not in jobs:
         logger.warning(f"⚠️ check_status: Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
     
+    requested = {field.strip() for field in fields.split(",") if field.strip()} if fields else set()
+    unknown = requested - INLINE_STATUS_FIELDS
+    if unknown:
+        logger.warning(f"⚠️ check_status: Unknown fields requested: {unknown}")
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}. Allowed: {sorted(INLINE_STATUS_FIELDS)}")
+    
     job = jobs[job_id]
     logger.debug(f"📊 check_status: Job {job_id} state: {job['state']}")
     
-    # Get comic data from result if available
-    comic_data = None
-    panel_images = []
+    status = StatusResponse(state=job["state"], message=job.get("message", ""))
+    
+    if job["state"] in (JobState.PENDING.value, JobState.PROCESSING.value):
+        status.progress = get_job_progress(job_id)
     
-    if job["state"] == JobState.DONE.value and "result" in job:
+    if job["state"] == JobState.PLANNED.value:
+        status.plan = job["plan"]
+    
+    if job["state"] == JobState.DONE.value:
+        result = job.get("result") or {}
+        artifacts = job.get("artifacts") or {}
+        failed = result["failed_panels"] if "failed_panels" in result else artifacts.get("failed_panels", [])
+        # A job that failed or ran out of time may have no comic at all
+        has_comic = bool(result.get("comic_data") or artifacts.get("comic"))
+        status.complete = not failed and not result.get("error") and has_comic
+        status.repair = job.get("repair")
+    
+    if "final" in job:
+        status.final = job["final"]
+        draft_artifacts, draft_result = job_sources(job, draft=True)
+        draft_panels = draft_artifacts.get("panels") or draft_result.get("image_data", [])
+        status.draft = {
+            "comic_url": _artifact_url(f"/comic/{job_id}/draft", draft_artifacts.get("comic")),
+            "panel_urls": [
+                _artifact_url(f"/panel/{job_id}/{i+1}/draft", entry if isinstance(entry, dict) else None)
+                for i, entry in enumerate(draft_panels)
+            ]
+        }
+    
+    # Long-form jobs report every page, including ones finished while the job still runs
+    record = get_live_record(job_id) or job.get("artifacts") or {}
+    if record.get("pages"):
+        status.pages = [
+            {
+                "page": page["page"],
+                "state": page["state"],
+                "summary": page["summary"],
+                "url": _artifact_url(f"/page/{job_id}/{page['page']}", page["image"]) if page["image"] else None
+            }
+            for page in record["pages"]
+        ]
+    
+    if job["state"] in SERVABLE_STATES and "result" in job:
         result = job["result"]
-        if "comic_data" in result:
-            comic_data = result["comic_data"]  # This is base64 encoded
-            logger.debug(f"📄 check_status: Found comic data for job {job_id}, size: {len(comic_data)} chars")
-        if "image_data" in result:
-            panel_images = result["image_data"]  # This is a list of base64 encoded images
-            logger.debug(f"🖼️ check_status: Found {len(panel_images)} panel images for job {job_id}")
+        artifacts = job.get("artifacts") or {}
+        stored_panels = artifacts.get("panels", [])
+        
+        if artifacts.get("pages"):
+            # Stored page by page, never held in memory: URLs only, page 1 doubles as the cover
+            if artifacts.get("comic"):
+                status.comic_url = _artifact_url(f"/comic/{job_id}", artifacts["comic"])
+            status.panel_urls = [_artifact_url(f"/panel/{job_id}/{i+1}", entry) for i, entry in enumerate(stored_panels)]
+        elif result.get("comic_data") or artifacts.get("comic"):
+            status.comic_url = _artifact_url(f"/comic/{job_id}", artifacts.get("comic"))
+            if "comic_data" in requested:
+                status.comic_data = base64.b64encode(artifact_bytes(artifacts.get("comic"), result.get("comic_data"))).decode('utf-8')
+                logger.debug(f"📄 check_status: Inlining comic data for job {job_id}, size: {len(status.comic_data)} chars")
+        if ("image_data" in result or stored_panels) and not artifacts.get("pages"):
+            # A job loaded from storage has no scratch handles, only the entries of its record
+            handles = result["image_data"] if "image_data" in result else stored_panels
+            # Panels a cancelled job never produced are None, keeping each URL at its panel's position
+            status.panel_urls = [
+                _artifact_url(f"/panel/{job_id}/{i+1}", stored_panels[i] if i < len(stored_panels) else None)
+                if handle is not None else None
+                for i, handle in enumerate(handles)
+            ]
+            if "panel_images" in requested:
+                status.panel_images = [
+                    base64.b64encode(artifact_bytes(stored_panels[i] if i < len(stored_panels) else None, handle)).decode('utf-8')
+                    if handle is not None else None
+                    for i, handle in enumerate(handles)
+                ]
+                logger.debug(f"🖼️ check_status: Inlining {len(status.panel_images)} panel images for job {job_id}")
+    
+    # Hash the body so an unchanged status costs a 304 instead of a payload
+    body = json.dumps(jsonable_encoder(status, exclude_none=True), separators=(",", ":"))
+    etag = f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        logger.debug(f"✅ check_status: Status for job {job_id} unchanged")
+        return Response(status_code=304, headers=headers)
     
     logger.debug(f"✅ check_status: Returning status for job {job_id}")
-    return StatusResponse(
-        state=job["state"],
-        message=job.get("message", ""),
-        comic_data=comic_data,
-        panel_images=panel_images
-    )
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def export_comic(job_id: str, request: Request, fmt: str) -> Response:
+    """Stream a saved comic's pages as a PDF or CBZ document"""
+    logger.debug(f"🔍 export_comic: Exporting job {job_id} as {fmt}")
+    
+    job = load_stored_job(job_id)
+    if job is None:
+        logger.warning(f"⚠️ export_comic: Job {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["state"] not in SERVABLE_STATES:
+        logger.warning(f"⚠️ export_comic: Job {job_id} not ready, state: {job['state']}")
+        raise HTTPException(status_code=400, detail="Comic not ready yet")
+    
+    # Exports stream from stored blobs only, so wait for the write-behind
+    record = job.get("artifacts")
+    pages = job_pages(record) if record else []
+    if not pages:
+        logger.warning(f"⚠️ export_comic: Job {job_id} has no stored pages yet")
+        raise HTTPException(status_code=404, detail="Comic not stored yet, retry shortly")
+    
+    headers = {"Cache-Control": cache_control(request, pages_version(pages)), "ETag": export_etag(fmt, pages)}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    export = create_export(fmt, pages, title=record.get("prompt"), created=record.get("created"))
+    headers["Content-Length"] = str(export.content_length)
+    headers["Content-Disposition"] = f'attachment; filename="comic_{job_id}.{fmt}"'
+    metrics.inc(f"exports_total.{fmt}")
+    touch_job(job_id)
+    logger.debug(f"✅ export_comic: Streaming {len(pages)} pages, {export.content_length} bytes")
+    return StreamingResponse(iter(export), media_type=export.media_type, headers=headers)
+
+# Registered before /comic/{job_id}, which would otherwise capture the suffix
+@app.get("/comic/{job_id}.pdf")
+def get_comic_pdf(job_id: str, request: Request):
+    """Download a comic as a PDF, one page per image"""
+    return export_comic(job_id, request, "pdf")
+
+@app.get("/comic/{job_id}.cbz")
+def get_comic_cbz(job_id: str, request: Request):
+    """Download a comic as a CBZ archive for comic readers"""
+    return export_comic(job_id, request, "cbz")
+
+def job_sources(job: Dict[str, Any], draft: bool = False):
+    """(stored record, in-memory result) to serve a job from; draft picks a progressive job's draft"""
+    if draft:
+        if "final" not in job:
+            raise HTTPException(status_code=404, detail="Not a progressive job")
+        if job.get("draft"):
+            return job["draft"]["artifacts"] or {}, job["draft"]["result"]
+        # Not upgraded yet, so the current artifacts are the draft
+    return job.get("artifacts") or {}, job.get("result", {})
+
+@app.get("/comic/{job_id}/draft")
+def get_comic_draft(job_id: str, request: Request, format: Optional[OutputFormat] = Query(None),
+                    w: Optional[int] = Query(None, description="Thumbnail width, one of THUMBNAIL_WIDTHS")):
+    """Get the draft comic of a progressive job, even after it was upgraded"""
+    return get_comic(job_id, request, format, w, draft=True)
 
 @app.get("/comic/{job_id}")
-def get_comic(job_id: str):
+def get_comic(job_id: str, request: Request, format: Optional[OutputFormat] = Query(None),
+              w: Optional[int] = Query(None, description="Thumbnail width, one of THUMBNAIL_WIDTHS"),
+              draft: bool = Query(False, include_in_schema=False)):
     """Get the comic image directly"""
-    logger.debug(f"🔍 get_comic: Getting comic for job {job_id}")
+    logger.debug(f"🔍 get_comic: Getting comic for job {job_id}, draft={draft}")
     
-    if job_id not in jobs:
+    job = load_stored_job(job_id)
+    if job is None:
         logger.warning(f"⚠️ get_comic: Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
-    if job["state"] != JobState.DONE.value:
+    if job["state"] not in SERVABLE_STATES:
         logger.warning(f"⚠️ get_comic: Job {job_id} not ready, state: {job['state']}")
         raise HTTPException(status_code=400, detail="Comic not ready yet")
     
-    if "result" not in job or "comic_data" not in job["result"]:
+    artifacts, result = job_sources(job, draft)
+    entry = artifacts.get("comic")
+    comic_data = result.get("comic_data")
+    if not entry and not comic_data:
         logger.warning(f"⚠️ get_comic: No comic data found for job {job_id}")
         raise HTTPException(status_code=404, detail="Comic data not found")
     
-    # Decode base64 data
-    comic_data = base64.b64decode(job["result"]["comic_data"])
-    logger.debug(f"✅ get_comic: Returning comic data for job {job_id}, size: {len(comic_data)} bytes")
-    
-    return Response(content=comic_data, media_type="image/png")
+    logger.debug(f"✅ get_comic: Returning comic for job {job_id}")
+    touch_job(job_id)
+    return serve_artifact(request, entry, comic_data, choose_format(request, format), check_width(w))
+
+@app.get("/panel/{job_id}/{panel_number}/draft")
+def get_panel_draft(job_id: str, panel_number: int, request: Request, format: Optional[OutputFormat] = Query(None),
+                    w: Optional[int] = Query(None, description="Thumbnail width, one of THUMBNAIL_WIDTHS")):
+    """Get a draft panel of a progressive job, even after it was upgraded"""
+    return get_panel(job_id, panel_number, request, format, w, draft=True)
 
 @app.get("/panel/{job_id}/{panel_number}")
-def get_panel(job_id: str, panel_number: int):
+def get_panel(job_id: str, panel_number: int, request: Request, format: Optional[OutputFormat] = Query(None),
+              w: Optional[int] = Query(None, description="Thumbnail width, one of THUMBNAIL_WIDTHS"),
+              draft: bool = Query(False, include_in_schema=False)):
     """Get a specific panel image"""
-    logger.debug(f"🔍 get_panel: Getting panel {panel_number} for job {job_id}")
+    logger.debug(f"🔍 get_panel: Getting panel {panel_number} for job {job_id}, draft={draft}")
     
-    if job_id not in jobs:
+    job = load_stored_job(job_id)
+    if job is None:
         logger.warning(f"⚠️ get_panel: Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
-    if job["state"] != JobState.DONE.value:
+    if job["state"] not in SERVABLE_STATES:
         logger.warning(f"⚠️ get_panel: Job {job_id} not ready, state: {job['state']}")
         raise HTTPException(status_code=400, detail="Comic not ready yet")
     
-    if "result" not in job or "image_data" not in job["result"]:
-        logger.warning(f"⚠️ get_panel: No panel data found for job {job_id}")
-        raise HTTPException(status_code=404, detail="Panel data not found")
-    
-    panel_images = job["result"]["image_data"]
+    artifacts, result = job_sources(job, draft)
+    stored_panels = artifacts.get("panels", [])
+    panel_images = result.get("image_data", [])
+    panel_count = max(len(stored_panels), len(panel_images))
     
-    if panel_number < 1 or panel_number > len(panel_images):
+    if panel_number < 1 or panel_number > panel_count:
         logger.warning(f"⚠️ get_panel: Panel number {panel_number} out of range for job {job_id}")
         raise HTTPException(status_code=404, detail="Panel number out of range")
     
-    # Decode base64 data
-    panel_data = base64.b64decode(panel_images[panel_number - 1])
-    logger.debug(f"✅ get_panel: Returning panel {panel_number} for job {job_id}, size: {len(panel_data)} bytes")
+    entry = stored_panels[panel_number - 1] if panel_number <= len(stored_panels) else None
+    fallback = panel_images[panel_number - 1] if panel_number <= len(panel_images) else None
+    if entry is None and fallback is None:
+        # A cancelled job keeps the numbering of the panels it never produced
+        logger.warning(f"⚠️ get_panel: Panel {panel_number} of job {job_id} was never generated")
+        raise HTTPException(status_code=404, detail="Panel was not generated")
+    logger.debug(f"✅ get_panel: Returning panel {panel_number} for job {job_id}")
+    touch_job(job_id)
+    return serve_artifact(request, entry, fallback, choose_format(request, format), check_width(w))
+
+@app.get("/page/{job_id}/{page_number}")
+def get_page(job_id: str, page_number: int, request: Request, format: Optional[OutputFormat] = Query(None),
+             w: Optional[int] = Query(None, description="Thumbnail width, one of THUMBNAIL_WIDTHS")):
+    """Get one composed page of a long-form comic, as soon as that page is done"""
+    logger.debug(f"🔍 get_page: Getting page {page_number} for job {job_id}")
+    
+    job = load_stored_job(job_id)
+    if job is None:
+        logger.warning(f"⚠️ get_page: Job {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    return Response(content=panel_data, media_type="image/png")
+    record = get_live_record(job_id) or job.get("artifacts") or {}
+    pages = record.get("pages", [])
+    if not pages:
+        raise HTTPException(status_code=400, detail="Not a long-form comic")
+    
+    if page_number < 1 or page_number > len(pages):
+        logger.warning(f"⚠️ get_page: Page number {page_number} out of range for job {job_id}")
+        raise HTTPException(status_code=404, detail="Page number out of range")
+    
+    entry = pages[page_number - 1]["image"]
+    if not entry:
+        raise HTTPException(status_code=400, detail="Page not ready yet")
+    
+    logger.debug(f"✅ get_page: Returning page {page_number} for job {job_id}")
+    touch_job(job_id)
+    return serve_artifact(request, entry, None, choose_format(request, format), check_width(w))
 
 @app.get("/health", response_model=HealthResponse)
 def health():
@@ -225,34 +1260,59 @@ def health():
     logger.debug("🔍 health: Health check requested")
     return HealthResponse(status="ok")
 
+@app.get("/metrics")
+def get_metrics():
+    """In-process counters, gauges and timing summaries"""
+    logger.debug("🔍 get_metrics: Metrics requested")
+    return metrics.snapshot()
+
+def gallery_entry(comic: Dict[str, Any]) -> Dict[str, Any]:
+    """A /comics item, its URLs versioned so they can be cached forever"""
+    # Blob keys end in the content hash their ETag is made of
+    version = artifact_version(comic["comic_key"].rsplit("/", 1)[-1])
+    return {
+        "job_id": comic["job_id"],
+        "comic_url": f"/comic/{comic['job_id']}?v={version}",
+        "thumbnail_url": f"/comic/{comic['job_id']}?w={settings.gallery_thumbnail_width}&v={version}",
+        "export_urls": {
+            fmt: f"/comic/{comic['job_id']}.{fmt}?v={comic['pages_version']}" for fmt in EXPORT_FORMATS
+        } if comic["pages_version"] else None,
+        "panels": comic["panels"],
+        "style": comic["style"],
+        "created": comic["created"]
+    }
+
 @app.get("/comics")
-def list_saved_comics():
-    """List all saved comics"""
-    logger.debug("🔍 list_saved_comics: Listing saved comics")
+def list_saved_comics(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    style: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """List saved comics, newest first, one page at a time"""
+    logger.debug(f"🔍 list_saved_comics: Listing saved comics - limit={limit}, style={style}, since={since}, until={until}")
     
     try:
-        comics = []
-        if OUTPUT_DIR.exists():
-            for job_dir in OUTPUT_DIR.iterdir():
-                if job_dir.is_dir():
-                    comic_file = job_dir / "comic.png"
-                    if comic_file.exists():
-                        comics.append({
-                            "job_id": job_dir.name,
-                            "comic_path": str(comic_file),
-                            "panels": len(list(job_dir.glob("panel_*.png"))),
-                            "created": job_dir.stat().st_mtime
-                        })
-        
-        # Sort by creation time (newest first)
-        comics.sort(key=lambda x: x["created"], reverse=True)
-        
-        logger.debug(f"✅ list_saved_comics: Found {len(comics)} saved comics")
-        return {"comics": comics}
-        
+        comics, next_cursor = get_comic_index().list(
+            limit=limit,
+            cursor=cursor,
+            style=style,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None
+        )
+    except ValueError as e:
+        logger.warning(f"⚠️ list_saved_comics: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ list_saved_comics: Failed to list comics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to list comics: {e}")
+    
+    logger.debug(f"✅ list_saved_comics: Returning {len(comics)} saved comics")
+    return {
+        "comics": [gallery_entry(comic) for comic in comics],
+        "next_cursor": next_cursor
+    }
 
 @app.get("/")
 def root():
@@ -263,5 +1323,5 @@ def root():
         "docs": "/docs",
         "pipeline": "LangGraph-based comic generation with real AI",
         "saved_comics": f"/comics - List saved comics",
-        "output_dir": str(OUTPUT_DIR)
+        "storage": settings.storage_backend
     } 
\ No newline at end of file
@@ -2,31 +2,86 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
+# Output Format Enum (used by GenerateRequest below)
+class OutputFormat(str, Enum):
+    PNG = "png"
+    WEBP = "webp"
+    AVIF = "avif"
+    JPEG = "jpeg"
+
+# Image Tier Enum (see IMAGE_TIERS in utils/image_gen.py)
+class ImageTier(str, Enum):
+    DRAFT = "draft"
+    BALANCED = "balanced"
+    STANDARD = "standard"
+    HD = "hd"
+
 # API Request/Response Models
 class GenerateRequest(BaseModel):
     text: str = Field(..., description="User's creative prompt or scene description")
     style: str = Field(..., description="Art style: Graphic Novel, Manga, Pixar, Noir")
-    panels: int = Field(..., ge=2, le=6, description="Number of panels (2-6)")
+    panels: int = Field(..., description="Number of panels, from MIN_PANELS to MAX_PANELS (LONG_FORM_MAX_PANELS with long_form)")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="Seconds the whole job may take; defaults to JOB_DEADLINE_SECONDS")
+    output_format: Optional[OutputFormat] = Field(None, description="Encoding for the comic and panels: png, webp, avif, jpeg; defaults to OUTPUT_FORMAT")
+    image_tier: Optional[ImageTier] = Field(None, description="Panel resolution/quality: draft, balanced, standard, hd; defaults to IMAGE_TIER")
+    progressive: bool = Field(False, description="Deliver a fast draft comic first, then upgrade its panels to image_tier")
+    long_form: bool = Field(False, description="Plan an outline, then compose the comic page by page into a multi-page artifact")
+    panels_per_page: Optional[int] = Field(None, ge=1, le=6, description="Panels on each long-form page; defaults to PANELS_PER_PAGE")
+    styles: Optional[List[str]] = Field(None, description="More art styles to render from the same plan, one job per style")
 
 class GenerateResponse(BaseModel):
     job_id: str = Field(..., description="Unique job identifier for tracking")
+    style_jobs: Optional[Dict[str, str]] = Field(None, description="Multi-style requests: the job ID of each style")
+
+class PlanResponse(BaseModel):
+    job_id: str = Field(..., description="Job to render with POST /jobs/{job_id}/render")
+    scene: Dict[str, Any] = Field(..., description="Characters, setting, actions, mood and style notes")
+    panel_descriptions: List[str] = Field(..., description="One description per panel, in order")
+
+class RenderRequest(BaseModel):
+    scene: Optional[Dict[str, Any]] = Field(None, description="Edited scene; the planned one when omitted")
+    panel_descriptions: Optional[List[str]] = Field(None, description="Edited panel descriptions; the planned ones when omitted")
 
 class StatusResponse(BaseModel):
-    state: str = Field(..., description="Job state: pending, processing, done, failed")
+    state: str = Field(..., description="Job state: planned, pending, processing, done, failed, cancelled")
     message: Optional[str] = Field(None, description="Status message or error")
-    comic_data: Optional[str] = Field(None, description="Base64 encoded comic image data")
-    panel_images: Optional[List[str]] = Field(None, description="List of base64 encoded panel images")
+    progress: Optional[Dict[str, Any]] = Field(None, description="Current stage and panel counts while the job runs")
+    plan: Optional[Dict[str, Any]] = Field(None, description="Planned jobs: the scene and panel descriptions awaiting render")
+    comic_url: Optional[str] = Field(None, description="URL of the assembled comic image")
+    panel_urls: Optional[List[Optional[str]]] = Field(None, description="URLs of the individual panel images; null for panels a cancelled job never produced")
+    draft: Optional[Dict[str, Any]] = Field(None, description="Progressive jobs: comic_url and panel_urls of the draft")
+    final: Optional[Dict[str, Any]] = Field(None, description="Progressive jobs: state of the final-quality upgrade and the panels it covers")
+    pages: Optional[List[Dict[str, Any]]] = Field(None, description="Long-form jobs: state, summary and URL of each page")
+    complete: Optional[bool] = Field(None, description="Finished jobs: false while any panel is still a placeholder")
+    repair: Optional[Dict[str, Any]] = Field(None, description="Background retry of failed panels: state, panels left and attempts made")
+    comic_data: Optional[str] = Field(None, description="Base64 encoded comic image data (only with fields=comic_data)")
+    panel_images: Optional[List[Optional[str]]] = Field(None, description="List of base64 encoded panel images (only with fields=panel_images)")
+
+class FinalizeRequest(BaseModel):
+    panels: Optional[List[int]] = Field(None, description="Panel numbers to upgrade to final quality; all panels when omitted")
+
+class FinalizeResponse(BaseModel):
+    job_id: str = Field(..., description="Job being upgraded")
+    state: str = Field(..., description="State of the final-quality upgrade")
+    message: Optional[str] = Field(None, description="Upgrade details")
+
+class CancelResponse(BaseModel):
+    job_id: str = Field(..., description="Job that was cancelled")
+    state: str = Field(..., description="Job state after the cancellation request")
+    message: Optional[str] = Field(None, description="Cancellation details")
 
 class HealthResponse(BaseModel):
     status: str = Field(default="ok", description="Health check status")
 
 # LangGraph Pipeline Models
+# Also the JSON schemas the planning LLM calls are held to (see utils/llm.py)
 class SceneComponents(BaseModel):
     """Extracted components from user prompt"""
     characters: List[str] = Field(..., description="List of characters in the scene")
     setting: str = Field(..., description="Location/environment description")
     actions: List[str] = Field(..., description="Key actions happening in the scene")
-    tone: str = Field(..., description="Mood/atmosphere of the scene")
+    mood: str = Field(..., description="Mood/atmosphere of the scene")
+    style_notes: str = Field(..., description="Specific requirements of the art style")
     dialogue: Optional[List[str]] = Field(None, description="Any dialogue or speech")
 
 class PanelSpec(BaseModel):
@@ -37,6 +92,26 @@ class PanelSpec(BaseModel):
     action: str = Field(..., description="Main action happening in this panel")
     camera_angle: str = Field(..., description="Camera perspective/framing")
     mood: str = Field(..., description="Emotional tone of this panel")
+    description: str = Field(..., description="Detailed description of the panel for image generation")
+
+class PanelPlan(BaseModel):
+    """Panels planned for a comic or a page of one"""
+    panels: List[PanelSpec] = Field(..., description="Panels in reading order")
+
+class ComicPlan(BaseModel):
+    """Scene and panels planned in a single call"""
+    scene: SceneComponents
+    panels: List[PanelSpec] = Field(..., description="Panels in reading order")
+
+class PageSummary(BaseModel):
+    """What happens on one page of a long-form comic"""
+    page: int = Field(..., description="Page number")
+    summary: str = Field(..., description="What happens on this page")
+
+class Outline(BaseModel):
+    """Story-wide scene and page summaries of a long-form comic"""
+    scene: SceneComponents
+    pages: List[PageSummary] = Field(..., description="Pages in reading order")
 
 class ImagePrompt(BaseModel):
     """Generated prompt for image generation"""
@@ -67,7 +142,9 @@ class ArtStyle(str, Enum):
 
 # Job State Enum
 class JobState(str, Enum):
+    PLANNED = "planned"
     PENDING = "pending"
     PROCESSING = "processing"
     DONE = "done"
-    FAILED = "failed" 
\ No newline at end of file
+    FAILED = "failed"
+    CANCELLED = "cancelled" 
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Output encoders for rendered artifacts.
+
+Comics and placeholders can be written as tuned PNG, lossy or lossless
+WebP, AVIF (when Pillow was built with it) or progressive JPEG. Encoder
+options come from settings; encode time and size are reported per format.
+"""
+
+import time
+import logging
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+from PIL import Image, features
+
+from ..config import settings
+from .render_pool import observe
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (media type, Pillow format)
+OUTPUT_FORMATS = {
+    "png": ("image/png", "PNG"),
+    "webp": ("image/webp", "WEBP"),
+    "avif": ("image/avif", "AVIF"),
+    "jpeg": ("image/jpeg", "JPEG"),
+}
+
+def available_formats() -> List[str]:
+    """Output formats this Pillow build can encode"""
+    optional = {"webp": "webp", "avif": "avif"}
+    return [fmt for fmt in OUTPUT_FORMATS if fmt not in optional or features.check(optional[fmt])]
+
+def media_type_for(fmt: str) -> str:
+    return OUTPUT_FORMATS[fmt][0]
+
+def format_for(media_type: str) -> Optional[str]:
+    """Inverse of media_type_for, or None for media types we do not encode"""
+    return next((fmt for fmt, (known, _) in OUTPUT_FORMATS.items() if known == media_type), None)
+
+def sniff_media_type(data: bytes) -> str:
+    """Media type of encoded image bytes, from their magic number"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+def encoder_options(fmt: str) -> Dict[str, Any]:
+    """Pillow save() options for a format, from settings"""
+    if fmt == "png":
+        return {"compress_level": settings.png_compress_level, "optimize": settings.png_optimize}
+    if fmt == "webp":
+        return {"quality": settings.webp_quality, "lossless": settings.webp_lossless, "method": settings.webp_method}
+    if fmt == "avif":
+        return {"quality": settings.avif_quality, "speed": settings.avif_speed}
+    if fmt == "jpeg":
+        return {"quality": settings.jpeg_quality, "progressive": True, "optimize": True}
+    raise ValueError(f"Unknown output format '{fmt}'")
+
+def encode_image(image: Image.Image, fmt: str = "png") -> bytes:
+    """Encode a Pillow image in the given output format"""
+    if fmt not in available_formats():
+        raise ValueError(f"Output format '{fmt}' is not available, expected one of {available_formats()}")
+
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    start = time.perf_counter()
+    output = BytesIO()
+    image.save(output, format=OUTPUT_FORMATS[fmt][1], **encoder_options(fmt))
+    data = output.getvalue()
+
+    observe(f"encode_seconds.{fmt}", time.perf_counter() - start)
+    observe(f"encode_bytes.{fmt}", len(data))
+    logger.debug(f"🗜️ encode_image: Encoded {image.width}x{image.height} as {fmt}, {len(data)} bytes")
+    return data
+
+def transcode(data: bytes, fmt: str) -> bytes:
+    """Re-encode image bytes in another output format; bytes already in it are returned as is"""
+    if sniff_media_type(data) == media_type_for(fmt):
+        return data
+    return encode_image(Image.open(BytesIO(data)), fmt)
+
+def negotiate_format(accept: Optional[str], candidates: List[str]) -> Optional[str]:
+    """Pick the first candidate the Accept header explicitly allows, or None to keep the original"""
+    if not accept:
+        return None
+
+    accepted = {}
+    for part in accept.split(","):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+
+    # Wildcards alone say nothing about modern formats; only explicit types count
+    for fmt in candidates:
+        if accepted.get(media_type_for(fmt), 0) > 0:
+            return fmt
+    return None
+
+def negotiable_formats() -> List[str]:
+    """Formats offered through Accept negotiation, in server preference order"""
+    configured = [fmt.strip().lower() for fmt in settings.negotiate_formats.split(",") if fmt.strip()]
+    return [fmt for fmt in configured if fmt in available_formats()]
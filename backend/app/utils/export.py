@@ -0,0 +1,266 @@
+"""
+Streaming PDF and CBZ export of saved comics.
+
+Pages are streamed from stored blobs chunk by chunk into the response (or
+a file), so memory stays bounded however many pages there are. Both
+writers work out their exact size before sending a byte, so responses carry
+a Content-Length. JPEG pages go into the PDF as-is (DCTDecode); other
+formats use their cached JPEG variant. reportlab is not used here: its
+canvas holds the whole document in memory until save().
+
+Run `python -m app.utils.export <pdf|cbz> <output> <job_id>...` to bundle
+a batch of saved jobs into one file.
+"""
+
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import logging
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+from .encoders import format_for
+from .storage import StorageBackend, get_storage, job_key, job_pages
+from .variants import get_variant
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "pdf": "application/pdf",
+    "cbz": "application/vnd.comicbook+zip",
+}
+
+class Deferred:
+    """Bytes of a known length that can only be rendered once the parts before them have streamed"""
+
+    def __init__(self, length: int, render: Callable[[], bytes]):
+        self.length = length
+        self.render = render
+
+    def __len__(self) -> int:
+        return self.length
+
+# A planned export is a sequence of literal bytes, stored blob entries and deferred bytes
+Part = Union[bytes, Dict[str, Any], Deferred]
+
+def export_etag(fmt: str, pages: List[Dict[str, Any]]) -> str:
+    """Strong ETag for an export, derived from the ETags of its pages"""
+    digest = hashlib.sha256(f"{fmt}:{','.join(entry['etag'] for entry in pages)}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def jpeg_header(chunks: Iterator[bytes]) -> Tuple[int, int, int]:
+    """(width, height, components) from a JPEG's frame header, reading only as far as it"""
+    buffer, pos = b"", 2
+    for chunk in chunks:
+        buffer += chunk
+        while pos + 4 <= len(buffer):
+            if buffer[pos] != 0xFF:
+                raise ValueError("Not a JPEG stream")
+            marker = buffer[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            # SOF0..SOF15, except DHT/JPG/DAC which share the range
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                if pos + 10 > len(buffer):
+                    break
+                height, width = struct.unpack(">HH", buffer[pos + 5:pos + 9])
+                return width, height, buffer[pos + 9]
+            pos += 2 + struct.unpack(">H", buffer[pos + 2:pos + 4])[0]
+    raise ValueError("No JPEG frame header found")
+
+def _pdf_text(text: str) -> bytes:
+    """PDF text string as UTF-16BE hex, which needs no escaping"""
+    return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode() + b">"
+
+class Export:
+    """A planned document: exact length known up front, bytes produced on iteration"""
+
+    media_type = "application/octet-stream"
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self.parts: List[Part] = []
+        self.content_length = 0
+
+    def _emit(self, part: Part):
+        self.parts.append(part)
+        self.content_length += part["size"] if isinstance(part, dict) else len(part)
+
+    def _stream(self, entry: Dict[str, Any]) -> Iterator[bytes]:
+        yield from self.storage.stream(entry["key"])
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+            elif isinstance(part, dict):
+                yield from self._stream(part)
+            else:
+                data = part.render()
+                if len(data) != part.length:
+                    raise Exception(f"Deferred export part is {len(data)} bytes, planned as {part.length}")
+                yield data
+
+    def write_to(self, path: str):
+        """Stream the export into a file"""
+        with open(path, "wb") as f:
+            for chunk in self:
+                f.write(chunk)
+
+class PdfExport(Export):
+    """One image per page, pages sized to the image at 72 dpi"""
+
+    media_type = EXPORT_FORMATS["pdf"]
+
+    def __init__(self, storage: StorageBackend, pages: List[Dict[str, Any]], title: Optional[str] = None):
+        super().__init__(storage)
+        images = []
+        for entry in pages:
+            if entry.get("media_type") != "image/jpeg":
+                entry = get_variant(entry, "jpeg")
+            images.append((entry, *jpeg_header(storage.stream(entry["key"], 64 * 1024))))
+        self._plan(images, title)
+
+    def _plan(self, images: List[Tuple[Dict[str, Any], int, int, int]], title: Optional[str]):
+        offsets = {}
+
+        def start_object(number: int, body: bytes):
+            offsets[number] = self.content_length
+            self._emit(f"{number} 0 obj\n".encode() + body)
+
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        # 1: catalog, 2: page tree, 3: info, then page/contents/image per page
+        kids = " ".join(f"{4 + 3 * i} 0 R" for i in range(len(images)))
+        start_object(1, b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        start_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(images)} >>\nendobj\n".encode())
+        start_object(3, b"<< /Producer (prompt-to-comic) /Title " + _pdf_text(title or "Comic") + b" >>\nendobj\n")
+
+        for i, (entry, width, height, components) in enumerate(images):
+            page, contents, image = 4 + 3 * i, 5 + 3 * i, 6 + 3 * i
+            start_object(page, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {contents} 0 R >>\nendobj\n"
+            ).encode())
+            drawing = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+            start_object(contents, f"<< /Length {len(drawing)} >>\nstream\n".encode() + drawing + b"\nendstream\nendobj\n")
+            color_space = {1: "DeviceGray", 4: "DeviceCMYK"}.get(components, "DeviceRGB")
+            start_object(image, (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /{color_space} "
+                f"/BitsPerComponent 8 /Filter /DCTDecode /Length {entry['size']} >>\nstream\n"
+            ).encode())
+            self._emit(entry)
+            self._emit(b"\nendstream\nendobj\n")
+
+        xref_offset = self.content_length
+        count = 3 + 3 * len(images)
+        xref = [f"xref\n0 {count + 1}\n", "0000000000 65535 f \n"]
+        xref += [f"{offsets[number]:010d} 00000 n \n" for number in range(1, count + 1)]
+        self._emit("".join(xref).encode())
+        self._emit(f"trailer\n<< /Size {count + 1} /Root 1 0 R /Info 3 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+class CbzExport(Export):
+    """Uncompressed zip of page images plus a ComicInfo.xml, as comic readers expect"""
+
+    media_type = EXPORT_FORMATS["cbz"]
+
+    def __init__(self, storage: StorageBackend, pages: List[Dict[str, Any]], title: Optional[str] = None,
+                 created: Optional[float] = None):
+        super().__init__(storage)
+        info = (
+            '<?xml version="1.0" encoding="utf-8"?>\n<ComicInfo>'
+            f"<Title>{escape(title or 'Comic')}</Title><PageCount>{len(pages)}</PageCount></ComicInfo>\n"
+        ).encode()
+        members: List[Tuple[str, Part]] = [("ComicInfo.xml", info)]
+        for i, entry in enumerate(pages):
+            extension = format_for(entry.get("media_type", "")) or "png"
+            members.append((f"{i + 1:03d}.{'jpg' if extension == 'jpeg' else extension}", entry))
+        self._plan(members, created or time.time())
+
+    def _stream(self, entry: Dict[str, Any]) -> Iterator[bytes]:
+        # Images are already compressed, so pages are stored; their CRC is taken
+        # as they stream and written in the data descriptor that follows them
+        crc = 0
+        for chunk in super()._stream(entry):
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+        self._streamed_crc = crc
+
+    def _descriptor(self, crcs: List[int], i: int, size: int) -> bytes:
+        crcs[i] = self._streamed_crc
+        return struct.pack("<IIII", 0x08074B50, crcs[i], size, size)
+
+    def _plan(self, members: List[Tuple[str, Part]], created: float):
+        stamp = time.localtime(created)
+        dos_time = (stamp.tm_hour << 11) | (stamp.tm_min << 5) | (stamp.tm_sec // 2)
+        dos_date = (max(stamp.tm_year - 1980, 0) << 9) | (stamp.tm_mon << 5) | stamp.tm_mday
+
+        # Sizes are known from the entries, CRCs of stored pages only once they have streamed
+        layout, crcs = [], [0] * len(members)
+        for i, (name, part) in enumerate(members):
+            encoded = name.encode()
+            size = len(part) if isinstance(part, bytes) else part["size"]
+            if size > 0xFFFFFFFF or self.content_length > 0xFFFFFFFF:
+                raise Exception("CBZ export exceeds 4 GiB, which needs ZIP64")
+            # Flag 0x800: names are UTF-8; 0x8: CRC in a data descriptor after the data. Method 0: stored
+            flags = 0x800 if isinstance(part, bytes) else 0x808
+            if isinstance(part, bytes):
+                crcs[i] = zlib.crc32(part)
+            layout.append((encoded, flags, size, self.content_length))
+            # With flag 0x8 the local CRC is zero; the sizes are kept so stored data can still be skipped
+            self._emit(struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, flags, 0, dos_time, dos_date,
+                                   crcs[i], size, size, len(encoded), 0) + encoded)
+            self._emit(part)
+            if not isinstance(part, bytes):
+                self._emit(Deferred(16, lambda i=i, size=size: self._descriptor(crcs, i, size)))
+
+        def central_directory() -> bytes:
+            return b"".join(
+                struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags, 0, dos_time, dos_date,
+                            crcs[i], size, size, len(encoded), 0, 0, 0, 0, 0, offset) + encoded
+                for i, (encoded, flags, size, offset) in enumerate(layout)
+            )
+
+        directory_offset = self.content_length
+        directory_size = sum(46 + len(encoded) for encoded, *_ in layout)
+        self._emit(Deferred(directory_size, central_directory))
+        self._emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(members), len(members),
+                               directory_size, directory_offset, 0))
+
+def create_export(fmt: str, pages: List[Dict[str, Any]], title: Optional[str] = None,
+                  created: Optional[float] = None, storage: Optional[StorageBackend] = None) -> Export:
+    """Plan a PDF or CBZ export of the given page entries"""
+    storage = storage or get_storage()
+    logger.debug(f"📚 create_export: Planning {fmt} export of {len(pages)} pages")
+    if fmt == "pdf":
+        return PdfExport(storage, pages, title)
+    if fmt == "cbz":
+        return CbzExport(storage, pages, title, created)
+    raise ValueError(f"Unknown export format '{fmt}', expected one of {sorted(EXPORT_FORMATS)}")
+
+def export_batch(fmt: str, job_ids: List[str], path: str, title: Optional[str] = None) -> int:
+    """Write one bundle holding every page of the given saved jobs; returns bytes written"""
+    storage = get_storage()
+    pages = []
+    for job_id in job_ids:
+        record = json.loads(storage.get(job_key(job_id)))
+        pages.extend(job_pages(record))
+
+    export = create_export(fmt, pages, title or f"{len(job_ids)} comics", storage=storage)
+    export.write_to(path)
+    logger.info(f"✅ export_batch: Wrote {len(pages)} pages from {len(job_ids)} jobs to {path} ({export.content_length} bytes)")
+    return export.content_length
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) < 4 or sys.argv[1] not in EXPORT_FORMATS:
+        print("Usage: python -m app.utils.export <pdf|cbz> <output> <job_id>...")
+        sys.exit(1)
+
+    written = export_batch(sys.argv[1], sys.argv[3:], sys.argv[2])
+    print(f"Wrote {written} bytes to {sys.argv[2]}")
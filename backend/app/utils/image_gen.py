@@ -4,14 +4,32 @@ Image generation utilities for the comic pipeline.
 
 import logging
 import base64
-from io import BytesIO
-from typing import Optional
+from typing import Dict, Optional
 from openai import AsyncOpenAI
-from PIL import Image, ImageDraw, ImageFont
 import os
 
+from ..config import settings
+from .layout import create_comic_layout
+
 logger = logging.getLogger(__name__)
 
+# Resolution/quality tiers: (model, size, quality). None defers to the
+# generator's model and IMAGE_WIDTH/IMAGE_HEIGHT/IMAGE_QUALITY.
+IMAGE_TIERS = {
+    "draft": ("dall-e-2", "256x256", "standard"),
+    "balanced": ("dall-e-2", "512x512", "standard"),
+    "standard": (None, None, None),
+    "hd": ("dall-e-3", "1024x1024", "hd"),
+}
+
+def image_tier_options(tier: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """generate_image() keyword arguments for a tier, defaulting to IMAGE_TIER"""
+    tier = tier or settings.image_tier
+    if tier not in IMAGE_TIERS:
+        raise ValueError(f"Unknown image tier '{tier}', expected one of {sorted(IMAGE_TIERS)}")
+    model, size, quality = IMAGE_TIERS[tier]
+    return {"model": model, "size": size, "quality": quality}
+
 class ImageGenerator:
     """Image generator using DALL-E"""
     
@@ -21,18 +39,21 @@ class ImageGenerator:
         self.model = model
         logger.debug(f"✅ ImageGenerator: Initialized successfully")
     
-    async def generate_image(self, prompt: str, size: str = "1024x1024") -> bytes:
-        """Generate image using DALL-E"""
+    async def generate_image(self, prompt: str, size: Optional[str] = None, model: Optional[str] = None,
+                             quality: Optional[str] = None) -> bytes:
+        """Generate image using DALL-E, optionally overriding the model, size and quality for this call"""
+        size = size or f"{settings.image_width}x{settings.image_height}"
+        quality = quality or settings.image_quality
         logger.debug(f"🎨 ImageGenerator.generate_image: Sending prompt (length={len(prompt)})")
         logger.debug(f"🎨 ImageGenerator.generate_image: Prompt preview: {prompt[:100]}...")
-        logger.debug(f"🎨 ImageGenerator.generate_image: Size: {size}")
+        logger.debug(f"🎨 ImageGenerator.generate_image: Size: {size}, model: {model or self.model}, quality: {quality}")
         
         try:
             response = await self.client.images.generate(
-                model=self.model,
+                model=model or self.model,
                 prompt=prompt,
                 size=size,
-                quality="standard",
+                quality=quality,
                 n=1
             )
             
@@ -55,82 +76,9 @@ class ImageGenerator:
             logger.error(f"❌ ImageGenerator.generate_image: DALL-E API error: {e}")
             raise Exception(f"Failed to generate image: {e}")
     
-    def create_comic_layout(self, images: list, title: str = "Comic Strip") -> bytes:
-        """Create a comic layout from multiple images"""
-        logger.debug(f"🎨 ImageGenerator.create_comic_layout: Creating layout with {len(images)} images, title: {title}")
-        
-        try:
-            # Calculate layout dimensions
-            num_panels = len(images)
-            if num_panels == 0:
-                logger.error("❌ ImageGenerator.create_comic_layout: No images provided")
-                raise Exception("No images provided")
-            
-            # Create a simple grid layout
-            cols = min(3, num_panels)
-            rows = (num_panels + cols - 1) // cols
-            
-            logger.debug(f"📐 ImageGenerator.create_comic_layout: Layout grid: {rows}x{cols}")
-            
-            # Standard panel size
-            panel_width = 300
-            panel_height = 300
-            margin = 20
-            
-            # Calculate total dimensions
-            total_width = cols * panel_width + (cols + 1) * margin
-            total_height = rows * panel_height + (rows + 1) * margin + 100  # Extra space for title
-            
-            logger.debug(f"📐 ImageGenerator.create_comic_layout: Canvas size: {total_width}x{total_height}")
-            
-            # Create canvas
-            canvas = Image.new('RGB', (total_width, total_height), 'white')
-            draw = ImageDraw.Draw(canvas)
-            
-            # Add title
-            try:
-                font = ImageFont.truetype("Arial.ttf", 24)
-                logger.debug("✅ ImageGenerator.create_comic_layout: Using Arial font")
-            except:
-                font = ImageFont.load_default()
-                logger.debug("🔄 ImageGenerator.create_comic_layout: Using default font")
-            
-            draw.text((margin, margin), title, fill='black', font=font)
-            logger.debug(f"📝 ImageGenerator.create_comic_layout: Added title: {title}")
-            
-            # Place images
-            for i, image_data in enumerate(images):
-                row = i // cols
-                col = i % cols
-                
-                x = margin + col * (panel_width + margin)
-                y = margin + 100 + row * (panel_height + margin)  # Start below title
-                
-                logger.debug(f"🖼️ ImageGenerator.create_comic_layout: Processing panel {i+1} at position ({x}, {y})")
-                
-                # Convert bytes to PIL Image
-                image = Image.open(BytesIO(image_data))
-                image = image.resize((panel_width, panel_height), Image.Resampling.LANCZOS)
-                
-                # Paste onto canvas
-                canvas.paste(image, (x, y))
-                
-                # Add panel number
-                draw.text((x + 5, y + 5), f"Panel {i+1}", fill='white', font=font)
-                
-                logger.debug(f"✅ ImageGenerator.create_comic_layout: Panel {i+1} placed successfully")
-            
-            # Convert back to bytes
-            output = BytesIO()
-            canvas.save(output, format='PNG')
-            final_data = output.getvalue()
-            
-            logger.debug(f"✅ ImageGenerator.create_comic_layout: Layout created successfully, size: {len(final_data)} bytes")
-            return final_data
-            
-        except Exception as e:
-            logger.error(f"❌ ImageGenerator.create_comic_layout: Layout creation error: {e}")
-            raise Exception(f"Failed to create comic layout: {e}")
+    def create_comic_layout(self, images: list, title: str = "Comic Strip", quality: str = "balanced") -> bytes:
+        """Create a comic layout from multiple images (see layout.create_comic_layout)"""
+        return create_comic_layout(images, title, quality)
 
 # Global image generator instance
 image_generator = None
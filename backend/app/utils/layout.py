@@ -0,0 +1,179 @@
+"""
+Pillow rendering for the comic pipeline.
+
+Everything here is a plain module-level function of bytes and primitives so
+it can run in a thread or a process pool (see render_pool.py) instead of on
+the event loop.
+"""
+
+import logging
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+from ..config import settings
+
+from .encoders import encode_image, format_for, sniff_media_type, transcode
+from .resources import get_font
+from .tiles import get_tile_cache
+
+logger = logging.getLogger(__name__)
+
+# Reasons the pipeline renders placeholders for; precomputed by warm_render_resources
+PLACEHOLDER_REASONS = ("Image generation failed", "Out of time")
+
+# Resample quality -> (final filter, reducing gap). A reducing gap lets
+# Image.reduce() shrink by an integer factor with a cheap box filter first,
+# stopping once the image is within gap x the target size; None disables it.
+RESAMPLE_QUALITY = {
+    "fast": (Image.Resampling.BILINEAR, 1.0),
+    "balanced": (Image.Resampling.LANCZOS, 1.5),
+    "best": (Image.Resampling.LANCZOS, None),
+}
+
+def load_scaled(image_data: bytes, size: tuple, quality: str = "balanced") -> Image.Image:
+    """Decode image bytes and scale them to size as cheaply as the quality level allows"""
+    if quality not in RESAMPLE_QUALITY:
+        raise ValueError(f"Unknown resample quality '{quality}', expected one of {sorted(RESAMPLE_QUALITY)}")
+    resample, reducing_gap = RESAMPLE_QUALITY[quality]
+
+    image = Image.open(BytesIO(image_data))
+    if reducing_gap is not None and image.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale, never below the target size
+        image.draft("RGB", (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if reducing_gap is not None:
+        factor = min(image.width // max(1, int(size[0] * reducing_gap)), image.height // max(1, int(size[1] * reducing_gap)))
+        if factor > 1:
+            image = image.reduce(factor)
+
+    return image.resize(size, resample)
+
+def scaled_tile(image_data: bytes, size: tuple, quality: str = "balanced") -> Image.Image:
+    """load_scaled through the tile cache; the returned tile is shared and must not be modified"""
+    return get_tile_cache().get_or_render(image_data, size, quality, lambda: load_scaled(image_data, size, quality))
+
+def render_derivative(image_data: bytes, fmt: str = None, width: int = None, quality: str = "balanced") -> bytes:
+    """Re-encode and/or downscale image bytes to width, keeping the aspect ratio; fmt None keeps the source format"""
+    fmt = fmt or format_for(sniff_media_type(image_data)) or "png"
+    if width:
+        # Only the header is parsed here; load_scaled does the real decode
+        source_width, source_height = Image.open(BytesIO(image_data)).size
+        if width < source_width:
+            height = max(1, round(source_height * width / source_width))
+            return encode_image(scaled_tile(image_data, (width, height), quality), fmt)
+    return transcode(image_data, fmt)
+
+def panel_slot_size(images: list) -> tuple:
+    """Layout slot for a set of panels: the smallest source size, scaled to fit LAYOUT_PANEL_MAX"""
+    # Image.open only parses the header, so this costs no decoding
+    width, height = min((Image.open(BytesIO(data)).size for data in images), key=lambda size: size[0] * size[1])
+    scale = min(1.0, settings.layout_panel_max / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def create_comic_layout(images: list, title: str = "Comic Strip", quality: str = "balanced", fmt: str = "png") -> bytes:
+    """Create a comic layout from multiple images, downscaling at the given resample quality"""
+    logger.debug(f"🎨 create_comic_layout: Creating layout with {len(images)} images, title: {title}, quality: {quality}")
+
+    try:
+        # Calculate layout dimensions
+        num_panels = len(images)
+        if num_panels == 0:
+            logger.error("❌ create_comic_layout: No images provided")
+            raise Exception("No images provided")
+
+        # Create a simple grid layout
+        cols = min(3, num_panels)
+        rows = (num_panels + cols - 1) // cols
+
+        logger.debug(f"📐 create_comic_layout: Layout grid: {rows}x{cols}")
+
+        # Slots follow the smallest source panel, capped at LAYOUT_PANEL_MAX, so
+        # draft-tier panels are never upscaled and large ones not oversized
+        panel_width, panel_height = panel_slot_size(images)
+        margin = 20
+
+        # Calculate total dimensions
+        total_width = cols * panel_width + (cols + 1) * margin
+        total_height = rows * panel_height + (rows + 1) * margin + 100  # Extra space for title
+
+        logger.debug(f"📐 create_comic_layout: Canvas size: {total_width}x{total_height}")
+
+        # Create canvas
+        canvas = Image.new('RGB', (total_width, total_height), 'white')
+        draw = ImageDraw.Draw(canvas)
+
+        # Add title
+        font = get_font(settings.title_font_size)
+        draw.text((margin, margin), title, fill='black', font=font)
+        logger.debug(f"📝 create_comic_layout: Added title: {title}")
+
+        # Place images
+        for i, image_data in enumerate(images):
+            row = i // cols
+            col = i % cols
+
+            x = margin + col * (panel_width + margin)
+            y = margin + 100 + row * (panel_height + margin)  # Start below title
+
+            logger.debug(f"🖼️ create_comic_layout: Processing panel {i+1} at position ({x}, {y})")
+
+            # Decode and downscale to the panel slot, or reuse the tile from an earlier layout
+            image = scaled_tile(image_data, (panel_width, panel_height), quality)
+
+            # Paste onto canvas
+            canvas.paste(image, (x, y))
+
+            # Add panel number
+            draw.text((x + 5, y + 5), f"Panel {i+1}", fill='white', font=font)
+
+            logger.debug(f"✅ create_comic_layout: Panel {i+1} placed successfully")
+
+        # Encode in the requested output format
+        final_data = encode_image(canvas, fmt)
+
+        logger.debug(f"✅ create_comic_layout: Layout created successfully, size: {len(final_data)} bytes")
+        return final_data
+
+    except Exception as e:
+        logger.error(f"❌ create_comic_layout: Layout creation error: {e}")
+        raise Exception(f"Failed to create comic layout: {e}")
+
+@lru_cache(maxsize=256)
+def render_panel_placeholder(panel_number: int, reason: str = "Image generation failed", fmt: str = "png") -> bytes:
+    """Render a gray placeholder for a panel that has no generated image (cached per panel, reason and format)"""
+    # Create a placeholder image
+    img = Image.new('RGB', (512, 512), color='lightgray')
+    draw = ImageDraw.Draw(img)
+    font = get_font(settings.placeholder_font_size)
+
+    draw.text((50, 200), f"Panel {panel_number}", fill='black', font=font)
+    draw.text((50, 250), reason, fill='red', font=font)
+
+    return encode_image(img, fmt)
+
+def render_fallback_layout(prompt: str, job_id: str, fmt: str = "png") -> bytes:
+    """Render a text-only comic page for when layout assembly fails"""
+    # Create a simple layout
+    total_width = 1024
+    total_height = 768
+    canvas = Image.new('RGB', (total_width, total_height), 'white')
+    draw = ImageDraw.Draw(canvas)
+    font = get_font(settings.title_font_size)
+
+    draw.text((50, 50), f"Comic: {prompt[:50]}", fill='black', font=font)
+    draw.text((50, 100), f"Job ID: {job_id}", fill='gray', font=font)
+    draw.text((50, 150), "Layout assembly failed - using fallback", fill='red', font=font)
+
+    return encode_image(canvas, fmt)
+
+def warm_render_resources():
+    """Resolve fonts and pre-render the placeholder for every panel index in this process"""
+    get_font(settings.title_font_size)
+    get_font(settings.placeholder_font_size)
+    for panel_number in range(1, settings.max_panels + 1):
+        for reason in PLACEHOLDER_REASONS:
+            render_panel_placeholder(panel_number, reason, settings.output_format)
+    logger.debug(f"✅ warm_render_resources: Cached fonts and {settings.max_panels * len(PLACEHOLDER_REASONS)} placeholders")
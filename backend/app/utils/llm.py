@@ -4,11 +4,41 @@ Simple LLM utilities for the comic pipeline.
 
 import json
 import logging
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Type
 from openai import AsyncOpenAI
+from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def strict_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """A model's JSON schema in the form strict structured outputs accept.
+    
+    Every object is closed (additionalProperties: false) and lists all of its
+    properties as required; optional fields stay nullable. Titles and defaults
+    are dropped, since strict mode does not support them.
+    """
+    schema = model.model_json_schema()
+    
+    def tighten(node: Dict[str, Any]):
+        node.pop("title", None)
+        node.pop("default", None)
+        if "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+            for child in node["properties"].values():
+                tighten(child)
+        if isinstance(node.get("items"), dict):
+            tighten(node["items"])
+        for child in node.get("anyOf", []):
+            tighten(child)
+        for child in node.get("$defs", {}).values():
+            tighten(child)
+    
+    tighten(schema)
+    return schema
+
 class LLMClient:
     """Simple LLM client for OpenAI calls"""
     
@@ -40,11 +70,23 @@ class LLMClient:
             logger.error(f"❌ LLMClient.generate: OpenAI API error: {e}")
             raise Exception(f"Failed to generate text: {e}")
     
-    async def generate_structured(self, prompt: str) -> Dict[str, Any]:
-        """Generate structured output using OpenAI"""
-        logger.debug(f"📝 LLMClient.generate_structured: Sending structured prompt (length={len(prompt)})")
+    async def generate_structured(self, prompt: str, schema: Optional[Type[BaseModel]] = None) -> Dict[str, Any]:
+        """Generate structured output using OpenAI.
+        
+        With a schema the response is decoded in strict structured-output mode,
+        so it always has the model's shape; without one it is any JSON object.
+        """
+        logger.debug(f"📝 LLMClient.generate_structured: Sending structured prompt (length={len(prompt)}, schema={schema.__name__ if schema else None})")
         logger.debug(f"📝 LLMClient.generate_structured: Prompt preview: {prompt[:100]}...")
         
+        response_format = {"type": "json_object"}
+        if schema is not None:
+            response_format = {
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": strict_json_schema(schema), "strict": True}
+            }
+        
+        content = None
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
@@ -54,10 +96,13 @@ class LLMClient:
                 ],
                 max_tokens=1000,
                 temperature=0.3,
-                response_format={"type": "json_object"}
+                response_format=response_format
             )
             
-            content = response.choices[0].message.content
+            message = response.choices[0].message
+            if getattr(message, "refusal", None):
+                raise Exception(f"Model refused: {message.refusal}")
+            content = message.content
             logger.debug(f"✅ LLMClient.generate_structured: Received JSON response (length={len(content)})")
             logger.debug(f"✅ LLMClient.generate_structured: JSON preview: {content[:100]}...")
             
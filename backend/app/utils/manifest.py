@@ -0,0 +1,358 @@
+"""
+Manifest index of saved comics.
+
+A small SQLite database next to the output directory records every saved
+job so listing comics is an indexed query instead of a directory walk.
+Run `python -m app.utils.manifest rebuild` to re-index the job records in
+storage and move job directories written before blob storage existed into
+it (each directory is removed once its job is stored and indexed).
+"""
+
+import sys
+import json
+import base64
+import shutil
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from ..config import settings
+from .storage import StorageBackend, get_storage, store_blob, job_key, job_pages, pages_version
+
+logger = logging.getLogger(__name__)
+
+# Per-job sidecar written by older releases into each job directory
+META_FILENAME = "meta.json"
+
+# Bump when the table layout changes; the index is disposable and rebuilt from storage
+SCHEMA_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comics (
+    job_id TEXT PRIMARY KEY,
+    record_key TEXT NOT NULL,
+    comic_key TEXT,
+    style TEXT,
+    prompt TEXT,
+    panels INTEGER NOT NULL DEFAULT 0,
+    pages_version TEXT,
+    created REAL NOT NULL,
+    last_accessed REAL
+);
+CREATE INDEX IF NOT EXISTS comics_created ON comics (created DESC, job_id DESC);
+CREATE INDEX IF NOT EXISTS comics_style_created ON comics (style, created DESC, job_id DESC);
+CREATE INDEX IF NOT EXISTS comics_lru ON comics (COALESCE(last_accessed, created));
+
+-- Every stored blob and who still needs it; owners are "job:<id>" or cache entries
+CREATE TABLE IF NOT EXISTS blobs (
+    blob_key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blob_refs (
+    owner TEXT NOT NULL,
+    blob_key TEXT NOT NULL,
+    PRIMARY KEY (owner, blob_key)
+);
+CREATE INDEX IF NOT EXISTS blob_refs_blob ON blob_refs (blob_key);
+
+-- Idempotency-Key of a /generate request, the request it was first used with and its response
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys (created);
+"""
+
+def encode_cursor(created: float, job_id: str) -> str:
+    """Opaque cursor pointing just past the given row"""
+    return base64.urlsafe_b64encode(json.dumps([created, job_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Inverse of encode_cursor; raises ValueError on garbage"""
+    try:
+        created, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(created), str(job_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+class ComicIndex:
+    """SQLite-backed index of saved comics with keyset pagination"""
+
+    def __init__(self, db_path: Path):
+        logger.debug(f"📇 ComicIndex: Opening index at {db_path}")
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections are not shareable across threads
+        self._local = threading.local()
+        with self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            # Version 0 with no tables is a database that was just created; version 0 with
+            # tables is an index from before the layout was versioned
+            fresh = version == 0 and conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+            if version != SCHEMA_VERSION and not fresh:
+                logger.warning("⚠️ ComicIndex: Index layout changed, recreating it; run the rebuild command to repopulate")
+                for table in ("comics", "blobs", "blob_refs", "idempotency_keys"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            if version != SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, record: Dict[str, Any]):
+        """Insert the entry for one saved job, or update it when the job is saved again"""
+        with self._connect() as conn:
+            # A re-save (finalize, repair) keeps the original created time and LRU position
+            conn.execute(
+                "INSERT INTO comics (job_id, record_key, comic_key, style, prompt, panels, pages_version, created) "
+                "VALUES (:job_id, :record_key, :comic_key, :style, :prompt, :panels, :pages_version, :created) "
+                "ON CONFLICT(job_id) DO UPDATE SET record_key = excluded.record_key, comic_key = excluded.comic_key, "
+                "style = excluded.style, prompt = excluded.prompt, panels = excluded.panels, "
+                "pages_version = excluded.pages_version",
+                {
+                    "comic_key": None, "style": None, "prompt": None, "panels": 0, "pages_version": None,
+                    **record
+                }
+            )
+        logger.debug(f"✅ ComicIndex.add: Indexed job {record['job_id']}")
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None, style: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of comics, newest first, and the cursor for the next page"""
+        clauses, params = ["comic_key IS NOT NULL"], []
+        if style:
+            clauses.append("style = ?")
+            params.append(style)
+        if since is not None:
+            clauses.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created < ?")
+            params.append(until)
+        if cursor:
+            created, job_id = decode_cursor(cursor)
+            clauses.append("(created, job_id) < (?, ?)")
+            params.extend([created, job_id])
+
+        query = (
+            f"SELECT job_id, record_key, comic_key, style, panels, pages_version, created FROM comics "
+            f"WHERE {' AND '.join(clauses)} ORDER BY created DESC, job_id DESC LIMIT ?"
+        )
+        # Fetch one extra row to learn whether another page exists
+        rows = self._connect().execute(query, [*params, limit + 1]).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["created"], items[-1]["job_id"]) if len(rows) > limit else None
+        return items, next_cursor
+
+    def add_refs(self, owner: str, entries: List[Dict[str, Any]]):
+        """Record that owner references each blob entry, keeping it out of GC"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO blobs (blob_key, size) VALUES (?, ?)",
+                [(entry["key"], entry["size"]) for entry in entries]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO blob_refs (owner, blob_key) VALUES (?, ?)",
+                [(owner, entry["key"]) for entry in entries]
+            )
+
+    def release_refs(self, owner: str) -> List[Tuple[str, int]]:
+        """Drop owner's references and return the (key, size) of blobs nobody references now"""
+        with self._connect() as conn:
+            keys = [row[0] for row in conn.execute("SELECT blob_key FROM blob_refs WHERE owner = ?", (owner,))]
+            conn.execute("DELETE FROM blob_refs WHERE owner = ?", (owner,))
+            orphans = []
+            for key in keys:
+                if conn.execute("SELECT 1 FROM blob_refs WHERE blob_key = ? LIMIT 1", (key,)).fetchone():
+                    continue
+                row = conn.execute("SELECT size FROM blobs WHERE blob_key = ?", (key,)).fetchone()
+                conn.execute("DELETE FROM blobs WHERE blob_key = ?", (key,))
+                orphans.append((key, row[0] if row else 0))
+        return orphans
+
+    def owned_blob(self, owner: str) -> Optional[Tuple[str, int]]:
+        """The (key, size) of the blob held by a single-blob owner such as a cached variant"""
+        row = self._connect().execute(
+            "SELECT r.blob_key, b.size FROM blob_refs r JOIN blobs b ON b.blob_key = r.blob_key WHERE r.owner = ? LIMIT 1",
+            (owner,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def release_variants(self, source_key: str) -> List[Tuple[str, int]]:
+        """Drop every cached variant of a blob and return the blobs nobody references now"""
+        prefix = f"variant:{source_key}:"
+        owners = [row[0] for row in self._connect().execute(
+            "SELECT DISTINCT owner FROM blob_refs WHERE owner >= ? AND owner < ?", (prefix, prefix + "\uffff")
+        )]
+        orphans = []
+        for owner in owners:
+            orphans.extend(self.release_refs(owner))
+        return orphans
+
+    def delete_unreferenced(self, blob_key: str, delete: Callable[[str], None]) -> bool:
+        """Call delete(blob_key) unless a job or cache entry references the blob; returns whether it did.
+
+        The check and the delete run under the database write lock, so add_refs cannot reference
+        the blob in between; a save that references it afterwards finds it gone and uploads it again.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM blob_refs WHERE blob_key = ? LIMIT 1", (blob_key,)).fetchone():
+                return False
+            delete(blob_key)
+        return True
+
+    def claim_idempotency_key(self, key: str, fingerprint: str, response: str, now: float,
+                              expires_before: float) -> Tuple[str, str]:
+        """Bind key to (fingerprint, response) unless it is already bound; returns the binding that holds"""
+        with self._connect() as conn:
+            # Expired keys are forgotten as new ones arrive, so the table needs no sweeper
+            conn.execute("DELETE FROM idempotency_keys WHERE created < ?", (expires_before,))
+            conn.execute(
+                "INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, response, created) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, response, now)
+            )
+            row = conn.execute("SELECT fingerprint, response FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+        return row["fingerprint"], row["response"]
+
+    def release_idempotency_key(self, key: str, response: str):
+        """Forget key, unless it has been bound to another response meanwhile"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND response = ?", (key, response))
+
+    def touch(self, job_id: str, when: float):
+        """Record that a job's artifacts were just served"""
+        with self._connect() as conn:
+            conn.execute("UPDATE comics SET last_accessed = ? WHERE job_id = ?", (when, job_id))
+
+    def total_bytes(self) -> int:
+        """Bytes held by every indexed blob"""
+        return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def eviction_candidates(self, limit: int, older_than: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Least-recently-accessed jobs first, optionally only those created before older_than"""
+        query = "SELECT job_id, record_key FROM comics"
+        params: List[Any] = []
+        if older_than is not None:
+            query += " WHERE created < ?"
+            params.append(older_than)
+        query += " ORDER BY COALESCE(last_accessed, created) ASC LIMIT ?"
+        return [dict(row) for row in self._connect().execute(query, [*params, limit])]
+
+    def remove_job(self, job_id: str) -> List[Tuple[str, int]]:
+        """Forget a job and return the blobs it was the last reference to"""
+        orphans = self.release_refs(f"job:{job_id}")
+        with self._connect() as conn:
+            conn.execute("DELETE FROM comics WHERE job_id = ?", (job_id,))
+        return orphans
+
+    def add_job_record(self, record: Dict[str, Any]):
+        """Index a job record as written by ArtifactWriter.save_comic"""
+        # Long-form records also hold one composed image per page, upgraded progressive ones their draft
+        pages = [page.get("image") for page in record.get("pages", [])]
+        draft = record.get("draft") or {}
+        entries = [
+            entry for entry in [record.get("comic"), *record.get("panels", []), *pages, draft.get("comic"), *draft.get("panels", [])]
+            if entry
+        ]
+        self.add_refs(f"job:{record['job_id']}", entries)
+        document = job_pages(record)
+        self.add({
+            "job_id": record["job_id"],
+            "record_key": record["key"],
+            "comic_key": record["comic"]["key"] if record.get("comic") else None,
+            "style": record.get("style"),
+            "prompt": record.get("prompt"),
+            "panels": sum(1 for entry in record.get("panels", []) if entry),
+            # Versions the export URLs /comics hands out without reading the record
+            "pages_version": pages_version(document) if document else None,
+            "created": record["created"]
+        })
+
+    def rebuild(self, storage: StorageBackend, legacy_dir: Optional[Path] = None) -> int:
+        """Re-index every job record in storage, importing legacy job directories first"""
+        if legacy_dir is not None:
+            self._import_legacy(storage, Path(legacy_dir))
+
+        logger.info("📇 ComicIndex.rebuild: Scanning job records in storage")
+        count = 0
+        for key in storage.list("jobs/"):
+            if key.endswith(".json"):
+                self.add_job_record(json.loads(storage.get(key)))
+                count += 1
+        logger.info(f"✅ ComicIndex.rebuild: Indexed {count} jobs")
+        return count
+
+    def _import_legacy(self, storage: StorageBackend, legacy_dir: Path):
+        """Move job_* directories (flat or sharded) into blob storage as job records"""
+        # Legacy layout: output/job_*; sharded layout: output/<xx>/job_*
+        for job_dir in [*legacy_dir.glob("job_*"), *legacy_dir.glob("*/job_*")]:
+            if not job_dir.is_dir():
+                continue
+            meta_file = job_dir / META_FILENAME
+            meta = json.loads(meta_file.read_text()) if meta_file.exists() else {}
+            job_id = meta.get("job_id", job_dir.name)
+            if storage.exists(job_key(job_id)):
+                # Imported before the directories were removed, or interrupted right after the record
+                self.add_job_record(json.loads(storage.get(job_key(job_id))))
+                self._remove_legacy(job_dir)
+                continue
+
+            panel_files = sorted(job_dir.glob("panel_*.png"), key=lambda path: int(path.stem.split("_")[1]))
+            comic_file = job_dir / "comic.png"
+            record = {
+                "job_id": job_id,
+                "created": meta.get("created", job_dir.stat().st_mtime),
+                "style": meta.get("style"),
+                "prompt": meta.get("prompt"),
+                "key": job_key(job_id),
+                "comic": store_blob(storage, comic_file.read_bytes()) if comic_file.exists() else None,
+                "panels": [store_blob(storage, path.read_bytes()) for path in panel_files]
+            }
+            storage.put(record["key"], json.dumps(record).encode(), "application/json")
+            self.add_job_record(record)
+            # Stored and indexed: the directory would only hold a second copy retention never reclaims
+            self._remove_legacy(job_dir)
+            logger.info(f"📦 ComicIndex._import_legacy: Imported {job_dir} as job {job_id}")
+
+    def _remove_legacy(self, job_dir: Path):
+        try:
+            shutil.rmtree(job_dir)
+        except OSError as e:
+            logger.warning(f"⚠️ ComicIndex._import_legacy: Imported {job_dir} but could not remove it: {e}")
+
+# Global comic index instance
+comic_index = None
+
+def get_comic_index() -> ComicIndex:
+    """Get or create the comic index instance"""
+    global comic_index
+
+    if comic_index is None:
+        logger.debug("🔧 get_comic_index: Creating new comic index instance")
+        comic_index = ComicIndex(Path(settings.comic_index_path))
+
+    return comic_index
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.utils.manifest rebuild")
+        sys.exit(1)
+
+    legacy_dir = Path(settings.comic_output_dir) if settings.storage_backend == "local" else None
+    indexed = get_comic_index().rebuild(get_storage(), legacy_dir)
+    print(f"Indexed {indexed} comics into {settings.comic_index_path}")
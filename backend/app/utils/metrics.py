@@ -0,0 +1,48 @@
+"""
+In-process metrics for the comic backend.
+
+Counters, gauges and simple timing summaries kept in memory and exposed
+as JSON on /metrics.
+"""
+
+import threading
+from typing import Dict, Any
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.summaries: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1):
+        """Add to a monotonically increasing counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record one observation (e.g. a duration) in a count/sum/max summary"""
+        with self._lock:
+            summary = self.summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of every metric, safe to serialize"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "summaries": {name: dict(summary) for name, summary in self.summaries.items()}
+            }
+
+# Global metrics registry
+metrics = Metrics()
@@ -0,0 +1,85 @@
+"""
+Compact, token-budgeted prompts for the LLM and image calls.
+
+Templates stay indented in the code for readability; build_prompt() strips
+that indentation and the blank lines, serializes state (scene dicts, panel
+lists) as compact JSON instead of a Python repr, estimates the result's
+tokens locally and keeps it within the stage's PROMPT_TOKEN_BUDGETS entry by
+shortening the fields the caller marks as trimmable. Prompt sizes and the
+tokens saved against the uncompacted rendering are reported on /metrics.
+"""
+
+import re
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Word pieces of up to four characters, single punctuation marks, and runs of
+# indentation or line breaks: close to BPE token counts for English prose and
+# JSON, and rarely an underestimate
+_TOKEN_PIECE = re.compile(r"\w{1,4}|[^\w\s]|\n\s*| {2,}")
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate for budgeting, without a tokenizer round-trip"""
+    return len(_TOKEN_PIECE.findall(text))
+
+def _prune(value: Any) -> Any:
+    """Drop None and empty values, which cost tokens and say nothing"""
+    if isinstance(value, dict):
+        pruned = {key: _prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [_prune(item) for item in value if item not in (None, "", [], {})]
+    return value
+
+def compact(value: Any) -> str:
+    """A value as prompt text: strings as they are, anything else as compact JSON"""
+    if isinstance(value, str):
+        return value
+    return json.dumps(_prune(value), separators=(",", ":"), ensure_ascii=False)
+
+def squeeze(template: str) -> str:
+    """Template without indentation or blank lines"""
+    return "\n".join(line.strip() for line in template.strip().splitlines() if line.strip())
+
+def stage_budget(stage: str) -> Optional[int]:
+    """Input token budget of a stage from PROMPT_TOKEN_BUDGETS, or None when it has none"""
+    for pair in settings.prompt_token_budgets.split(","):
+        name, _, budget = pair.partition(":")
+        if name.strip() == stage and budget.strip():
+            return int(budget)
+    return None
+
+def build_prompt(stage: str, template: str, trim: Iterable[str] = (), **fields: Any) -> str:
+    """Fill a template compactly, shortening the trim fields (in order) until it fits the stage budget.
+
+    Raises if the prompt is still over budget once every trimmable field is empty.
+    """
+    values: Dict[str, str] = {name: compact(value) for name, value in fields.items()}
+    text = squeeze(template).format(**values)
+    tokens = estimate_tokens(text)
+
+    budget = stage_budget(stage)
+    if budget and tokens > budget:
+        for name in trim:
+            # Cut by the overshoot (a token is at least one character), re-checking after each cut
+            while tokens > budget and values[name]:
+                keep = max(0, len(values[name]) - (tokens - budget) * 2)
+                values[name] = values[name][:keep].rstrip() + "…" if keep else ""
+                text = squeeze(template).format(**values)
+                tokens = estimate_tokens(text)
+        if tokens > budget:
+            raise Exception(f"{stage} prompt needs ~{tokens} tokens, over its budget of {budget}")
+        logger.warning(f"✂️ build_prompt: Trimmed {stage} prompt to ~{tokens} tokens to fit its budget of {budget}")
+        metrics.inc(f"prompt_trims_total.{stage}")
+
+    saved = estimate_tokens(template.format(**{name: str(value) for name, value in fields.items()})) - tokens
+    metrics.observe(f"prompt_tokens.{stage}", tokens)
+    metrics.inc(f"prompt_tokens_saved.{stage}", max(saved, 0))
+    logger.debug(f"✂️ build_prompt: {stage} prompt is ~{tokens} tokens, {saved} fewer than uncompacted")
+    return text
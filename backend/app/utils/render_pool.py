@@ -0,0 +1,131 @@
+"""
+Executor for CPU-bound Pillow work.
+
+Layout, placeholder and other image rendering runs here instead of on the
+event loop. RENDER_EXECUTOR picks a thread pool (cheap to start, shares
+memory) or a process pool (sidesteps the GIL for heavy jobs); pool size
+and queue wait time are reported in metrics.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+from ..config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Metrics recorded by render code while it runs in a pool worker
+_worker = threading.local()
+
+def _emit(kind: str, name: str, value: float):
+    buffer = getattr(_worker, "observations", None)
+    if buffer is None:
+        getattr(metrics, kind)(name, value)
+    else:
+        # Shipped back with the result and recorded by the submitting process
+        buffer.append((kind, name, value))
+
+def observe(name: str, value: float):
+    """Record a summary observation from render code, even inside a worker process"""
+    _emit("observe", name, value)
+
+def inc(name: str, value: float = 1):
+    """Add to a counter from render code, even inside a worker process"""
+    _emit("inc", name, value)
+
+def _timed_call(fn: Callable, *args) -> Tuple[float, float, Any, List[Tuple[str, str, float]]]:
+    """Run fn in the worker and report wall-clock start and end so waits can be measured"""
+    _worker.observations = []
+    try:
+        started = time.time()
+        result = fn(*args)
+        return started, time.time(), result, _worker.observations
+    finally:
+        _worker.observations = None
+
+class RenderPool:
+    """Thread or process pool that runs render functions off the event loop"""
+
+    def __init__(self, kind: str = "thread", workers: int = 2):
+        logger.debug(f"🖌️ RenderPool: Initializing {kind} pool with {workers} workers")
+        # Imported here: layout itself depends on this module for worker metrics
+        from .layout import warm_render_resources
+
+        if kind == "process":
+            # Every worker process resolves fonts and pre-renders placeholders once
+            self.executor: Executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_render_resources)
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+            # Threads share the caches; warm them once in the background
+            self.executor.submit(warm_render_resources)
+        else:
+            raise ValueError(f"Unknown render executor '{kind}', expected 'thread' or 'process'")
+        self.kind = kind
+        self.workers = workers
+        self.pending = 0
+        self._lock = threading.Lock()
+        metrics.set("render_pool_size", workers)
+
+    def _track_pending(self, delta: int):
+        with self._lock:
+            self.pending += delta
+            metrics.set("render_pool_pending", self.pending)
+
+    def _record(self, fn: Callable, submitted: float, outcome: Tuple) -> Any:
+        started, finished, result, observations = outcome
+        metrics.observe("render_queue_wait_seconds", max(0.0, started - submitted))
+        metrics.observe(f"render_seconds.{fn.__name__}", finished - started)
+        for kind, name, value in observations:
+            getattr(metrics, kind)(name, value)
+        return result
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) in the pool; fn and args must be picklable for process pools"""
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self._track_pending(1)
+        try:
+            outcome = await loop.run_in_executor(self.executor, _timed_call, fn, *args)
+        finally:
+            self._track_pending(-1)
+        return self._record(fn, submitted, outcome)
+
+    def run_sync(self, fn: Callable, *args) -> Any:
+        """Blocking run() for callers already on a worker thread (e.g. sync endpoints)"""
+        submitted = time.time()
+        self._track_pending(1)
+        try:
+            outcome = self.executor.submit(_timed_call, fn, *args).result()
+        finally:
+            self._track_pending(-1)
+        return self._record(fn, submitted, outcome)
+
+    def shutdown(self):
+        logger.debug("🛑 RenderPool: Shutting down")
+        self.executor.shutdown(wait=True)
+
+# Global render pool instance
+render_pool = None
+
+def get_render_pool() -> RenderPool:
+    """Get or create the render pool instance"""
+    global render_pool
+
+    if render_pool is None:
+        logger.debug("🔧 get_render_pool: Creating new render pool instance")
+        render_pool = RenderPool(kind=settings.render_executor, workers=settings.render_workers)
+
+    return render_pool
+
+def shutdown_render_pool():
+    """Stop the render pool if it was ever started"""
+    global render_pool
+
+    if render_pool is not None:
+        render_pool.shutdown()
+        render_pool = None
@@ -0,0 +1,32 @@
+"""
+Render resources shared by every layout and placeholder.
+
+Fonts are resolved once per size from FONT_PATHS instead of probing the
+filesystem (and raising) on every render. Each render process keeps its
+own copy.
+"""
+
+import logging
+from functools import lru_cache
+from PIL import ImageFont
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> ImageFont.ImageFont:
+    """First font in FONT_PATHS that loads at this size, else Pillow's default"""
+    for path in settings.font_paths.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        try:
+            font = ImageFont.truetype(path, size)
+            logger.debug(f"✅ get_font: Using {path} at {size}px")
+            return font
+        except OSError:
+            continue
+
+    logger.warning(f"⚠️ get_font: None of FONT_PATHS could be loaded, using Pillow's default font at {size}px")
+    return ImageFont.load_default(size)
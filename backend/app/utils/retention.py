@@ -0,0 +1,129 @@
+"""
+Retention and garbage collection for stored comics.
+
+A background service evicts jobs past the age limit and, while storage is
+over its byte quota, the least-recently-accessed jobs. Blobs are deleted
+only once no job or cache entry references them. Work is done in small
+batches on a thread pool so the event loop never stalls.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from ..config import settings
+from .manifest import ComicIndex
+from .metrics import metrics
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+class RetentionService:
+    """Evicts old and least-recently-used jobs to stay within quota and age limits"""
+
+    def __init__(self, index: ComicIndex, storage: StorageBackend, quota_bytes: int = 0,
+                 max_age_seconds: float = 0, batch_size: int = 50, interval: float = 300,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        logger.debug(f"🧹 RetentionService: quota={quota_bytes} bytes, max_age={max_age_seconds}s, batch={batch_size}")
+        self.index = index
+        self.storage = storage
+        self.quota_bytes = quota_bytes
+        self.max_age_seconds = max_age_seconds
+        self.batch_size = batch_size
+        self.interval = interval
+        # Lets the API drop in-memory state for jobs whose artifacts are gone
+        self.on_evict = on_evict
+
+    def _evict_batch(self, older_than: Optional[float], target_bytes: Optional[int] = None) -> Tuple[List[str], int]:
+        """Evict one batch of jobs, stopping early once stored bytes drop to target_bytes"""
+        candidates = self.index.eviction_candidates(self.batch_size, older_than=older_than)
+        stored = self.index.total_bytes() if target_bytes is not None else 0
+        evicted, reclaimed = [], 0
+        for job in candidates:
+            if target_bytes is not None and stored - reclaimed <= target_bytes:
+                break
+            evicted.append(job["job_id"])
+            for blob_key, size in self.index.remove_job(job["job_id"]):
+                # A job saved meanwhile may have picked the same blob up again
+                if not self.index.delete_unreferenced(blob_key, self.storage.delete):
+                    continue
+                reclaimed += size
+                # Cached variants (other encodings, thumbnails) go with their source
+                for variant_key, variant_size in self.index.release_variants(blob_key):
+                    if self.index.delete_unreferenced(variant_key, self.storage.delete):
+                        reclaimed += variant_size
+            self.storage.delete(job["record_key"])
+        return evicted, reclaimed
+
+    async def _run_batch(self, older_than: Optional[float], target_bytes: Optional[int] = None) -> Tuple[int, int]:
+        loop = asyncio.get_running_loop()
+        evicted, reclaimed = await loop.run_in_executor(None, self._evict_batch, older_than, target_bytes)
+        if self.on_evict:
+            for job_id in evicted:
+                self.on_evict(job_id)
+        return len(evicted), reclaimed
+
+    async def sweep(self) -> int:
+        """Run eviction until within limits; returns bytes reclaimed"""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        evicted_total, reclaimed_total = 0, 0
+
+        # Age limit first: everything created before the cutoff goes
+        if self.max_age_seconds:
+            cutoff = time.time() - self.max_age_seconds
+            while True:
+                evicted, reclaimed = await self._run_batch(cutoff)
+                evicted_total += evicted
+                reclaimed_total += reclaimed
+                if evicted < self.batch_size:
+                    break
+
+        # Then least-recently-accessed jobs while storage is over quota
+        if self.quota_bytes:
+            while await loop.run_in_executor(None, self.index.total_bytes) > self.quota_bytes:
+                evicted, reclaimed = await self._run_batch(None, self.quota_bytes)
+                evicted_total += evicted
+                reclaimed_total += reclaimed
+                if evicted == 0:
+                    break
+
+        total_bytes = await loop.run_in_executor(None, self.index.total_bytes)
+        metrics.set("retention_stored_bytes", total_bytes)
+        metrics.inc("retention_evicted_jobs_total", evicted_total)
+        metrics.inc("retention_reclaimed_bytes_total", reclaimed_total)
+        metrics.observe("retention_sweep_seconds", time.monotonic() - start)
+        if evicted_total:
+            logger.info(f"🧹 RetentionService.sweep: Evicted {evicted_total} jobs, reclaimed {reclaimed_total} bytes, {total_bytes} bytes stored")
+        return reclaimed_total
+
+    async def run(self):
+        """Sweep forever at the configured interval"""
+        logger.info(f"🧹 RetentionService: Running every {self.interval}s")
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ RetentionService: Sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+def create_retention_service(index: ComicIndex, storage: StorageBackend,
+                             on_evict: Optional[Callable[[str], None]] = None) -> Optional[RetentionService]:
+    """Build the retention service from settings, or None when no limit is configured"""
+    quota_bytes = int(settings.retention_quota_gb * 1024 ** 3)
+    max_age_seconds = settings.retention_max_age_days * 86400
+    if not quota_bytes and not max_age_seconds:
+        logger.debug("🧹 create_retention_service: No quota or age limit configured, retention disabled")
+        return None
+
+    return RetentionService(
+        index, storage,
+        quota_bytes=quota_bytes,
+        max_age_seconds=max_age_seconds,
+        batch_size=settings.retention_batch_size,
+        interval=settings.retention_interval_seconds,
+        on_evict=on_evict
+    )
@@ -0,0 +1,152 @@
+"""
+Scratch store for image bytes in flight.
+
+Pipeline state and in-memory job results carry small BlobHandles (content
+hash, size, media type) instead of the bytes themselves. The bytes live
+here once per process: in memory up to SCRATCH_MEMORY_MB, spilled to files
+under SCRATCH_DIR beyond that, and they are materialized only where they
+are used (layout, persistence, serving before the write-behind lands).
+Entries are reference-counted by content hash and dropped on release().
+Code on the event loop uses aput()/aget(), which hash and touch spill
+files on a worker thread.
+"""
+
+import os
+import asyncio
+import shutil
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from ..config import settings
+from .encoders import sniff_media_type
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class BlobHandle:
+    """Reference to bytes held in the scratch store"""
+    digest: str
+    size: int
+    media_type: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+class ScratchStore:
+    """Reference-counted, content-addressed bytes kept in memory up to a budget, then on disk"""
+
+    def __init__(self, root: Path, memory_bytes: int):
+        # Per process, and wiped on start: nothing here outlives the jobs that made it
+        self.root = Path(root) / str(os.getpid())
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.memory_bytes = memory_bytes
+        self._memory: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+        self.bytes_in_memory = 0
+        self.bytes_on_disk = 0
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def _report(self):
+        metrics.set("scratch_bytes_memory", self.bytes_in_memory)
+        metrics.set("scratch_bytes_disk", self.bytes_on_disk)
+
+    def put(self, data: bytes, media_type: Optional[str] = None) -> BlobHandle:
+        """Hold data and return a handle to it; identical content is stored once"""
+        digest = hashlib.sha256(data).hexdigest()
+        handle = BlobHandle(digest, len(data), media_type or sniff_media_type(data))
+        with self._lock:
+            if digest in self._refs:
+                self._refs[digest] += 1
+                return handle
+            self._refs[digest] = 1
+            self._sizes[digest] = len(data)
+            if self.bytes_in_memory + len(data) <= self.memory_bytes:
+                self._memory[digest] = data
+                self.bytes_in_memory += len(data)
+                self._report()
+                return handle
+            self.bytes_on_disk += len(data)
+            self._report()
+
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        logger.debug(f"💽 ScratchStore.put: Spilled {len(data)} bytes to {path}")
+        return handle
+
+    def get(self, handle: BlobHandle) -> bytes:
+        """Materialize the bytes behind a handle"""
+        with self._lock:
+            data = self._memory.get(handle.digest)
+        if data is not None:
+            return data
+        return self._path(handle.digest).read_bytes()
+
+    async def aput(self, data: bytes, media_type: Optional[str] = None) -> BlobHandle:
+        """put() without blocking the event loop on hashing or a spill write"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.put, data, media_type)
+
+    async def aget(self, handle: BlobHandle) -> bytes:
+        """get() without blocking the event loop on reading a spilled file"""
+        with self._lock:
+            data = self._memory.get(handle.digest)
+        if data is not None:
+            return data
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._path(handle.digest).read_bytes)
+
+    def local_path(self, handle: BlobHandle) -> Optional[str]:
+        """File holding the bytes if they were spilled, so they can be streamed"""
+        with self._lock:
+            if handle.digest in self._memory:
+                return None
+        path = self._path(handle.digest)
+        return str(path) if path.exists() else None
+
+    def release(self, handles: Iterable[Optional[BlobHandle]]):
+        """Drop one reference per handle, freeing content nobody holds any more"""
+        spilled = []
+        with self._lock:
+            for handle in handles:
+                if handle is None or handle.digest not in self._refs:
+                    continue
+                self._refs[handle.digest] -= 1
+                if self._refs[handle.digest] > 0:
+                    continue
+                del self._refs[handle.digest]
+                size = self._sizes.pop(handle.digest)
+                if self._memory.pop(handle.digest, None) is not None:
+                    self.bytes_in_memory -= size
+                else:
+                    self.bytes_on_disk -= size
+                    spilled.append(handle.digest)
+            self._report()
+
+        for digest in spilled:
+            self._path(digest).unlink(missing_ok=True)
+
+# Global scratch store instance
+scratch_store = None
+
+def get_scratch_store() -> ScratchStore:
+    """Get or create the scratch store instance"""
+    global scratch_store
+
+    if scratch_store is None:
+        logger.debug(f"🔧 get_scratch_store: Creating scratch store in {settings.scratch_dir}")
+        scratch_store = ScratchStore(Path(settings.scratch_dir), memory_bytes=int(settings.scratch_memory_mb * 1024 * 1024))
+
+    return scratch_store
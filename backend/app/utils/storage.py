@@ -0,0 +1,342 @@
+"""
+Artifact storage for the comic pipeline.
+
+Artifacts are stored as content-addressed blobs behind a small storage
+interface with a local-filesystem and an S3-compatible implementation, so
+identical panels and placeholders are stored once and API replicas do not
+need a shared volume. Writes happen on a thread pool so large comics never
+block the event loop.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator
+
+from ..config import settings
+from .encoders import sniff_media_type
+
+logger = logging.getLogger(__name__)
+
+# fsync policies: "none" trusts the page cache, "file" fsyncs each file before
+# the rename, "full" also fsyncs the directory so the rename itself is durable
+FSYNC_POLICIES = ("none", "file", "full")
+
+def blob_key(digest: str) -> str:
+    """Storage key for a content-addressed blob"""
+    return f"blobs/{digest[:2]}/{digest[2:4]}/{digest}"
+
+def job_key(job_id: str) -> str:
+    """Storage key for a job's record of which blobs make up its comic"""
+    return f"jobs/{job_id[:2]}/{job_id}.json"
+
+def job_pages(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Blob entries of a job record in reading order: the assembled comic, then each panel"""
+    if record.get("pages"):
+        # Long-form: the composed pages are the document, in order, as far as they got
+        return [page["image"] for page in record["pages"] if page.get("image")]
+    return [entry for entry in [record.get("comic"), *record.get("panels", [])] if entry]
+
+def pages_version(pages: List[Dict[str, Any]]) -> str:
+    """Version of a document made of pages, for the ?v= of its export URLs in every format"""
+    return hashlib.sha256(",".join(entry["etag"] for entry in pages).encode()).hexdigest()[:16]
+
+class StorageBackend(ABC):
+    """Interface every artifact store implements"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, media_type: str = "application/octet-stream"):
+        """Store data under key, replacing any object already there"""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """The whole object stored under key"""
+
+    def stream(self, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield the object in chunks so large artifacts never sit in memory whole"""
+        yield self.get(key)
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether an object is stored under key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove the object under key, if there is one"""
+
+    @abstractmethod
+    def list(self, prefix: str) -> Iterator[str]:
+        """Yield every key under prefix"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the object if it can be served with sendfile, else None"""
+        return None
+
+    def url_for(self, key: str) -> Optional[str]:
+        """Time-limited URL clients can download the object from directly, else None"""
+        return None
+
+class LocalStorage(StorageBackend):
+    """Stores objects as files under a root directory with atomic renames"""
+
+    def __init__(self, root: Path, fsync_policy: str = "file"):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}', expected one of {FSYNC_POLICIES}")
+        logger.debug(f"💾 LocalStorage: Initializing at {root}, fsync={fsync_policy}")
+        self.root = Path(root)
+        self.fsync_policy = fsync_policy
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes, media_type: str = "application/octet-stream"):
+        """Write bytes to a temp file next to the target and rename it into place"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if self.fsync_policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        if self.fsync_policy == "full":
+            dir_fd = os.open(path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def stream(self, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def list(self, prefix: str) -> Iterator[str]:
+        base = self._path(prefix)
+        if not base.exists():
+            return
+        for path in base.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path.relative_to(self.root).as_posix()
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return str(path) if path.exists() else None
+
+class S3Storage(StorageBackend):
+    """Stores objects in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key_id: Optional[str] = None,
+                 secret_access_key: Optional[str] = None, presign_expiry: int = 3600,
+                 multipart_threshold: int = 8 * 1024 * 1024):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            raise Exception("S3 storage requires boto3 (pip install 'prompt-to-comic-backend[s3]')")
+
+        logger.debug(f"🪣 S3Storage: Initializing bucket={bucket}, prefix={prefix}, endpoint={endpoint_url}")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key
+        )
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.presign_expiry = presign_expiry
+        # Objects above the threshold go up as parallel multipart uploads
+        self.transfer_config = TransferConfig(multipart_threshold=multipart_threshold, multipart_chunksize=multipart_threshold)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, data: bytes, media_type: str = "application/octet-stream"):
+        self.client.upload_fileobj(
+            BytesIO(data), self.bucket, self._key(key),
+            ExtraArgs={"ContentType": media_type},
+            Config=self.transfer_config
+        )
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def stream(self, key: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][strip:]
+
+    def url_for(self, key: str) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=self.presign_expiry
+        )
+
+def describe_blob(data: bytes, media_type: str = "image/png") -> Dict[str, Any]:
+    """Entry for bytes stored under their content hash"""
+    digest = hashlib.sha256(data).hexdigest()
+    return {"key": blob_key(digest), "etag": f'"{digest}"', "size": len(data), "media_type": media_type}
+
+def store_blob(storage: StorageBackend, data: bytes, media_type: str = "image/png") -> Dict[str, Any]:
+    """Store bytes under their content hash, skipping the write if already present"""
+    entry = describe_blob(data, media_type)
+    # Content addressing: identical panels and placeholders are stored once
+    if storage.exists(entry["key"]):
+        logger.debug(f"♻️ store_blob: Blob {entry['key']} already stored, skipping upload")
+    else:
+        storage.put(entry["key"], data, media_type)
+    return entry
+
+class ArtifactWriter:
+    """Write-behind writer that persists artifacts as deduplicated blobs off the event loop"""
+
+    def __init__(self, storage: StorageBackend, max_workers: int = 4, index=None):
+        logger.debug(f"💾 ArtifactWriter: Initializing with {type(storage).__name__} and {max_workers} workers")
+        self.storage = storage
+        # Optional ComicIndex; blobs are referenced there before upload so GC never reaps them mid-save
+        self.index = index
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifact-writer")
+
+    def _reference_blobs(self, owner: str, blobs: List[bytes]):
+        self.index.add_refs(owner, [describe_blob(data) for data in blobs])
+
+    async def put_blob(self, data: bytes, media_type: str = "image/png") -> Dict[str, Any]:
+        """Store one blob on the writer pool and return its entry"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, store_blob, self.storage, data, media_type)
+
+    async def save_blobs(self, owner: str, blobs: List[bytes]) -> List[Dict[str, Any]]:
+        """Reference blobs under owner, then store them concurrently; entries come back in order"""
+        if self.index is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._reference_blobs, owner, blobs)
+        return list(await asyncio.gather(*(self.put_blob(data, sniff_media_type(data)) for data in blobs)))
+
+    async def put_record(self, record: Dict[str, Any]):
+        """Write (or overwrite) a job record under its key"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor, self.storage.put, record["key"], json.dumps(record).encode(), "application/json"
+        )
+
+    async def save_comic(self, job_id: str, image_data: List[Optional[bytes]], comic_data: Optional[bytes],
+                         metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Persist a job's panels and comic, returning the job record that was written.
+
+        Panels a cancelled job never produced are None and stay None in the record's panel list.
+        """
+        logger.debug(f"💾 ArtifactWriter.save_comic: Saving {len(image_data)} panels for job {job_id}")
+        present = [data for data in image_data if data is not None]
+        saved = iter(await self.save_blobs(f"job:{job_id}", [*present, comic_data] if comic_data else present))
+        panels = [next(saved) if data is not None else None for data in image_data]
+
+        record = {
+            "job_id": job_id,
+            "created": time.time(),
+            **(metadata or {}),
+            "key": job_key(job_id),
+            "comic": next(saved) if comic_data else None,
+            "panels": panels
+        }
+        await self.put_record(record)
+        logger.debug(f"✅ ArtifactWriter.save_comic: Saved {len(present)} panels for job {job_id}")
+        return record
+
+    def shutdown(self):
+        """Wait for queued writes to finish and stop the pool"""
+        logger.debug("🛑 ArtifactWriter: Shutting down")
+        self.executor.shutdown(wait=True)
+
+# Global storage and artifact writer instances
+storage = None
+artifact_writer = None
+
+def get_storage() -> StorageBackend:
+    """Get or create the configured storage backend"""
+    global storage
+
+    if storage is None:
+        logger.debug(f"🔧 get_storage: Creating {settings.storage_backend} storage backend")
+        if settings.storage_backend == "s3":
+            if not settings.s3_bucket:
+                raise Exception("S3_BUCKET is required when STORAGE_BACKEND=s3")
+            storage = S3Storage(
+                bucket=settings.s3_bucket,
+                prefix=settings.s3_prefix,
+                endpoint_url=settings.s3_endpoint_url,
+                region=settings.s3_region,
+                access_key_id=settings.s3_access_key_id,
+                secret_access_key=settings.s3_secret_access_key,
+                presign_expiry=settings.s3_presign_expiry,
+                multipart_threshold=settings.s3_multipart_threshold_mb * 1024 * 1024
+            )
+        elif settings.storage_backend == "local":
+            storage = LocalStorage(Path(settings.comic_output_dir), fsync_policy=settings.artifact_fsync)
+        else:
+            raise Exception(f"Unknown storage backend '{settings.storage_backend}'")
+
+    return storage
+
+def get_artifact_writer() -> ArtifactWriter:
+    """Get or create the artifact writer instance"""
+    global artifact_writer
+
+    if artifact_writer is None:
+        logger.debug("🔧 get_artifact_writer: Creating new artifact writer instance")
+        from .manifest import get_comic_index
+        artifact_writer = ArtifactWriter(
+            get_storage(),
+            max_workers=settings.artifact_writer_threads,
+            index=get_comic_index()
+        )
+
+    return artifact_writer
@@ -0,0 +1,74 @@
+"""
+Cache of decoded, resized panel tiles.
+
+Decoding and downscaling a panel costs far more than pasting it, so tiles
+are kept in a process-wide LRU keyed by source content hash, target size
+and resample quality. Re-laying out the same panels (new grid, title or
+format) and rendering derivatives only composite cached tiles and encode.
+Each render worker process has its own cache.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Tuple
+from PIL import Image
+
+from ..config import settings
+from .render_pool import inc
+
+class TileCache:
+    """Thread-safe LRU of resized tiles, bounded by decoded pixel bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._tiles: "OrderedDict[Tuple, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tile_bytes(tile: Image.Image) -> int:
+        return tile.width * tile.height * len(tile.getbands())
+
+    def get_or_render(self, image_data: bytes, size: Tuple[int, int], quality: str,
+                      render: Callable[[], Image.Image]) -> Image.Image:
+        """Cached tile for image_data at size, rendering it on a miss; callers must not mutate it"""
+        key = (hashlib.sha256(image_data).hexdigest(), tuple(size), quality)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                inc("tile_cache_hits_total")
+                return tile
+
+        inc("tile_cache_misses_total")
+        tile = render()
+        tile_bytes = self._tile_bytes(tile)
+        if tile_bytes > self.max_bytes:
+            return tile
+
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self.bytes += tile_bytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self.bytes -= self._tile_bytes(evicted)
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.bytes = 0
+
+# Global tile cache instance (one per process)
+tile_cache = None
+
+def get_tile_cache() -> TileCache:
+    """Get or create the tile cache instance"""
+    global tile_cache
+
+    if tile_cache is None:
+        tile_cache = TileCache(max_bytes=int(settings.tile_cache_mb * 1024 * 1024))
+
+    return tile_cache
@@ -0,0 +1,63 @@
+"""
+Cached variants of stored artifacts.
+
+A variant is a stored artifact re-encoded (e.g. as WebP for a client that
+accepts it) and/or downscaled to a thumbnail width on first request, then
+kept as an ordinary content-addressed blob. The index records it under the
+owner "variant:<source key>:<spec>", which is how later requests find it
+and how retention drops it with its source.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from ..config import settings
+from .encoders import format_for, media_type_for
+from .layout import render_derivative
+from .manifest import get_comic_index
+from .metrics import metrics
+from .render_pool import get_render_pool
+from .storage import describe_blob, get_storage, store_blob
+
+logger = logging.getLogger(__name__)
+
+def allowed_widths() -> List[int]:
+    """Thumbnail widths clients may ask for; a fixed set keeps the cache bounded"""
+    widths = {int(width) for width in settings.thumbnail_widths.split(",") if width.strip()}
+    widths.add(settings.gallery_thumbnail_width)
+    return sorted(widths)
+
+def variant_owner(source_key: str, spec: str) -> str:
+    return f"variant:{source_key}:{spec}"
+
+def variant_spec(fmt: str, width: Optional[int] = None) -> str:
+    return f"w{width}.{fmt}" if width else fmt
+
+def _entry_for(key: str, size: int, media_type: str) -> Dict[str, Any]:
+    # Blob keys end in the content hash, which is also the ETag
+    return {"key": key, "etag": f'"{key.rsplit("/", 1)[-1]}"', "size": size, "media_type": media_type}
+
+def get_variant(source: Dict[str, Any], fmt: Optional[str] = None, width: Optional[int] = None) -> Dict[str, Any]:
+    """Entry for the source blob encoded as fmt and scaled to width, rendering and storing it on first use"""
+    fmt = fmt or format_for(source.get("media_type", "image/png")) or "png"
+    media_type = media_type_for(fmt)
+    if not width and source.get("media_type") == media_type:
+        return source
+
+    index = get_comic_index()
+    owner = variant_owner(source["key"], variant_spec(fmt, width))
+    cached = index.owned_blob(owner)
+    if cached:
+        metrics.inc("variant_cache_hits_total")
+        return _entry_for(*cached, media_type)
+
+    logger.debug(f"🖌️ get_variant: Rendering {variant_spec(fmt, width)} variant of {source['key']}")
+    metrics.inc("variant_cache_misses_total")
+    storage = get_storage()
+    data = get_render_pool().run_sync(render_derivative, storage.get(source["key"]), fmt, width, settings.layout_resample)
+
+    entry = describe_blob(data, media_type)
+    # Reference before upload so a concurrent retention sweep cannot reap it
+    index.add_refs(owner, [entry])
+    store_blob(storage, data, media_type)
+    return entry
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for create_comic_layout resample quality levels.
+
+Renders layouts from synthetic 1024x1024 PNG and JPEG panels for each
+panel count and quality level, and reports median latency plus PSNR
+against the "best" (full-decode LANCZOS) output. "cold" clears the tile
+cache before every run; "warm" re-lays out panels whose tiles are cached.
+"""
+
+import sys
+import math
+import time
+import random
+import argparse
+import statistics
+from io import BytesIO
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from app.utils.layout import create_comic_layout, RESAMPLE_QUALITY
+from app.utils.tiles import get_tile_cache
+
+def make_panel(seed: int, size: int, fmt: str) -> bytes:
+    """Synthetic panel with gradients, shapes and fine detail so filters differ"""
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size), rng.randrange(size)
+        r = rng.randrange(10, size // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)), outline="black", width=3)
+    for x in range(0, size, 7):
+        draw.line((x, 0, x, size // 8), fill="black")
+
+    output = BytesIO()
+    image.save(output, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return output.getvalue()
+
+def psnr(a: bytes, b: bytes) -> float:
+    """Peak signal-to-noise ratio between two encoded images of the same size"""
+    diff = ImageChops.difference(Image.open(BytesIO(a)).convert("RGB"), Image.open(BytesIO(b)).convert("RGB"))
+    mse = statistics.mean(value ** 2 for value in ImageStat.Stat(diff).rms)
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--panels", type=int, nargs="+", default=[1, 2, 3, 4, 6])
+    parser.add_argument("--size", type=int, default=1024, help="source panel edge in pixels")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--formats", nargs="+", default=["PNG", "JPEG"])
+    args = parser.parse_args()
+
+    print(f"{'format':<6} {'panels':>6} {'quality':<9} {'cold ms':>8} {'speedup':>8} {'warm ms':>8} {'PSNR dB':>8}")
+    for fmt in args.formats:
+        sources = [make_panel(seed, args.size, fmt) for seed in range(max(args.panels))]
+        for count in args.panels:
+            images = sources[:count]
+            results = {}
+            for quality in RESAMPLE_QUALITY:
+                cold, warm = [], []
+                for run in range(args.repeat):
+                    get_tile_cache().clear()
+                    start = time.perf_counter()
+                    output = create_comic_layout(images, "Benchmark", quality)
+                    cold.append(time.perf_counter() - start)
+                    # Same panels, new title: only compositing and encoding remain
+                    start = time.perf_counter()
+                    create_comic_layout(images, f"Benchmark {run}", quality)
+                    warm.append(time.perf_counter() - start)
+                results[quality] = (statistics.median(cold), statistics.median(warm), output)
+
+            baseline, _, reference = results["best"]
+            for quality, (elapsed, warm_elapsed, output) in results.items():
+                print(f"{fmt:<6} {count:>6} {quality:<9} {elapsed * 1000:>8.1f} {baseline / elapsed:>7.2f}x "
+                      f"{warm_elapsed * 1000:>8.1f} {psnr(reference, output):>8.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
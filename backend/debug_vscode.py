@@ -9,7 +9,6 @@ import asyncio
 import logging
 import os
 import sys
-import base64
 from pathlib import Path
 from datetime import datetime
 
@@ -17,6 +16,7 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent / "app"))
 
 from app.comic_pipeline import create_comic_pipeline
+from app.utils.scratch import get_scratch_store
 
 def setup_logging():
     """Set up logging for debugging"""
@@ -43,9 +43,9 @@ def save_images_to_disk(result, output_dir: str):
         panel_images = result["image_data"]
         logger.info(f"💾 Saving {len(panel_images)} panel images to {output_path}")
         
-        for i, img_b64 in enumerate(panel_images):
+        for i, handle in enumerate(panel_images):
             try:
-                img_data = base64.b64decode(img_b64)
+                img_data = get_scratch_store().get(handle)
                 panel_filename = output_path / f"panel_{i+1}_{timestamp}.png"
                 
                 with open(panel_filename, 'wb') as f:
@@ -57,9 +57,9 @@ def save_images_to_disk(result, output_dir: str):
                 logger.error(f"❌ Failed to save panel {i+1}: {e}")
     
     # Save final comic
-    if "comic_data" in result:
+    if result.get("comic_data"):
         try:
-            comic_data = base64.b64decode(result["comic_data"])
+            comic_data = get_scratch_store().get(result["comic_data"])
             comic_filename = output_path / f"comic_{timestamp}.png"
             
             with open(comic_filename, 'wb') as f:
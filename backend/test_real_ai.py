@@ -57,9 +57,9 @@ async def test_real_ai_pipeline():
             images = result["image_data"]
             print(f"🖼️  Generated {len(images)} images")
         
-        if "comic_data" in result:
+        if result.get("comic_data"):
             comic_data = result["comic_data"]
-            print(f"🎨 Final comic assembled ({len(comic_data)} base64 characters)")
+            print(f"🎨 Final comic assembled ({comic_data.size} bytes, {comic_data.media_type})")
         
         if "messages" in result:
             print("📨 Pipeline messages:")
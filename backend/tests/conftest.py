@@ -0,0 +1,110 @@
+"""
+Shared fixtures for the backend tests.
+
+Settings are read when app.config is first imported, so the storage, index
+and scratch locations are pointed at a throwaway directory before any app
+module loads.
+"""
+
+import os
+import re
+import asyncio
+import tempfile
+from io import BytesIO
+from typing import Dict, Set
+
+_root = tempfile.mkdtemp(prefix="prompt-to-comic-tests-")
+os.environ.update({
+    "STORAGE_BACKEND": "local",
+    "STORAGE_DIR": _root,
+    "COMIC_OUTPUT_DIR": os.path.join(_root, "comics"),
+    "COMIC_INDEX_PATH": os.path.join(_root, "index.sqlite3"),
+    "SCRATCH_DIR": os.path.join(_root, "scratch"),
+})
+
+import httpx
+import pytest
+import pytest_asyncio
+from PIL import Image
+
+from app.config import settings
+from app.utils.manifest import ComicIndex
+from app.utils.storage import LocalStorage
+
+def image_bytes(fmt: str = "PNG", color: str = "red", size=(64, 48)) -> bytes:
+    """A small solid-colour image encoded as fmt"""
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+@pytest.fixture
+def index(tmp_path) -> ComicIndex:
+    return ComicIndex(tmp_path / "index.sqlite3")
+
+@pytest.fixture
+def storage(tmp_path) -> LocalStorage:
+    return LocalStorage(tmp_path / "blobs", fsync_policy="none")
+
+@pytest_asyncio.fixture
+async def client():
+    """HTTP client talking to the app in-process"""
+    from app.main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+def panel_spec(number: int) -> dict:
+    return {
+        "panel_number": number, "setting": "A rooftop", "characters": ["Hero"], "action": "Looks out",
+        "camera_angle": "wide", "mood": "calm", "description": f"Panel {number} of the story"
+    }
+
+class StubLLM:
+    """Plans every comic as the same scene and numbered panels, in the shape each schema asks for"""
+
+    scene = {"characters": ["Hero"], "setting": "A rooftop", "actions": ["Looks out"], "mood": "calm", "style_notes": ""}
+
+    async def generate_structured(self, prompt: str, schema=None) -> dict:
+        panels = [panel_spec(number) for number in range(1, settings.max_panels + 1)]
+        return {
+            "SceneComponents": self.scene,
+            "PanelPlan": {"panels": panels},
+            "ComicPlan": {"scene": self.scene, "panels": panels},
+        }[schema.__name__]
+
+class StubImages:
+    """Image provider whose panels can be made to fail or hang, by panel number"""
+
+    def __init__(self):
+        self.failing: Set[int] = set()
+        self.delays: Dict[int, float] = {}
+        self.rendered: Set[int] = set()
+
+    @staticmethod
+    def image(number: int) -> bytes:
+        """What the provider draws for a panel"""
+        return image_bytes(color=("red", "green", "blue", "yellow", "purple", "orange")[number - 1])
+
+    async def generate_image(self, prompt: str, **options) -> bytes:
+        number = int(re.search(r"Panel (\d+) of the story", prompt).group(1))
+        await asyncio.sleep(self.delays.get(number, 0))
+        if number in self.failing:
+            raise Exception(f"Panel {number} failed")
+        self.rendered.add(number)
+        return self.image(number)
+
+@pytest_asyncio.fixture
+async def providers(monkeypatch):
+    """Stub LLM and image providers for jobs run through the API; yields the image stub"""
+    import app.main
+    import app.comic_pipeline
+    images = StubImages()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(app.comic_pipeline, "get_llm_client", lambda api_key=None: StubLLM())
+    monkeypatch.setattr(app.comic_pipeline, "get_image_generator", lambda api_key=None: images)
+    # Job slots belong to the event loop they were first waited on in, and every test has its own
+    monkeypatch.setattr(app.main, "job_slots", asyncio.Semaphore(settings.max_concurrent_jobs))
+    yield images
+    background = [*app.main.repair_tasks.values(), *app.main.finalize_tasks.values()]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, *app.main.persist_tasks, return_exceptions=True)
@@ -0,0 +1,61 @@
+"""Artifact responses: ETag revalidation, byte ranges and which URLs may be cached forever"""
+
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.config import settings
+from app.main import get_artifact_writer, get_comic_index
+from app.utils.storage import describe_blob
+
+from conftest import image_bytes
+
+@pytest.fixture
+def comic():
+    return image_bytes("PNG", "blue", (120, 80))
+
+@pytest_asyncio.fixture
+async def job_id(comic):
+    job_id = str(uuid.uuid4())
+    record = await get_artifact_writer().save_comic(job_id, [image_bytes()], comic, {"style": "Manga", "prompt": "A test comic"})
+    get_comic_index().add_job_record(record)
+    return job_id
+
+@pytest.mark.asyncio
+async def test_matching_etag_is_not_modified(client, job_id):
+    first = await client.get(f"/comic/{job_id}")
+
+    again = await client.get(f"/comic/{job_id}", headers={"If-None-Match": first.headers["etag"]})
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+
+@pytest.mark.asyncio
+async def test_range_request_gets_partial_content(client, job_id, comic):
+    response = await client.get(f"/comic/{job_id}", headers={"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.content == comic[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(comic)}"
+
+@pytest.mark.asyncio
+async def test_only_versioned_urls_are_immutable(client, job_id, comic):
+    version = describe_blob(comic)["etag"].strip('"')[:16]
+    listed = next(item for item in (await client.get("/comics", params={"limit": 200})).json()["comics"]
+                  if item["job_id"] == job_id)
+    assert listed["comic_url"] == f"/comic/{job_id}?v={version}"
+
+    for url in (listed["comic_url"], listed["thumbnail_url"], listed["export_urls"]["pdf"], listed["export_urls"]["cbz"]):
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == settings.artifact_cache_control
+
+    # Repair and finalize replace what a bare URL (or one with a stale version) serves
+    for url in (f"/comic/{job_id}", f"/comic/{job_id}?v=0123456789abcdef", f"/panel/{job_id}/1", f"/comic/{job_id}.pdf"):
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert "immutable" not in response.headers["cache-control"]
+        assert response.headers["cache-control"] == "no-cache"
+        assert response.headers["etag"]
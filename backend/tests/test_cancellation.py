@@ -0,0 +1,98 @@
+"""Cancelling a running job, by DELETE or by the client going away"""
+
+import json
+import uuid
+import asyncio
+
+import pytest
+
+import app.main
+from app.config import settings
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting"
+        await asyncio.sleep(0.01)
+
+async def panel_two_done(text: str) -> str:
+    """ID of the job started for text, once its second panel is drawn and held"""
+    find = lambda: next((job_id for job_id, job in app.main.jobs.items() if job.get("request", {}).get("text") == text), None)
+    await wait_until(find)
+    job_id = find()
+    await wait_until(lambda: app.main.get_job_progress(job_id).get("panels_done") == 1)
+    return job_id
+
+async def assert_slot_released():
+    # Only one slot exists, so this only succeeds once the cancelled job gave it back
+    await asyncio.wait_for(app.main.job_slots.acquire(), timeout=1)
+    app.main.job_slots.release()
+
+@pytest.fixture
+def one_slot(monkeypatch, providers):
+    monkeypatch.setattr(app.main, "job_slots", asyncio.Semaphore(1))
+    # Panels 1 and 3 are still drawing when the job is cancelled; panel 2 is done
+    providers.delays.update({1: 30, 3: 30})
+    return providers
+
+@pytest.mark.asyncio
+async def test_delete_keeps_finished_panels_and_releases_slot(client, one_slot):
+    text = f"A cat on a roof {uuid.uuid4()}"
+    generate = asyncio.create_task(client.post("/generate", json={"text": text, "style": "Manga", "panels": 3}))
+    job_id = await panel_two_done(text)
+
+    response = await client.delete(f"/jobs/{job_id}")
+
+    assert response.status_code == 200
+    assert response.json()["state"] == "cancelled"
+    assert (await generate).status_code == 200
+    await assert_slot_released()
+
+    status = (await client.get(f"/status/{job_id}")).json()
+    assert status["state"] == "cancelled"
+    assert status["panel_urls"][0] is None and status["panel_urls"][2] is None
+    panel = await client.get(status["panel_urls"][1])
+    assert panel.status_code == 200 and panel.content == one_slot.image(2)
+    assert (await client.get(f"/panel/{job_id}/1")).status_code == 404
+    assert (await client.get(f"/panel/{job_id}/3")).status_code == 404
+
+    # The kept panel is stored where a cancelled panel number still has its place
+    await app.main.wait_for_persist(job_id)
+    stored = app.main.jobs[job_id]["artifacts"]["panels"]
+    assert stored[0] is None and stored[1] is not None and stored[2] is None
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_job(monkeypatch, one_slot):
+    monkeypatch.setattr(settings, "disconnect_poll_interval", 0.01)
+    text = f"A dog in the rain {uuid.uuid4()}"
+    body = json.dumps({"text": text, "style": "Manga", "panels": 3}).encode()
+    disconnected = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if not sent and not disconnected.is_set():
+            sent.append(body)
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/generate", "raw_path": b"/generate", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("test", 80)
+    }
+    request = asyncio.create_task(app.main.app(scope, receive, send))
+    job_id = await panel_two_done(text)
+
+    disconnected.set()
+    await asyncio.wait_for(request, timeout=5)
+
+    assert app.main.jobs[job_id]["state"] == "cancelled"
+    assert job_id not in app.main.running_jobs
+    await assert_slot_released()
+    images = app.main.jobs[job_id]["result"]["image_data"]
+    assert images[0] is None and images[1] is not None and images[2] is None
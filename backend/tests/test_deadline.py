@@ -0,0 +1,41 @@
+"""A job that runs out of time returns within its deadline, with placeholders queued for repair"""
+
+import time
+
+import pytest
+
+import app.main
+from app.config import settings
+
+@pytest.mark.asyncio
+async def test_slow_panel_is_left_as_placeholder_within_deadline(client, providers, monkeypatch):
+    # Reserves scaled down to a short deadline: planning gets half a second, images
+    # whatever is left before the layout's two seconds
+    monkeypatch.setattr(settings, "planning_reserve_seconds", 2.5)
+    monkeypatch.setattr(settings, "image_reserve_seconds", 2.5)
+    monkeypatch.setattr(settings, "layout_reserve_seconds", 2)
+    # Repair would otherwise start before the status is read
+    monkeypatch.setattr(settings, "repair_backoff_seconds", 60)
+    providers.delays[2] = 30
+    deadline_seconds = 3
+
+    start = time.monotonic()
+    response = await client.post("/generate", json={"text": "A race", "style": "Manga", "panels": 3,
+                                                    "deadline_seconds": deadline_seconds})
+    elapsed = time.monotonic() - start
+
+    assert response.status_code == 200
+    assert elapsed < deadline_seconds
+    job_id = response.json()["job_id"]
+    status = (await client.get(f"/status/{job_id}")).json()
+    assert status["state"] == "done"
+    assert status["complete"] is False
+    assert status["repair"] == {"state": "pending", "panels": [2], "attempts": 0}
+
+    # Every panel has an image and the comic is assembled; panel 2 is a placeholder
+    assert len(status["panel_urls"]) == 3 and status["comic_url"]
+    for number in (1, 3):
+        assert (await client.get(f"/panel/{job_id}/{number}")).content == providers.image(number)
+    placeholder = await client.get(f"/panel/{job_id}/2")
+    assert placeholder.status_code == 200 and placeholder.content != providers.image(2)
+    assert app.main.jobs[job_id]["result"]["failed_panels"] == [2]
@@ -0,0 +1,70 @@
+"""PDF and CBZ exports parse back and match their declared Content-Length"""
+
+import re
+import uuid
+import zipfile
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.main import get_artifact_writer, get_comic_index
+
+from conftest import image_bytes
+
+async def save_job(comic: bytes, panels: list) -> str:
+    job_id = str(uuid.uuid4())
+    record = await get_artifact_writer().save_comic(job_id, panels, comic, {"style": "Manga", "prompt": "A test comic"})
+    get_comic_index().add_job_record(record)
+    return job_id
+
+@pytest.mark.asyncio
+async def test_cbz_round_trip(client):
+    comic, panel = image_bytes("PNG", "blue", (120, 80)), image_bytes("JPEG", "red")
+    job_id = await save_job(comic, [panel])
+
+    response = await client.get(f"/comic/{job_id}.cbz")
+
+    assert response.status_code == 200
+    assert int(response.headers["content-length"]) == len(response.content)
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["ComicInfo.xml", "001.png", "002.jpg"]
+    assert archive.read("001.png") == comic
+    assert archive.read("002.jpg") == panel
+    assert b"<PageCount>2</PageCount>" in archive.read("ComicInfo.xml")
+
+@pytest.mark.asyncio
+async def test_pdf_round_trip(client):
+    comic, panel = image_bytes("PNG", "blue", (120, 80)), image_bytes("JPEG", "red", (64, 48))
+    job_id = await save_job(comic, [panel])
+
+    response = await client.get(f"/comic/{job_id}.pdf")
+
+    assert response.status_code == 200
+    body = response.content
+    assert int(response.headers["content-length"]) == len(body)
+    assert body.startswith(b"%PDF-1.4") and body.endswith(b"%%EOF\n")
+
+    # startxref points at the table, and every entry in it at its object
+    xref_offset = int(re.search(rb"startxref\n(\d+)\n%%EOF", body).group(1))
+    assert body[xref_offset:].startswith(b"xref\n")
+    count = int(re.match(rb"xref\n0 (\d+)\n", body[xref_offset:]).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", body[xref_offset:])
+    assert len(entries) == count - 1
+    for number, offset in enumerate(entries, 1):
+        assert body[int(offset):].startswith(f"{number} 0 obj\n".encode())
+
+    # One page per image, sized to it; JPEG pages are embedded byte for byte
+    sizes = [tuple(map(int, size)) for size in re.findall(rb"/MediaBox \[0 0 (\d+) (\d+)\]", body)]
+    assert sizes == [(120, 80), (64, 48)]
+    assert panel in body
+    streams = re.findall(rb"/Filter /DCTDecode /Length (\d+) >>\nstream\n", body)
+    start = body.index(b"stream\n", body.index(b"/DCTDecode")) + len(b"stream\n")
+    cover = Image.open(BytesIO(body[start:start + int(streams[0])]))
+    assert cover.format == "JPEG" and cover.size == (120, 80)
+
+@pytest.mark.asyncio
+async def test_export_needs_stored_pages(client):
+    response = await client.get(f"/comic/{uuid.uuid4()}.pdf")
+    assert response.status_code == 404
@@ -0,0 +1,61 @@
+"""Concurrent /generate requests sharing an Idempotency-Key"""
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.main
+
+def test_concurrent_claims_bind_one_request(index):
+    # Eight retries racing on one key, each with a different request body
+    now = time.time()
+    claim = lambda n: index.claim_idempotency_key("key", f"body-{n}", f"response-{n}", now, now - 3600)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        bindings = list(pool.map(claim, range(8)))
+
+    # Every claim sees the same winner, and the loser's own response is never stored
+    assert len(set(bindings)) == 1
+    fingerprint, response = bindings[0]
+    assert response == fingerprint.replace("body", "response")
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stand-in comic pipeline that finishes without planning or rendering"""
+    runs = []
+
+    async def fake_pipeline(state):
+        runs.append(state["job_id"])
+        await asyncio.sleep(0.05)
+        return {**state, "image_data": [], "comic_data": None, "failed_panels": [],
+                "panel_descriptions": None, "messages": [], "message": "Comic generated successfully"}
+
+    monkeypatch.setattr(app.main, "comic_pipeline", fake_pipeline)
+    return runs
+
+def generate(client, key, text):
+    body = {"text": text, "style": "Manga", "panels": 2}
+    return client.post("/generate", json=body, headers={"Idempotency-Key": key})
+
+@pytest.mark.asyncio
+async def test_concurrent_different_bodies_conflict(client, pipeline):
+    key = str(uuid.uuid4())
+
+    first, second = await asyncio.gather(generate(client, key, "A cat"), generate(client, key, "A dog"))
+
+    assert sorted([first.status_code, second.status_code]) == [200, 422]
+    winner = first if first.status_code == 200 else second
+    assert pipeline == [winner.json()["job_id"]]
+    assert (await client.get(f"/status/{winner.json()['job_id']}")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_concurrent_same_body_runs_once(client, pipeline):
+    key = str(uuid.uuid4())
+
+    first, second = await asyncio.gather(generate(client, key, "A cat"), generate(client, key, "A cat"))
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["job_id"] == second.json()["job_id"]
+    assert pipeline == [first.json()["job_id"]]
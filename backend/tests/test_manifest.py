@@ -0,0 +1,38 @@
+"""Keyset pagination of the comic index"""
+
+def add_comics(index, created_times):
+    for i, created in enumerate(created_times):
+        index.add({
+            "job_id": f"job-{i:02d}",
+            "record_key": f"jobs/job-{i:02d}.json",
+            "comic_key": f"blobs/comic-{i:02d}",
+            "style": "Manga" if i % 2 else "Noir",
+            "created": created
+        })
+
+def all_pages(index, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        items, cursor = index.list(limit=limit, cursor=cursor, **filters)
+        pages.append([item["job_id"] for item in items])
+        if cursor is None:
+            return pages
+
+def test_cursor_pages_through_equal_timestamps(index):
+    # Seven comics saved in the same instant, around two with distinct times
+    add_comics(index, [100.0] + [200.0] * 7 + [300.0])
+
+    pages = all_pages(index, limit=3)
+
+    listed = [job_id for page in pages for job_id in page]
+    assert [len(page) for page in pages] == [3, 3, 3]
+    assert len(set(listed)) == 9
+    # Newest first, ties broken by job ID so every row has one place in the order
+    assert listed == ["job-08", *[f"job-{i:02d}" for i in range(7, 0, -1)], "job-00"]
+
+def test_cursor_pagination_with_style_filter(index):
+    add_comics(index, [200.0] * 6)
+
+    pages = all_pages(index, limit=2, style="Manga")
+
+    assert pages == [["job-05", "job-03"], ["job-01"]]
@@ -0,0 +1,43 @@
+"""Background repair of panels that failed and were left as placeholders"""
+
+import asyncio
+
+import pytest
+
+import app.main
+from app.config import settings
+
+async def stored_status(client, job_id: str) -> dict:
+    """Status once the latest write-behind has landed, so its URLs are versioned"""
+    await app.main.wait_for_persist(job_id)
+    return (await client.get(f"/status/{job_id}")).json()
+
+@pytest.mark.asyncio
+async def test_repair_replaces_failed_panels(client, providers, monkeypatch):
+    # The first retry comes at least 0.25s after the job, once the failed state has been read
+    monkeypatch.setattr(settings, "repair_backoff_seconds", 0.5)
+    providers.failing.add(2)
+
+    job_id = (await client.post("/generate", json={"text": "A storm", "style": "Manga", "panels": 3})).json()["job_id"]
+    before = await stored_status(client, job_id)
+    assert before["complete"] is False
+    assert before["repair"]["panels"] == [2]
+    assert (await client.get(before["panel_urls"][1])).content != providers.image(2)
+
+    providers.failing.clear()
+    for _ in range(500):
+        if app.main.jobs[job_id].get("repair", {}).get("state") == "done":
+            break
+        await asyncio.sleep(0.01)
+    after = await stored_status(client, job_id)
+
+    assert after["complete"] is True
+    assert after["repair"] == {"state": "done", "panels": [], "attempts": 1}
+    assert after["message"] == "Repaired 1 of 1 failed panels"
+    # The repaired panel and the re-composed comic get new versions; the others keep theirs
+    assert after["panel_urls"][1] != before["panel_urls"][1]
+    assert after["comic_url"] != before["comic_url"]
+    assert after["panel_urls"][0] == before["panel_urls"][0]
+    assert after["panel_urls"][2] == before["panel_urls"][2]
+    assert (await client.get(after["panel_urls"][1])).content == providers.image(2)
+    assert "?v=" in after["panel_urls"][1] and "?v=" in after["comic_url"]
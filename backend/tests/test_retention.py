@@ -0,0 +1,49 @@
+"""Retention sweeps delete evicted jobs' blobs, but never one that is still referenced"""
+
+import json
+import time
+
+import pytest
+
+from app.utils.retention import RetentionService
+from app.utils.storage import describe_blob, job_key, store_blob
+
+from conftest import image_bytes
+
+def save_job(index, storage, job_id, blobs, created):
+    entries = [store_blob(storage, data) for data in blobs]
+    record = {"job_id": job_id, "key": job_key(job_id), "created": created, "comic": entries[-1], "panels": entries[:-1]}
+    storage.put(record["key"], json.dumps(record).encode(), "application/json")
+    index.add_job_record(record)
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_blobs_other_jobs_reference(index, storage):
+    shared, old_only, new_only = image_bytes(color="red"), image_bytes(color="green"), image_bytes(color="blue")
+    save_job(index, storage, "old", [shared, old_only], created=time.time() - 7200)
+    save_job(index, storage, "new", [shared, new_only], created=time.time())
+
+    await RetentionService(index, storage, max_age_seconds=3600).sweep()
+
+    assert not storage.exists(job_key("old"))
+    assert not storage.exists(describe_blob(old_only)["key"])
+    assert storage.exists(describe_blob(shared)["key"])
+    assert storage.exists(describe_blob(new_only)["key"])
+    assert [item["job_id"] for item in index.list()[0]] == ["new"]
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_a_blob_referenced_while_it_runs(index, storage):
+    panel = image_bytes(color="red")
+    save_job(index, storage, "old", [panel, image_bytes(color="green")], created=time.time() - 7200)
+    remove_job = index.remove_job
+
+    def remove_job_then_save(job_id):
+        # A new job picks the panel up right after the old job's references are dropped
+        orphans = remove_job(job_id)
+        index.add_refs("job:new", [describe_blob(panel)])
+        return orphans
+
+    index.remove_job = remove_job_then_save
+    await RetentionService(index, storage, max_age_seconds=3600).sweep()
+
+    assert storage.exists(describe_blob(panel)["key"])
+    assert index.delete_unreferenced(describe_blob(panel)["key"], storage.delete) is False
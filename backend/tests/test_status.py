@@ -0,0 +1,47 @@
+"""GET /status: inline payloads only on request, and 304s for an unchanged status"""
+
+import base64
+
+import pytest
+import pytest_asyncio
+
+@pytest_asyncio.fixture
+async def job_id(client, providers):
+    response = await client.post("/generate", json={"text": "A picnic", "style": "Manga", "panels": 2})
+    return response.json()["job_id"]
+
+@pytest.mark.asyncio
+async def test_inline_payloads_only_when_asked_for(client, providers, job_id):
+    status = (await client.get(f"/status/{job_id}")).json()
+    assert status["state"] == "done"
+    assert len(status["panel_urls"]) == 2 and status["comic_url"]
+    assert "comic_data" not in status and "panel_images" not in status
+
+    panels = (await client.get(f"/status/{job_id}", params={"fields": "panel_images"})).json()
+    assert "comic_data" not in panels
+    assert [base64.b64decode(image) for image in panels["panel_images"]] == [providers.image(1), providers.image(2)]
+
+    both = (await client.get(f"/status/{job_id}", params={"fields": "comic_data,panel_images"})).json()
+    comic = await client.get(f"/comic/{job_id}")
+    assert base64.b64decode(both["comic_data"]) == comic.content
+    assert len(both["panel_images"]) == 2
+
+@pytest.mark.asyncio
+async def test_unknown_field_is_rejected(client, job_id):
+    response = await client.get(f"/status/{job_id}", params={"fields": "comic_data,secrets"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_unchanged_status_is_not_modified(client, job_id):
+    first = await client.get(f"/status/{job_id}")
+    assert first.headers["cache-control"] == "no-cache"
+
+    again = await client.get(f"/status/{job_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    # A different selection of fields is a different body, so the old ETag no longer matches
+    filtered = await client.get(f"/status/{job_id}", params={"fields": "comic_data"},
+                                headers={"If-None-Match": first.headers["etag"]})
+    assert filtered.status_code == 200
+    assert filtered.headers["etag"] != first.headers["etag"]
@@ -1,5 +1,6 @@
 # Dummy API functions for frontend scaffolding
 
+import uuid
 import requests
 import base64
 from typing import Dict, Any
@@ -7,25 +8,45 @@ from typing import Dict, Any
 # Backend API configuration
 BACKEND_URL = "http://backend:8000"
 
+# /generate waits for the comic; retries reuse the Idempotency-Key so they get the same job
+GENERATE_TIMEOUT = 120
+GENERATE_ATTEMPTS = 3
+
+# Last status body and ETag per job, so unchanged polls come back as 304s
+_status_cache: Dict[str, tuple] = {}
+
 def generate_comic(prompt: str, style: str, panels: int) -> Dict[str, Any]:
     """Send comic generation request to backend"""
-    try:
-        response = requests.post(f"{BACKEND_URL}/generate", json={
-            "text": prompt,
-            "style": style,
-            "panels": panels
-        })
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Failed to connect to backend: {str(e)}"}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for attempt in range(GENERATE_ATTEMPTS):
+        try:
+            response = requests.post(f"{BACKEND_URL}/generate", json={
+                "text": prompt,
+                "style": style,
+                "panels": panels
+            }, headers=headers, timeout=GENERATE_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if attempt == GENERATE_ATTEMPTS - 1:
+                return {"error": f"Failed to connect to backend: {str(e)}"}
+        except requests.exceptions.RequestException as e:
+            return {"error": f"Failed to connect to backend: {str(e)}"}
 
 def check_job_status(job_id: str) -> Dict[str, Any]:
     """Check the status of a comic generation job"""
     try:
-        response = requests.get(f"{BACKEND_URL}/status/{job_id}")
+        headers = {}
+        if job_id in _status_cache:
+            headers["If-None-Match"] = _status_cache[job_id][0]
+        response = requests.get(f"{BACKEND_URL}/status/{job_id}", headers=headers)
+        if response.status_code == 304:
+            return _status_cache[job_id][1]
         response.raise_for_status()
-        return response.json()
+        status = response.json()
+        if "ETag" in response.headers:
+            _status_cache[job_id] = (response.headers["ETag"], status)
+        return status
     except requests.exceptions.RequestException as e:
         return {"error": f"Failed to check status: {str(e)}"}
 
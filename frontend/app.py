@@ -1,7 +1,6 @@
 import streamlit as st
 from api import generate_comic, check_job_status, get_comic_image, get_panel_image
 import time
-import base64
 from io import BytesIO
 
 st.set_page_config(page_title="Prompt-to-Comic", page_icon="🎨", layout="centered")
@@ -62,10 +61,9 @@ if st.button("🎨 Generate Comic", type="primary", use_container_width=True) an
         status_placeholder.success("🎉 Your comic is ready!")
         
         # Display the final comic
-        if status.get("comic_data"):
+        if status.get("comic_url"):
             try:
-                # Decode base64 comic data
-                comic_data = base64.b64decode(status["comic_data"])
+                comic_data = get_comic_image(job_id)
                 
                 # Display comic
                 st.subheader("🎨 Your Generated Comic")
@@ -83,15 +81,18 @@ if st.button("🎨 Generate Comic", type="primary", use_container_width=True) an
                 st.error(f"❌ Failed to display comic: {e}")
         
         # Display individual panels
-        if status.get("panel_images"):
+        if status.get("panel_urls"):
             st.subheader("🖼️ Individual Panels")
             
             # Create columns for panels
-            cols = st.columns(min(len(status["panel_images"]), 3))
+            cols = st.columns(min(len(status["panel_urls"]), 3))
             
-            for i, panel_b64 in enumerate(status["panel_images"]):
+            for i in range(len(status["panel_urls"])):
+                # A cancelled job has no image for the panels it never reached
+                if status["panel_urls"][i] is None:
+                    continue
                 try:
-                    panel_data = base64.b64decode(panel_b64)
+                    panel_data = get_panel_image(job_id, i + 1)
                     col_idx = i % 3
                     
                     with cols[col_idx]: